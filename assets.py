@@ -0,0 +1,362 @@
+"""Assets
+
+This script deduplicates the images under 'raw_images': every file is hashed once
+and mapped to a content ID, so the copies of the same image under several paths
+get decoded and cached only once.
+
+By default, the index only lives in memory and every file gets hashed the first
+time it's loaded, so rendering a card never writes anything. The command line
+tools opt in to persisting it, along with the size and the modification time of
+every file, which means that on warm runs only the files that changed get
+hashed again.
+
+The cache is shared by every thread of the process. When several threads need
+the same image that isn't cached yet, only the first one decodes it while the
+others wait for it, instead of decoding it again.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * persist_asset_index - makes the asset index of this process persist to a file
+    * get_asset_index - gets the asset index of this process, loading it the first time
+    * get_content_id - gets the content ID of an image
+    * load_image - loads an image, decoding each distinct content only once
+    * load_image_once - loads the image of a content ID, letting a single thread decode it
+"""
+
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+
+from PIL import Image
+
+from file_utils import write_file_atomically
+
+ASSET_DIRECTORY = "raw_images"
+# Where the command line tools persist the index, relative to where they run
+DEFAULT_ASSET_INDEX_PATH = ".cache/asset_index.json"
+
+# How many decoded images are kept in memory. Each background takes a few megabytes.
+IMAGE_CACHE_SIZE = 32
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class MissingAssetException(Exception):
+    pass
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class AssetIndex:
+    """Maps the path of every asset to the content ID of the image it contains"""
+
+    def __init__(self, index_path=None):
+        """
+        Parameters
+        ----------
+        index_path : str
+            The file where the index is persisted, or None to keep it in memory only
+        """
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.paths_by_content_id = {}
+        self.changed = False
+
+    def load(self):
+        """Loads the persisted index, if there's one"""
+        if self.index_path is None:
+            return
+
+        try:
+            with open(self.index_path, encoding="utf-8") as index_file:
+                self.entries = json.load(index_file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+        self.paths_by_content_id = {}
+
+        for path, entry in self.entries.items():
+            self.paths_by_content_id.setdefault(entry["content_id"], []).append(path)
+
+    def save(self):
+        """Persists the index, if it changed, replacing the previous file atomically"""
+        if self.index_path is None or not self.changed:
+            return
+
+        index_directory = os.path.dirname(self.index_path) or "."
+        os.makedirs(index_directory, exist_ok=True)
+
+        with self.lock:
+            index_content = json.dumps(self.entries, indent=1, sort_keys=True)
+
+            write_file_atomically(
+                self.index_path,
+                lambda index_file: index_file.write(index_content.encode("utf-8")),
+            )
+            self.changed = False
+
+    def index_directory(self, directory=ASSET_DIRECTORY):
+        """Makes sure every file under a directory has an up to date content ID
+
+        Parameters
+        ----------
+        directory : str
+            The directory whose files will be indexed
+        """
+        for root, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if not filename.startswith("."):
+                    self.get_content_id(os.path.join(root, filename))
+
+    def prune_missing_files(self):
+        """Forgets the files that were deleted since they were indexed"""
+        with self.lock:
+            missing_paths = [path for path in self.entries if not os.path.exists(path)]
+
+        for path in missing_paths:
+            self.forget_path(path)
+
+    def forget_path(self, path):
+        """Removes a file from the index, along with the content ID it pointed to"""
+        with self.lock:
+            entry = self.entries.pop(path, None)
+
+            if entry is None:
+                return
+
+            self.remove_path_of_content_id(entry["content_id"], path)
+            self.changed = True
+
+    def remove_path_of_content_id(self, content_id, path):
+        # Must be called with the lock held
+        paths = self.paths_by_content_id.get(content_id, [])
+
+        if path in paths:
+            paths.remove(path)
+
+        if not paths:
+            self.paths_by_content_id.pop(content_id, None)
+
+    def get_content_id(self, path):
+        """Gets the content ID of a file, only hashing it if it's new or it changed
+
+        Parameters
+        ----------
+        path : str
+            The path to the file
+
+        Returns
+        -------
+        str
+            the content ID of the file
+        """
+        path = os.path.normpath(path)
+        stat = os.stat(path)
+
+        with self.lock:
+            entry = self.entries.get(path)
+
+            if (
+                entry is not None
+                and entry["mtime_ns"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size
+            ):
+                return entry["content_id"]
+
+        content_id = hash_file(path)
+
+        with self.lock:
+            previous_entry = self.entries.get(path)
+
+            # The file no longer holds its previous content, so it can't be opened for it
+            if previous_entry is not None:
+                self.remove_path_of_content_id(previous_entry["content_id"], path)
+
+            self.entries[path] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "content_id": content_id,
+            }
+            paths = self.paths_by_content_id.setdefault(content_id, [])
+
+            if path not in paths:
+                paths.append(path)
+
+            self.changed = True
+
+        return content_id
+
+    def get_path(self, content_id):
+        """Gets the path of a file that still holds the content ID. The size and the
+        modification time of each candidate are checked first: the files that were
+        deleted get forgotten, and the ones that were rewritten get indexed again
+        under their new content
+
+        Parameters
+        ----------
+        content_id : str
+            The content ID of the image
+
+        Returns
+        -------
+        str
+            the path of a file with that content
+        """
+        with self.lock:
+            candidate_paths = list(self.paths_by_content_id.get(content_id, []))
+
+        for path in candidate_paths:
+            try:
+                if self.get_content_id(path) == content_id:
+                    return path
+            except FileNotFoundError:
+                self.forget_path(path)
+
+        raise MissingAssetException(
+            f"No indexed file holds the content '{content_id}' anymore."
+        )
+
+
+class KeyedLocks:
+    """Hands out one lock per key, so the threads that load the same asset wait
+    for each other while the ones that load other assets go ahead"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locks = {}
+
+    def get(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+
+ASSET_INDEX = None
+ASSET_INDEX_PATH = None
+ASSET_INDEX_LOCK = threading.Lock()
+
+IMAGE_LOAD_LOCKS = KeyedLocks()
+
+
+def persist_asset_index(index_path=DEFAULT_ASSET_INDEX_PATH):
+    """Makes the asset index of this process persist to a file. The index is then
+    loaded from it, revalidated against every file under the asset directory, and
+    saved. The command line tools call it before rendering; the library callers
+    keep the index in memory
+
+    Parameters
+    ----------
+    index_path : str
+        The file where the index is persisted
+    """
+    global ASSET_INDEX, ASSET_INDEX_PATH  # pylint: disable=global-statement
+
+    with ASSET_INDEX_LOCK:
+        ASSET_INDEX_PATH = index_path
+        # The content IDs don't depend on the index, so the cached images stay valid
+        ASSET_INDEX = None
+
+
+def get_asset_index():
+    """Gets the asset index of this process. The first time, it's created, and if
+    it's persisted, loaded from disk, revalidated against the files under the asset
+    directory and saved if needed
+
+    Returns
+    -------
+    AssetIndex
+        the asset index
+    """
+    global ASSET_INDEX  # pylint: disable=global-statement
+
+    with ASSET_INDEX_LOCK:
+        if ASSET_INDEX is None:
+            asset_index = AssetIndex(ASSET_INDEX_PATH)
+
+            if ASSET_INDEX_PATH is not None:
+                asset_index.load()
+
+                asset_index.prune_missing_files()
+
+                if os.path.isdir(ASSET_DIRECTORY):
+                    asset_index.index_directory(ASSET_DIRECTORY)
+
+                try:
+                    asset_index.save()
+                except OSError:
+                    # A read-only checkout still works, it just hashes again on the next run
+                    pass
+
+            ASSET_INDEX = asset_index
+
+    return ASSET_INDEX
+
+
+def get_content_id(path):
+    """Gets the content ID of an image
+
+    Parameters
+    ----------
+    path : str
+        The path to the image
+
+    Returns
+    -------
+    str
+        the content ID, shared by every copy of the same image
+    """
+    return get_asset_index().get_content_id(path)
+
+
+@lru_cache(maxsize=IMAGE_CACHE_SIZE)
+def load_image_by_content_id(content_id):
+    image = Image.open(get_asset_index().get_path(content_id))
+    image.load()
+
+    return image
+
+
+def load_image_once(content_id):
+    """Loads the image of a content ID through the cache. If several threads ask
+    for it before it's cached, only the first one decodes it
+
+    Parameters
+    ----------
+    content_id : str
+        The content ID of the image
+
+    Returns
+    -------
+    Image
+        the decoded image, shared with the other callers
+    """
+    with IMAGE_LOAD_LOCKS.get(content_id):
+        return load_image_by_content_id(content_id)
+
+
+def load_image(path):
+    """Loads an image, decoding each distinct content only once. The image is
+    shared with the other callers, so it must not be modified
+
+    Parameters
+    ----------
+    path : str
+        The path to the image
+
+    Returns
+    -------
+    Image
+        the decoded image
+    """
+    return load_image_once(get_content_id(path))
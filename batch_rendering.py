@@ -0,0 +1,645 @@
+"""Batch Rendering
+
+This script renders a deck as a pipeline that keeps its memory bounded. A
+prefetching thread validates the upcoming cards and decodes their images ahead
+of time, the calling thread composes the cards, and a few encoder threads encode
+and write them. Both queues between the stages are bounded, so a slow stage holds
+back the ones before it instead of letting the images pile up.
+
+When a memory budget is given and the resident memory goes over it, the
+prefetching stops decoding ahead, the renderer waits for every pending card to
+be written and empties the image caches before composing the next card. A budget
+that the process already exceeds when the run starts can never be met, and would
+empty the caches before every card, so it gets disabled for the run instead.
+
+The peak resident memory seen while rendering each type of card gets reported,
+which helps to decide how many workers fit on a machine.
+
+A failing card is retried a bounded number of times and then recorded as failed,
+so one bad image doesn't stop a long run. Given a journal, every finished card is
+recorded along with the fingerprint of its inputs, so a crashed run can resume.
+
+Given a metrics registry, the run records the cards rendered and failed per card
+type, its throughput, the latency of every stage, the depth of both queues, the
+encoded bytes and the hit ratios of the caches.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * get_current_rss - gets the resident memory of this process, in bytes
+    * render_batch - renders every card of a deck through the bounded pipeline
+"""
+
+import gc
+import os
+import queue
+import threading
+import time
+from collections.abc import Mapping
+
+from assets import load_image, load_image_by_content_id
+from card_generation import compose_card
+from card_rendering import InvalidCardDataException, encode_card, read_card_data
+from file_utils import (
+    IncorrectImagePathException,
+    ensure_all_image_paths_exist,
+    get_card_filename,
+    save_card_as_png,
+)
+from gallery import fingerprint_card_bytes, fingerprint_file
+from icons import load_icon_with_shadow_by_content_id
+from metrics import (
+    QUEUE_DEPTH_BUCKETS,
+    activate_registry,
+    record_cache_metrics,
+    time_stage,
+)
+from output_sinks import ArchiveOutputSink
+from render_journal import fingerprint_card
+
+DEFAULT_PREFETCH_DEPTH = 4
+DEFAULT_OUTPUT_QUEUE_DEPTH = 4
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_ENCODER_THREADS = 2
+
+# Marks the end of a queue
+END_OF_QUEUE = None
+
+
+class FailedToRenderBatchException(Exception):
+    pass
+
+
+def get_current_rss():
+    """Gets the resident memory of this process
+
+    Returns
+    -------
+    int
+        the resident memory in bytes, or the peak resident memory if the current one
+        can't be read on this platform
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return 0
+
+    # On Linux the peak is reported in kilobytes, on macOS in bytes
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak_rss if os.uname().sysname == "Darwin" else peak_rss * 1024
+
+
+def clear_image_caches():
+    load_image_by_content_id.cache_clear()
+    load_icon_with_shadow_by_content_id.cache_clear()
+    gc.collect()
+
+
+class MemoryAccount:
+    """Tracks the resident memory against the budget, and its peak per card type"""
+
+    def __init__(self, memory_budget):
+        self.starting_rss = get_current_rss()
+        self.memory_budget_disabled = (
+            memory_budget is not None and self.starting_rss >= memory_budget
+        )
+        self.memory_budget = None if self.memory_budget_disabled else memory_budget
+        self.lock = threading.Lock()
+        self.peak_rss_by_card_type = {}
+        self.cache_clears = 0
+
+    def sample(self, card_type):
+        rss = get_current_rss()
+
+        with self.lock:
+            if rss > self.peak_rss_by_card_type.get(card_type, 0):
+                self.peak_rss_by_card_type[card_type] = rss
+
+        return rss
+
+    def is_over_budget(self):
+        return self.memory_budget is not None and get_current_rss() > self.memory_budget
+
+
+def iterate_queue(items):
+    while True:
+        item = items.get()
+
+        if item is END_OF_QUEUE:
+            return
+
+        yield item
+
+
+class BatchRun:
+    """The state shared by the stages of the pipeline during a batch run"""
+
+    def __init__(
+        self,
+        output_sink,
+        memory_account,
+        journal,
+        max_attempts,
+        png_optimizer=None,
+        gallery=None,
+        metrics=None,
+    ):
+        self.output_sink = output_sink
+        self.png_optimizer = png_optimizer
+        self.gallery = gallery
+        self.gallery_feeder = GalleryFeeder(gallery) if gallery is not None else None
+        self.metrics = metrics
+        self.memory_account = memory_account
+        self.journal = journal
+        self.max_attempts = max_attempts
+        self.written_paths = []
+        self.failed_cards = []
+        self.skipped_cards = 0
+        # Errors that aren't about a single card stop the whole run
+        self.fatal_errors = []
+
+    def record_failure(self, card_job, error, attempts):
+        self.failed_cards.append(
+            {
+                "index": card_job.index,
+                "line_number": card_job.line_number,
+                "title": card_job.title,
+                "card_type": card_job.card_type,
+                "error": error,
+            }
+        )
+
+        if self.journal is not None and card_job.fingerprint is not None:
+            self.journal.record_failure(
+                card_job.fingerprint,
+                card_job.index,
+                card_job.title,
+                card_job.card_type,
+                error,
+                card_job.previous_attempts + attempts,
+            )
+
+    def record_done(self, card_job, output_path):
+        self.written_paths.append(output_path)
+
+        if self.metrics is not None:
+            self.metrics.increment("cards_rendered_total", {"card_type": card_job.card_type})
+
+        if self.journal is not None:
+            self.journal.record_done(
+                card_job.fingerprint,
+                card_job.index,
+                card_job.title,
+                card_job.card_type,
+                output_path,
+            )
+
+    def remaining_attempts(self, card_job):
+        return self.max_attempts - card_job.previous_attempts
+
+    def run_with_retries(self, card_job, stage, attempt):
+        """Runs a stage of a card until it succeeds or it runs out of attempts
+
+        Returns
+        -------
+        tuple
+            whether it succeeded, and the result of the stage
+        """
+        error = None
+
+        for attempts in range(1, self.remaining_attempts(card_job) + 1):
+            try:
+                return True, attempt()
+            except Exception as exception:  # pylint: disable=broad-except
+                error = f"Failed to {stage} the card {card_job.describe_location()}.\nError: {exception}"
+
+        self.record_failure(card_job, error, attempts)
+
+        return False, None
+
+
+class GalleryFeeder:
+    """Adds the cards to the gallery in deck order, while the encoder threads
+    finish writing them in any order"""
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+        self.lock = threading.Lock()
+        self.reserved_positions = 0
+        self.next_position = 0
+        self.ready_cards = {}
+
+    def reserve_position(self):
+        """Gives the next card its place in the gallery. Only the renderer calls it"""
+        position = self.reserved_positions
+        self.reserved_positions += 1
+
+        return position
+
+    def add_card(self, position, gallery_card):
+        """Adds a card to the gallery once every card before it was added
+
+        Parameters
+        ----------
+        position : int
+            The place of the card, as given by 'reserve_position'
+        gallery_card : dict
+            The arguments of 'Gallery.add_card', or None if the card failed and is
+            left out of the gallery
+        """
+        with self.lock:
+            self.ready_cards[position] = gallery_card
+
+            while self.next_position in self.ready_cards:
+                ready_card = self.ready_cards.pop(self.next_position)
+                self.next_position += 1
+
+                if ready_card is not None:
+                    self.gallery.add_card(**ready_card)
+
+    def skip_card(self, position):
+        self.add_card(position, None)
+
+
+def get_line_number(card_data):
+    """Gets the line of the manifest that a card was read from, if it came from a
+    manifest stream"""
+    if isinstance(card_data, Mapping):
+        return card_data.get("line_number")
+
+    return getattr(card_data, "line_number", None)
+
+
+def describe_card_location(index, line_number):
+    if line_number is not None:
+        return f"on line {line_number} of the manifest"
+
+    return f"at index {index}"
+
+
+class CardJob:
+    """A card that went through the prefetching and waits to be rendered"""
+
+    def __init__(self, index, title, image_paths, card_type, line_number=None):
+        self.index = index
+        # The invalid rows of a manifest are skipped, so the index can't locate the card in it
+        self.line_number = line_number
+        self.title = title
+        self.image_paths = image_paths
+        self.card_type = card_type
+        self.fingerprint = None
+        self.previous_attempts = 0
+        # Set for the cards a resumed run skips, which still go to the gallery in order
+        self.done_output_path = None
+        self.gallery_position = None
+
+    def describe_location(self):
+        return describe_card_location(self.index, self.line_number)
+
+
+def prefetch_cards(cards, prefetched_cards, batch_run):
+    """Validates the upcoming cards and decodes their images ahead of the renderer.
+    The cards already done in a resumed run get skipped here"""
+    try:
+        for index, card_data in enumerate(cards):
+            if batch_run.fatal_errors:
+                break
+
+            line_number = get_line_number(card_data)
+
+            try:
+                card_job = CardJob(index, *read_card_data(card_data), line_number)
+                ensure_all_image_paths_exist(card_job.image_paths)
+            except (InvalidCardDataException, IncorrectImagePathException) as exception:
+                batch_run.failed_cards.append(
+                    {
+                        "index": index,
+                        "line_number": line_number,
+                        "title": None,
+                        "card_type": None,
+                        "error": f"Failed to prefetch the card {describe_card_location(index, line_number)}.\nError: {exception}",
+                    }
+                )
+                continue
+
+            if batch_run.journal is not None:
+                card_job.fingerprint = fingerprint_card(
+                    card_job.title, card_job.image_paths, card_job.card_type
+                )
+
+                if batch_run.journal.is_done(card_job.fingerprint):
+                    batch_run.skipped_cards += 1
+
+                    if batch_run.gallery is not None:
+                        card_job.done_output_path = batch_run.journal.entries[
+                            card_job.fingerprint
+                        ]["output_path"]
+                        prefetched_cards.put(card_job)
+
+                    continue
+
+                card_job.previous_attempts = batch_run.journal.get_failed_attempts(
+                    card_job.fingerprint
+                )
+
+                if batch_run.remaining_attempts(card_job) <= 0:
+                    batch_run.failed_cards.append(
+                        {
+                            "index": index,
+                            "line_number": line_number,
+                            "title": card_job.title,
+                            "card_type": card_job.card_type,
+                            "error": f"Gave up on the card {card_job.describe_location()} after {card_job.previous_attempts} failed attempts.",
+                        }
+                    )
+                    continue
+
+            if not batch_run.memory_account.is_over_budget():
+                try:
+                    with time_stage("prefetch", card_job.card_type):
+                        for image_path in card_job.image_paths.values():
+                            for path in image_path if isinstance(image_path, list) else [image_path]:
+                                load_image(path)
+                except OSError:
+                    # The renderer runs into the same error, and retries the card
+                    pass
+
+            # Blocks while the renderer is behind
+            prefetched_cards.put(card_job)
+    except Exception as exception:  # pylint: disable=broad-except
+        batch_run.fatal_errors.append(exception)
+    finally:
+        prefetched_cards.put(END_OF_QUEUE)
+
+
+def encode_and_save_card(card_job, card, batch_run):
+    with time_stage("encode", card_job.card_type):
+        if batch_run.png_optimizer is not None:
+            card_bytes = batch_run.png_optimizer.optimize(card_job.title, card, card_job.card_type)
+        else:
+            card_bytes = encode_card(card, "PNG")
+
+    with time_stage("write", card_job.card_type):
+        output_path = save_card_as_png(
+            card_job.title, card_bytes, card_job.card_type, batch_run.output_sink
+        )
+
+    if batch_run.metrics is not None:
+        batch_run.metrics.increment(
+            "encoded_bytes_total", {"card_type": card_job.card_type}, len(card_bytes)
+        )
+
+    return output_path, card_bytes
+
+
+def write_cards(rendered_cards, batch_run):
+    """Encodes and writes the rendered cards, dropping each one once it's written.
+    Several encoder threads run it on the same queue"""
+    for card_job, card in iterate_queue(rendered_cards):
+        try:
+            if not batch_run.fatal_errors:
+                written, result = batch_run.run_with_retries(
+                    card_job,
+                    "write",
+                    lambda: encode_and_save_card(card_job, card, batch_run),
+                )
+
+                if written:
+                    output_path, card_bytes = result
+                    batch_run.record_done(card_job, output_path)
+                    batch_run.memory_account.sample(card_job.card_type)
+
+                if batch_run.gallery_feeder is not None:
+                    if written:
+                        # Only the cards actually written get into the gallery
+                        batch_run.gallery_feeder.add_card(
+                            card_job.gallery_position,
+                            {
+                                "title": card_job.title,
+                                "card_type": card_job.card_type,
+                                "fingerprint": fingerprint_card_bytes(card_bytes),
+                                "card": card,
+                                "card_path": get_card_link_path(card_job, batch_run.output_sink),
+                            },
+                        )
+                    else:
+                        batch_run.gallery_feeder.skip_card(card_job.gallery_position)
+        except Exception as exception:  # pylint: disable=broad-except
+            batch_run.fatal_errors.append(exception)
+        finally:
+            del card
+            rendered_cards.task_done()
+
+    rendered_cards.task_done()
+
+
+def sample_queue_depths(metrics, prefetched_cards, rendered_cards):
+    metrics.observe(
+        "queue_depth", {"queue": "prefetch"}, prefetched_cards.qsize(), QUEUE_DEPTH_BUCKETS
+    )
+    metrics.observe(
+        "queue_depth", {"queue": "output"}, rendered_cards.qsize(), QUEUE_DEPTH_BUCKETS
+    )
+
+
+def record_run_metrics(metrics, batch_run, duration):
+    for failed_card in batch_run.failed_cards:
+        metrics.increment("cards_failed_total", {"card_type": failed_card["card_type"] or "unknown"})
+
+    metrics.increment("cards_skipped_total", amount=batch_run.skipped_cards)
+    metrics.set_gauge("run_duration_seconds", value=duration)
+    metrics.set_gauge(
+        "cards_per_second", value=len(batch_run.written_paths) / duration if duration else 0.0
+    )
+
+    for card_type, peak_rss in batch_run.memory_account.peak_rss_by_card_type.items():
+        metrics.set_gauge("peak_rss_bytes", {"card_type": card_type}, peak_rss)
+
+    record_cache_metrics(metrics)
+
+
+def get_card_link_path(card_job, output_sink):
+    # The cards inside an archive can't be linked to
+    if isinstance(output_sink, ArchiveOutputSink):
+        return None
+
+    return get_card_filename(card_job.title, card_job.card_type)
+
+
+def render_batch(
+    cards,
+    output_sink=None,
+    memory_budget=None,
+    prefetch_depth=DEFAULT_PREFETCH_DEPTH,
+    output_queue_depth=DEFAULT_OUTPUT_QUEUE_DEPTH,
+    journal=None,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    encoder_threads=DEFAULT_ENCODER_THREADS,
+    png_optimizer=None,
+    gallery=None,
+    metrics=None,
+):
+    """Renders every card of a deck through the bounded pipeline
+
+    A card that fails is retried up to 'max_attempts' times, and then recorded as
+    failed, without stopping the rest of the run
+
+    Parameters
+    ----------
+    cards : iterable
+        The card data of every card, as accepted by 'read_card_data'. It can be a
+        generator: it's only consumed as fast as the cards get rendered
+    output_sink : ArchiveOutputSink
+        Where the cards get written. By default, they're saved under the output directory
+    memory_budget : int
+        The resident memory, in bytes, above which the caches get emptied and the
+        pipeline drains. By default, there's no budget. If the process is already
+        above it when the run starts, the run goes on without a budget
+    prefetch_depth : int
+        How many cards can be prefetched ahead of the renderer
+    output_queue_depth : int
+        How many rendered cards can wait to be written
+    journal : RenderJournal
+        Where every rendered and failed card is recorded. If it was resumed, the
+        cards it already has as done get skipped
+    max_attempts : int
+        How many times a card is tried, counting the attempts of resumed runs
+    encoder_threads : int
+        How many threads encode and write the rendered cards. The encoding
+        releases the GIL, so they run alongside the renderer
+    png_optimizer : PngOptimizer
+        If given, it encodes every card as a smaller PNG and reports the bytes saved
+    gallery : Gallery
+        If given, every card is added to it in deck order, including the ones that
+        a resumed run skips. The caller closes it
+    metrics : MetricsRegistry
+        If given, the metrics of the run get recorded into it. The caller writes it
+
+    Returns
+    -------
+    dict
+        the 'written_paths', the 'failed_cards', how many 'skipped_cards' were
+        already done, the 'peak_rss_by_card_type' in bytes, how many times the
+        caches had to be cleared to stay within the budget, and whether the budget
+        was disabled because the 'starting_rss' in bytes was already over it
+    """
+    # Without an encoder thread, the renderer would wait forever for room in the queue
+    if encoder_threads < 1:
+        raise ValueError(f"A batch run needs at least one encoder thread, not {encoder_threads}.")
+
+    memory_account = MemoryAccount(memory_budget)
+    batch_run = BatchRun(
+        output_sink, memory_account, journal, max_attempts, png_optimizer, gallery, metrics
+    )
+    start_time = time.perf_counter()
+
+    prefetched_cards = queue.Queue(maxsize=prefetch_depth)
+    rendered_cards = queue.Queue(maxsize=output_queue_depth)
+
+    prefetcher = threading.Thread(
+        target=prefetch_cards, args=(cards, prefetched_cards, batch_run), daemon=True
+    )
+    writers = [
+        threading.Thread(target=write_cards, args=(rendered_cards, batch_run), daemon=True)
+        for _ in range(encoder_threads)
+    ]
+    if metrics is not None:
+        previous_registry = activate_registry(metrics)
+
+    prefetcher.start()
+
+    for writer in writers:
+        writer.start()
+
+    try:
+        for card_job in iterate_queue(prefetched_cards):
+            if batch_run.fatal_errors:
+                continue
+
+            if batch_run.gallery_feeder is not None:
+                card_job.gallery_position = batch_run.gallery_feeder.reserve_position()
+
+            if card_job.done_output_path is not None:
+                batch_run.gallery_feeder.add_card(
+                    card_job.gallery_position,
+                    {
+                        "title": card_job.title,
+                        "card_type": card_job.card_type,
+                        "fingerprint": fingerprint_file(card_job.done_output_path),
+                        "card_path": card_job.done_output_path,
+                    },
+                )
+                continue
+
+            if memory_account.is_over_budget():
+                # Lets every pending card get written before freeing the caches
+                rendered_cards.join()
+                clear_image_caches()
+                memory_account.cache_clears += 1
+
+            if metrics is not None:
+                sample_queue_depths(metrics, prefetched_cards, rendered_cards)
+
+            composed, card = batch_run.run_with_retries(
+                card_job,
+                "render",
+                lambda: compose_card(
+                    card_job.title, card_job.image_paths, card_job.card_type
+                ),
+            )
+
+            if not composed:
+                if batch_run.gallery_feeder is not None:
+                    batch_run.gallery_feeder.skip_card(card_job.gallery_position)
+
+                continue
+
+            memory_account.sample(card_job.card_type)
+
+            # Blocks while the encoder threads are behind
+            rendered_cards.put((card_job, card))
+            del card
+    except BaseException as exception:
+        # Tells the prefetcher and the encoder threads to stop early
+        batch_run.fatal_errors.append(exception)
+        raise
+    finally:
+        # Every encoder thread stops at its own end of the queue
+        for _ in writers:
+            rendered_cards.put(END_OF_QUEUE)
+
+        for writer in writers:
+            writer.join()
+
+        # Unblocks the prefetcher if it's waiting for room in its queue
+        while prefetcher.is_alive():
+            try:
+                prefetched_cards.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        if metrics is not None:
+            activate_registry(previous_registry)
+            record_run_metrics(metrics, batch_run, time.perf_counter() - start_time)
+
+    if batch_run.fatal_errors:
+        raise FailedToRenderBatchException(
+            f"The batch run stopped from 'render_batch'.\nError: {batch_run.fatal_errors[0]}"
+        )
+
+    return {
+        "written_paths": batch_run.written_paths,
+        "failed_cards": batch_run.failed_cards,
+        "skipped_cards": batch_run.skipped_cards,
+        "peak_rss_by_card_type": memory_account.peak_rss_by_card_type,
+        "cache_clears": memory_account.cache_clears,
+        "memory_budget_disabled": memory_account.memory_budget_disabled,
+        "starting_rss": memory_account.starting_rss,
+    }
@@ -0,0 +1,250 @@
+"""Backend Benchmark
+
+This script compares the process and the thread backends of the render daemon on
+the same deck. For each backend, it starts a daemon with the same number of
+workers, sends it every card of the deck several times from as many concurrent
+clients, and reports the throughput along with the peak memory of the daemon and
+its worker processes.
+
+The memory is measured as the proportional set size when the platform reports
+it, so that the pages the worker processes share with the daemon aren't counted
+twice. Otherwise the resident memory of every process gets added up.
+
+Usage: python benchmark_backends.py toml/deck.toml --workers 4 --repetitions 8
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from deck import load_deck_manifest
+from render_daemon import RENDER_BACKENDS
+
+MEMORY_SAMPLE_INTERVAL = 0.05
+DAEMON_STARTUP_TIMEOUT = 60
+
+
+class FailedToBenchmarkBackendException(Exception):
+    pass
+
+
+def find_free_port():
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+
+        return free_socket.getsockname()[1]
+
+
+def get_child_pids(pid):
+    child_pids = []
+
+    try:
+        for thread_id in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{thread_id}/children", encoding="ascii") as children:
+                child_pids.extend(int(child_pid) for child_pid in children.read().split())
+    except OSError:
+        pass
+
+    return child_pids
+
+
+def get_process_memory(pid):
+    """Gets the memory of a process, in bytes: its proportional set size if the
+    platform reports it, and its resident memory otherwise"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as smaps:
+            for line in smaps:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        with open(f"/proc/{pid}/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def get_process_tree_memory(pid):
+    """Gets the memory of a process and of its children, in bytes
+
+    Parameters
+    ----------
+    pid : int
+        The process ID of the daemon
+
+    Returns
+    -------
+    int
+        the memory of the daemon and of its worker processes
+    """
+    return sum(get_process_memory(tree_pid) for tree_pid in [pid, *get_child_pids(pid)])
+
+
+class MemorySampler:
+    """Samples the memory of a process tree on a thread, keeping its peak"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak_memory = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while not self.stopped.is_set():
+            self.peak_memory = max(self.peak_memory, get_process_tree_memory(self.pid))
+            self.stopped.wait(MEMORY_SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stopped.set()
+        self.thread.join()
+
+
+def wait_for_daemon(url, daemon_process):
+    deadline = time.monotonic() + DAEMON_STARTUP_TIMEOUT
+
+    while time.monotonic() < deadline:
+        if daemon_process.poll() is not None:
+            raise FailedToBenchmarkBackendException(
+                f"The render daemon exited with the code {daemon_process.returncode} before it started."
+            )
+
+        try:
+            with urllib.request.urlopen(f"{url}/stats"):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+    raise FailedToBenchmarkBackendException(
+        f"The render daemon didn't start within {DAEMON_STARTUP_TIMEOUT} seconds."
+    )
+
+
+def send_render_request(url, card_data):
+    render_request = urllib.request.Request(
+        f"{url}/render",
+        data=json.dumps(card_data).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+
+    with urllib.request.urlopen(render_request) as response:
+        return len(response.read())
+
+
+def benchmark_backend(backend, cards, workers, repetitions):
+    """Renders the deck on a daemon with the given backend
+
+    Parameters
+    ----------
+    backend : str
+        Either 'process' or 'thread'
+    cards : list
+        The card data of every card of the deck
+    workers : int
+        How many workers the daemon gets
+    repetitions : int
+        How many times every card is rendered
+
+    Returns
+    -------
+    dict
+        the 'cards_per_second', the 'idle_memory' once the workers are warm, and the
+        'peak_memory' while rendering, in bytes
+    """
+    port = find_free_port()
+    url = f"http://127.0.0.1:{port}"
+    jobs = [card_data for _ in range(repetitions) for card_data in cards]
+
+    daemon_process = subprocess.Popen(
+        [
+            sys.executable,
+            "render_daemon.py",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--backend",
+            backend,
+            "--max-queued-jobs",
+            str(len(jobs)),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+
+    try:
+        wait_for_daemon(url, daemon_process)
+        idle_memory = get_process_tree_memory(daemon_process.pid)
+
+        with MemorySampler(daemon_process.pid) as memory_sampler:
+            start_time = time.perf_counter()
+
+            # Twice as many clients as workers keeps every worker busy
+            with ThreadPoolExecutor(max_workers=workers * 2) as clients:
+                list(clients.map(lambda card_data: send_render_request(url, card_data), jobs))
+
+            duration = time.perf_counter() - start_time
+    finally:
+        daemon_process.terminate()
+        daemon_process.wait()
+
+    return {
+        "cards_per_second": len(jobs) / duration,
+        "idle_memory": idle_memory,
+        "peak_memory": memory_sampler.peak_memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend Benchmark")
+    parser.add_argument("manifest", help="Path to the TOML manifest of the deck.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="How many workers each daemon gets.",
+    )
+    parser.add_argument(
+        "--repetitions",
+        type=int,
+        default=8,
+        help="How many times every card of the deck is rendered.",
+    )
+
+    args = parser.parse_args()
+
+    cards = [
+        {**card_data, "output": "png"} for card_data in load_deck_manifest(args.manifest)
+    ]
+
+    print(
+        f"{'backend':<10}{'workers':>8}{'cards/s':>10}{'idle memory':>14}{'peak memory':>14}"
+    )
+
+    for backend in RENDER_BACKENDS:
+        try:
+            result = benchmark_backend(backend, cards, args.workers, args.repetitions)
+        except FailedToBenchmarkBackendException as exception:
+            print(f"Failed to benchmark the '{backend}' backend from main.\nError: {exception}")
+            continue
+
+        print(
+            f"{backend:<10}{args.workers:>8}{result['cards_per_second']:>10.2f}"
+            f"{result['idle_memory'] / 1024 / 1024:>12.1f}MB"
+            f"{result['peak_memory'] / 1024 / 1024:>12.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
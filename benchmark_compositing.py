@@ -0,0 +1,88 @@
+"""Compositing Benchmark
+
+This script composes every card of a deck with each compositing backend, checks
+that the backends produce identical cards, and reports how long each took.
+
+Usage: python benchmark_compositing.py toml/deck.toml --repetitions 3
+"""
+
+import argparse
+import time
+
+from PIL import ImageChops
+
+from card_generation import COMPOSITING_BACKENDS
+from card_rendering import read_card_data, render_card
+from deck import load_deck_manifest
+
+
+def time_backend(card_data, compositing_backend, repetitions):
+    card = None
+    start_time = time.perf_counter()
+
+    for _ in range(repetitions):
+        card = render_card(card_data, compositing_backend)
+
+    return (time.perf_counter() - start_time) / repetitions, card
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compositing Benchmark")
+    parser.add_argument("manifest", help="Path to the TOML manifest of the deck.")
+    parser.add_argument(
+        "--repetitions",
+        type=int,
+        default=3,
+        help="How many times each card is composed with each backend.",
+    )
+
+    args = parser.parse_args()
+
+    totals = dict.fromkeys(COMPOSITING_BACKENDS, 0.0)
+
+    print(f"{'card':<40}" + "".join(f"{backend:>12}" for backend in COMPOSITING_BACKENDS) + "   identical")
+
+    for card_data in load_deck_manifest(args.manifest):
+        title, _, card_type = read_card_data(card_data)
+
+        # Fills the asset and icon caches, so neither backend pays for them
+        render_card(card_data)
+
+        timings = {}
+        cards = {}
+
+        for backend in COMPOSITING_BACKENDS:
+            timings[backend], cards[backend] = time_backend(
+                card_data, backend, args.repetitions
+            )
+            totals[backend] += timings[backend]
+
+        label = f"{card_type} {title}" if title is not None else card_type
+        reference_card = cards[COMPOSITING_BACKENDS[0]]
+        identical = all(
+            card.mode == reference_card.mode
+            and ImageChops.difference(card, reference_card).getbbox() is None
+            for card in cards.values()
+        )
+
+        print(
+            f"{label:<40}"
+            + "".join(f"{timings[backend] * 1000:>10.1f}ms" for backend in COMPOSITING_BACKENDS)
+            + f"   {identical}"
+        )
+
+    print(
+        f"{'total':<40}"
+        + "".join(f"{totals[backend] * 1000:>10.1f}ms" for backend in COMPOSITING_BACKENDS)
+    )
+
+    # How long each backend takes relative to the default one, above 1 when it's slower
+    reference_total = totals[COMPOSITING_BACKENDS[0]]
+    print(
+        f"{'relative to ' + COMPOSITING_BACKENDS[0]:<40}"
+        + "".join(f"{totals[backend] / reference_total:>11.2f}x" for backend in COMPOSITING_BACKENDS)
+    )
+
+
+if __name__ == "__main__":
+    main()
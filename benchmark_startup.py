@@ -0,0 +1,110 @@
+"""Startup Benchmark
+
+This script measures how long the commands of the card generator take to return,
+from the start of the interpreter to its exit, and reports the median of several
+runs next to the startup of a bare interpreter. The commands that only print the
+help or validate their arguments shouldn't import the renderer, so they can be
+checked against a limit: the script fails if any of them goes over it.
+
+Usage: python benchmark_startup.py --repetitions 10 --max-validation-ms 80
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# The commands that never render a card, and so shouldn't pay for Pillow or the fonts
+VALIDATION_COMMANDS = (
+    ("main.py", "--help"),
+    ("main.py", "unknown_card_type"),
+    ("main.py", "biome", "--output", "output/startup_benchmark.rar"),
+)
+# These need Pillow: checking the layout reads the headers of the images and the
+# metrics of the fonts
+IMAGE_COMMANDS = (
+    ("main.py", "biome", "--check-layout"),
+    ("main.py", "biome"),
+)
+
+DEFAULT_REPETITIONS = 10
+
+
+def time_command(command, repetitions):
+    """Runs a command several times and measures how long each run took
+
+    Parameters
+    ----------
+    command : tuple
+        The arguments passed to the Python interpreter
+    repetitions : int
+        How many times the command is run
+
+    Returns
+    -------
+    float
+        the median time in seconds
+    """
+    timings = []
+
+    for _ in range(repetitions):
+        start_time = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *command],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        timings.append(time.perf_counter() - start_time)
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup Benchmark")
+    parser.add_argument(
+        "--repetitions",
+        type=int,
+        default=DEFAULT_REPETITIONS,
+        help="How many times each command is run.",
+    )
+    parser.add_argument(
+        "--max-validation-ms",
+        type=float,
+        help="Fail if any command that doesn't render a card takes longer than this, in milliseconds.",
+    )
+
+    args = parser.parse_args()
+
+    interpreter_startup = time_command(("-c", "pass"), args.repetitions)
+
+    print(f"{'command':<60}{'median':>10}{'over bare':>12}")
+    print(f"{'python -c pass':<60}{interpreter_startup * 1000:>8.1f}ms{0:>10.1f}ms")
+
+    slow_commands = []
+
+    for command in VALIDATION_COMMANDS + IMAGE_COMMANDS:
+        median = time_command(command, args.repetitions)
+        label = "python " + " ".join(command)
+
+        print(
+            f"{label:<60}{median * 1000:>8.1f}ms{(median - interpreter_startup) * 1000:>10.1f}ms"
+        )
+
+        if (
+            command in VALIDATION_COMMANDS
+            and args.max_validation_ms is not None
+            and median * 1000 > args.max_validation_ms
+        ):
+            slow_commands.append(label)
+
+    for label in slow_commands:
+        print(f"'{label}' took longer than {args.max_validation_ms}ms.")
+
+    if slow_commands:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,15 @@ functions:
 
     * draw_base_card - draws the base card and returns that card and the draw instance
     * draw_card_image - draws the card image on top of a base card
+    * calculate_title_dimensions - measures the title from the font metrics alone
     * draw_title - draws the title of the card
     * draw_icons - draws the icons of the card
 """
 
 from PIL import Image, ImageDraw
 
+from assets import load_image
+from fonts import FONT_LOCK
 from image_utils import (
     calculate_centered_x,
     calculate_height_of_image_according_to_width,
@@ -65,7 +68,7 @@ def draw_base_card(background_image_path, canvas_width, canvas_height):
         the draw instance that provides draw methods
     """
 
-    background_image = Image.open(background_image_path)
+    background_image = load_image(background_image_path)
 
     new_width, new_height = calculate_new_image_dimensions_respecting_aspect_ratio(
         background_image, canvas_width, canvas_height
@@ -126,7 +129,7 @@ def load_card_image_frame(card_image_frame_path, width):
         the loaded card image frame
     """
 
-    card_image_frame = Image.open(card_image_frame_path)
+    card_image_frame = load_image(card_image_frame_path)
 
     card_image_frame = convert_image_to_rgba(card_image_frame)
 
@@ -188,7 +191,7 @@ def draw_title_banner(
     title_banner_path, title_x, title_y, title_width, title_height, card
 ):
     # Load the banner image
-    banner_image = Image.open(title_banner_path)
+    banner_image = load_image(title_banner_path)
     banner_image = convert_image_to_rgba(banner_image)
 
     # Resize the banner image based on the width of the title text
@@ -207,6 +210,27 @@ class MissingTitleYCoordinateError(Exception):
     pass
 
 
+def calculate_title_dimensions(title, font):
+    """Measures the title using only the metrics of the font
+
+    Parameters
+    ----------
+    title : str
+        The title of the card
+    font : FreeTypeFont
+        The font that the title will be drawn with
+
+    Returns
+    -------
+    int, int
+        the width and height of the title, as 'ImageDraw.textsize' reported them
+    """
+    with FONT_LOCK:
+        left, _, right, bottom = font.getbbox(title)
+
+    return right - left, bottom
+
+
 def draw_title(draw_title_parameters):
     """Draws the title of the card
 
@@ -217,7 +241,7 @@ def draw_title(draw_title_parameters):
     """
 
     # Add title text
-    title_width, title_height = draw_title_parameters["draw"].textsize(
+    title_width, title_height = calculate_title_dimensions(
         draw_title_parameters["title"], draw_title_parameters["font"]
     )
     title_x = calculate_centered_x(title_width, draw_title_parameters["canvas_width"])
@@ -237,12 +261,13 @@ def draw_title(draw_title_parameters):
             draw_title_parameters["card"],
         )
 
-    draw_text_with_shadow(
-        draw_title_parameters["draw"],
-        draw_title_parameters["title"],
-        (title_x, draw_title_parameters["title_y"]),
-        draw_title_parameters["font"],
-        fill="white",
-        shadow_offset=2,
-        shadow_opacity=128,
-    )
+    with FONT_LOCK:
+        draw_text_with_shadow(
+            draw_title_parameters["draw"],
+            draw_title_parameters["title"],
+            (title_x, draw_title_parameters["title_y"]),
+            draw_title_parameters["font"],
+            fill="white",
+            shadow_offset=2,
+            shadow_opacity=128,
+        )
@@ -7,12 +7,17 @@ This file can also be imported as a module and contains the following
 functions:
 
     * save_card_as_png - saves the card as a PNG image given a title and the drawn card
+    * draw_background_layers - draws the layers of a card that come before its title
+    * draw_title_layer - draws the title of a card along with its banner
+    * draw_icon_layers - draws every icon of a card
+    * compose_card - composes a card in memory given a title and the image paths
     * create_card - creates a card given a title, the image paths, and a description text
 """
 
 
-from PIL import Image
+from PIL import ImageDraw
 
+from assets import load_image
 from card_elements import (
     BIOME_TITLE_Y,
     ENCOUNTER_TITLE_Y,
@@ -25,10 +30,10 @@ from card_elements import (
     get_default_card_dimensions,
 )
 from file_utils import UnhandledCardTypeException, save_card_as_png
-from fonts import BIOME_TITLE_FONT, ENCOUNTER_TITLE_FONT
-from image_utils import (
-    apply_rounded_corners_to_card,
-)
+from fonts import load_biome_title_font, load_encounter_title_font
+from image_utils import finalize_card
+from metrics import time_stage
+from numpy_compositing import NumpyNotInstalledException, create_array_canvas
 from icons import (
     BACK_ICON_SIZE,
     BIOME_ICONS_DISTANCE_FROM_BOTTOM_IN_EXPLORATION_ZONE_CARD,
@@ -44,6 +49,12 @@ from icons import (
 )
 
 
+COMPOSITING_BACKENDS = ("pillow", "numpy")
+DEFAULT_COMPOSITING_BACKEND = "pillow"
+
+CARD_BACK_TYPES = ("encounter_back", "biome_back", "exploration_zone_back")
+
+
 def prepare_to_draw_title(
     title, title_banner_path, font, title_y, canvas_width, card, draw
 ):
@@ -76,20 +87,23 @@ def prepare_card_type_data(card_type):
 
     if card_type == "encounter":
         card_type_data = {
-            "font": ENCOUNTER_TITLE_FONT,
+            "font": load_encounter_title_font(),
             "title_y": ENCOUNTER_TITLE_Y,
             "biome_icon_distance_from_bottom": BIOME_ICON_DISTANCE_FROM_BOTTOM_IN_ENCOUNTER_CARD,
             "biome_icon_size": BIOME_ICON_SIZE_IN_ENCOUNTER_CARD,
         }
     elif card_type == "biome":
         card_type_data = {
-            "font": BIOME_TITLE_FONT,
+            "font": load_biome_title_font(),
             "title_y": BIOME_TITLE_Y,
             "biome_icon_distance_from_bottom": BIOME_ICON_DISTANCE_FROM_BOTTOM_IN_BIOME_CARD,
             "biome_icon_size": BIOME_ICON_SIZE_IN_BIOME_CARD,
         }
     elif card_type == "exploration_zone":
-        card_type_data = {"font": ENCOUNTER_TITLE_FONT, "title_y": BIOME_TITLE_Y}
+        card_type_data = {"font": load_encounter_title_font(), "title_y": BIOME_TITLE_Y}
+    elif card_type in CARD_BACK_TYPES:
+        # The backs of the cards don't have a title nor icons that depend on the card type.
+        card_type_data = {}
 
     # If card_type_data is still None, we haven't handled a card type.
     if card_type_data is None:
@@ -101,47 +115,90 @@ def prepare_card_type_data(card_type):
 class CardCreationFailedException(Exception):
     pass
 
-def create_card(title, image_paths, card_type):
-    """Creates a card given the passed title and the image paths.
-    It also handles saving the created card to a PNG file.
+def get_card_type_data(card_type):
+    try:
+        return prepare_card_type_data(card_type)
+    except UnhandledCardTypeException as exception:
+        raise CardCreationFailedException(f"Failed to prepare the data of a card type from 'create_card'.\nError: {exception}")
+
+
+def draw_background_layers(image_paths, compositing_backend=DEFAULT_COMPOSITING_BACKEND):
+    """Draws the layers of a card that come before its title: the background, the
+    card image and its frame
 
     Parameters
     ----------
-    title : str
-        The title of the card that will be created. It can be None, as in the case of card backs
     image_paths : dict
         All the paths to the images that will be drawn on the card
-    card_type : str
-        The type of the card, such as 'biome'
+    compositing_backend : str
+        Either 'pillow' or 'numpy', as in 'compose_card'
+
+    Returns
+    -------
+    card
+        the card on which all other elements will be drawn
+    draw
+        the draw instance that provides draw methods
     """
 
+    if compositing_backend not in COMPOSITING_BACKENDS:
+        raise CardCreationFailedException(
+            f"Failed to compose a card: the compositing backend '{compositing_backend}' isn't one of {COMPOSITING_BACKENDS}."
+        )
+
     canvas_width, canvas_height = get_default_card_dimensions()
 
     card, draw = draw_base_card(
         image_paths["background_image_path"], canvas_width, canvas_height
     )
 
+    if compositing_backend == "numpy":
+        try:
+            card, draw = create_array_canvas(card)
+        except NumpyNotInstalledException as exception:
+            raise CardCreationFailedException(
+                f"Failed to compose a card from 'compose_card'.\nError: {exception}"
+            )
+
     if "card_image_path" in image_paths.keys():
         draw_card_image(
             card,
-            convert_image_to_rgba(Image.open(image_paths["card_image_path"])),
+            convert_image_to_rgba(load_image(image_paths["card_image_path"])),
             canvas_width,
         )
 
     if "card_image_frame_path" in image_paths.keys():
         draw_card_frame(image_paths["card_image_frame_path"], card, canvas_width)
 
-    try:
-        card_type_data = prepare_card_type_data(card_type)
-    except UnhandledCardTypeException as exception:
-        raise CardCreationFailedException(f"Failed to prepare the data of a card type from 'create_card'.\nError: {exception}")
+    return card, draw
+
+
+def draw_title_layer(title, image_paths, card_type, card_type_data, card, draw):
+    """Draws the title of a card along with its banner. The backs of the cards don't have one
+
+    Parameters
+    ----------
+    title : str
+        The title of the card. It can be None, as in the case of card backs
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+    card_type_data : dict
+        The data of the card type, as returned by 'prepare_card_type_data'
+    card : Image
+        The card on which the title will be drawn
+    draw : ImageDraw
+        The draw instance of the card
+    """
+    canvas_width, _ = get_default_card_dimensions()
 
     title_banner_path = None
 
     if "title_banner_path" in image_paths.keys():
         title_banner_path = image_paths["title_banner_path"]
 
-    if card_type != "encounter_back" and card_type != "biome_back":
+    if card_type not in CARD_BACK_TYPES:
         prepare_to_draw_title(
             title,
             title_banner_path,
@@ -152,6 +209,21 @@ def create_card(title, image_paths, card_type):
             draw,
         )
 
+
+def draw_icon_layers(image_paths, card_type_data, card):
+    """Draws every icon of a card, along with their shadows
+
+    Parameters
+    ----------
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type_data : dict
+        The data of the card type, as returned by 'prepare_card_type_data'
+    card : Image
+        The card on which the icons will be drawn
+    """
+    canvas_width, canvas_height = get_default_card_dimensions()
+
     if "biome_icon_path" in image_paths.keys():
         draw_icons(
             [image_paths["biome_icon_path"]],
@@ -192,10 +264,94 @@ def create_card(title, image_paths, card_type):
             canvas_width,
         )
 
-    apply_rounded_corners_to_card(card)
+
+def copy_card(card, compositing_backend=DEFAULT_COMPOSITING_BACKEND):
+    """Copies a card that's still being composed, so it can be drawn on separately
+
+    Returns
+    -------
+    card
+        the copy of the card
+    draw
+        the draw instance of the copy
+    """
+    if compositing_backend == "numpy":
+        # The canvas gets its own buffer, converted from the one of the copied canvas
+        return create_array_canvas(card.to_image())
+
+    card = card.copy()
+
+    return card, ImageDraw.Draw(card)
+
+
+def finish_card(card, compositing_backend=DEFAULT_COMPOSITING_BACKEND):
+    if compositing_backend == "numpy":
+        card = card.to_image()
+
+    return finalize_card(card)
+
+
+def compose_card(title, image_paths, card_type, compositing_backend=DEFAULT_COMPOSITING_BACKEND):
+    """Composes a card given the passed title and the image paths, without saving it
+
+    Parameters
+    ----------
+    title : str
+        The title of the card that will be created. It can be None, as in the case of card backs
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+    compositing_backend : str
+        Either 'pillow', which pastes every layer onto the card, or 'numpy', which
+        blends them into a single array buffer. The 'numpy' backend is experimental
+        and slower, see 'numpy_compositing' (it requires NumPy)
+
+    Returns
+    -------
+    Image
+        the finished card, with its rounded corners already applied
+    """
+
+    with time_stage("background", card_type):
+        card, draw = draw_background_layers(image_paths, compositing_backend)
+
+    card_type_data = get_card_type_data(card_type)
+
+    with time_stage("title", card_type):
+        draw_title_layer(title, image_paths, card_type, card_type_data, card, draw)
+
+    with time_stage("icons", card_type):
+        draw_icon_layers(image_paths, card_type_data, card)
+
+    with time_stage("finish", card_type):
+        return finish_card(card, compositing_backend)
+
+
+def create_card(title, image_paths, card_type, output_sink=None):
+    """Creates a card given the passed title and the image paths.
+    It also handles saving the created card to a PNG file.
+
+    Parameters
+    ----------
+    title : str
+        The title of the card that will be created. It can be None, as in the case of card backs
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+    output_sink : ArchiveOutputSink
+        Where the card gets written. By default, it's saved under the output directory
+
+    Returns
+    -------
+    str
+        the path of the PNG file the card was saved to
+    """
+    card = compose_card(title, image_paths, card_type)
 
     try:
-        save_card_as_png(title, card, card_type)
+        return save_card_as_png(title, card, card_type, output_sink)
     except UnhandledCardTypeException as exception:
         raise SavingCardFailedError(
             f"From 'create_card', I was unable to save the card as a png file.\nError: {exception}"
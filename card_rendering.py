@@ -0,0 +1,129 @@
+"""Card Rendering
+
+This script exposes the card renderer as a library: the card data goes in as a
+dictionary or an object, and the composed card comes out as an image or as
+encoded bytes. Nothing gets written to disk or printed, so the callers can send
+the results wherever they need them.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * read_card_data - reads the title, the card type and the image paths of a card
+    * render_card - composes a card and returns the image
+    * render_card_to_bytes - composes a card and returns it encoded in the given format
+"""
+
+import io
+from collections.abc import Mapping
+
+from card_generation import DEFAULT_COMPOSITING_BACKEND, compose_card
+
+DEFAULT_IMAGE_FORMAT = "PNG"
+
+# These formats can't store the alpha channel, so the rounded corners get flattened
+FORMATS_WITHOUT_ALPHA = ("JPEG", "JPG")
+
+
+class InvalidCardDataException(Exception):
+    pass
+
+
+def read_card_data(card_data):
+    """Reads the title, the card type and the image paths of a card
+
+    Parameters
+    ----------
+    card_data : dict or object
+        Either a dictionary with the keys 'title', 'card_type' and 'image_paths',
+        or an object with attributes of the same names. The title can be missing
+        for the backs of the cards
+
+    Returns
+    -------
+    str, dict, str
+        the title, the image paths and the card type
+    """
+    if isinstance(card_data, Mapping):
+        title = card_data.get("title")
+        card_type = card_data.get("card_type")
+        image_paths = card_data.get("image_paths")
+    else:
+        title = getattr(card_data, "title", None)
+        card_type = getattr(card_data, "card_type", None)
+        image_paths = getattr(card_data, "image_paths", None)
+
+    if card_type is None:
+        raise InvalidCardDataException("The card data doesn't contain a 'card_type'.")
+
+    if not isinstance(image_paths, Mapping):
+        raise InvalidCardDataException(
+            f"The card data for the card type '{card_type}' doesn't contain a dictionary of 'image_paths'."
+        )
+
+    return title, dict(image_paths), card_type
+
+
+def render_card(card_data, compositing_backend=DEFAULT_COMPOSITING_BACKEND):
+    """Composes a card in memory
+
+    Parameters
+    ----------
+    card_data : dict or object
+        The title, the card type and the image paths of the card
+    compositing_backend : str
+        Either 'pillow' or 'numpy', see 'compose_card'
+
+    Returns
+    -------
+    Image
+        the finished card, in RGBA mode
+    """
+    title, image_paths, card_type = read_card_data(card_data)
+
+    return compose_card(title, image_paths, card_type, compositing_backend)
+
+
+def encode_card(card, image_format=DEFAULT_IMAGE_FORMAT, **save_options):
+    """Encodes a composed card in the given format
+
+    Parameters
+    ----------
+    card : Image
+        The composed card
+    image_format : str
+        Any format that Pillow can write, such as 'PNG' or 'WEBP'
+    save_options
+        Extra options passed to the encoder, such as 'quality'
+
+    Returns
+    -------
+    bytes
+        the encoded card
+    """
+    if image_format.upper() in FORMATS_WITHOUT_ALPHA:
+        card = card.convert("RGB")
+
+    buffer = io.BytesIO()
+    card.save(buffer, format=image_format, **save_options)
+
+    return buffer.getvalue()
+
+
+def render_card_to_bytes(card_data, image_format=DEFAULT_IMAGE_FORMAT, **save_options):
+    """Composes a card in memory and encodes it
+
+    Parameters
+    ----------
+    card_data : dict or object
+        The title, the card type and the image paths of the card
+    image_format : str
+        Any format that Pillow can write, such as 'PNG' or 'WEBP'
+    save_options
+        Extra options passed to the encoder, such as 'quality'
+
+    Returns
+    -------
+    bytes
+        the encoded card
+    """
+    return encode_card(render_card(card_data), image_format, **save_options)
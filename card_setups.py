@@ -3,14 +3,21 @@ import toml
 from card_elements import MissingTitleYCoordinateError
 from card_generation import CardCreationFailedException, SavingCardFailedError, create_card
 from file_utils import UnhandledCardTypeException, ensure_all_image_paths_exist
+from layout import find_layout_problems, layout_card
 
 
 class FailedToCreateCardException(Exception):
     pass
 
 
-def setup_biome_card():
-    """Creates a biome card"""
+def load_biome_card_data():
+    """Loads the title and the image paths of a biome card
+
+    Returns
+    -------
+    str, dict
+        the title of the card and the paths to the images that will be drawn on it
+    """
     biome_data = toml.load("toml/biome_card.toml")
 
     title = biome_data["title"]
@@ -22,10 +29,17 @@ def setup_biome_card():
         "biome_icon_path": biome_icon_path,
     }
 
+    return title, image_paths
+
+
+def setup_biome_card(output_sink=None):
+    """Creates a biome card"""
+    title, image_paths = load_biome_card_data()
+
     ensure_all_image_paths_exist(image_paths)
 
     try:
-        create_card(title, image_paths, "biome")
+        create_card(title, image_paths, "biome", output_sink)
     except MissingTitleYCoordinateError as exception:
         raise FailedToCreateCardException(
             f"Failed to create a card from 'setup_biome_card'.\nError: {exception}"
@@ -41,8 +55,14 @@ def setup_biome_card():
 
 
 
-def setup_biome_back_card():
-    """Creates the back of a biome card"""
+def load_biome_back_card_data():
+    """Loads the image paths of the back of a biome card
+
+    Returns
+    -------
+    None, dict
+        the backs have no title, and the paths to the images that will be drawn on it
+    """
     biome_back_data = toml.load("toml/biome_back_card.toml")
 
     background_image_path = biome_back_data["paths"]["background_image_path"]
@@ -53,10 +73,17 @@ def setup_biome_back_card():
         "back_icon_path": back_icon_path,
     }
 
+    return None, image_paths
+
+
+def setup_biome_back_card(output_sink=None):
+    """Creates the back of a biome card"""
+    title, image_paths = load_biome_back_card_data()
+
     ensure_all_image_paths_exist(image_paths)
 
     try:
-        create_card(None, image_paths, "biome_back")
+        create_card(title, image_paths, "biome_back", output_sink)
     except MissingTitleYCoordinateError as exception:
         raise FailedToCreateCardException(
             f"Failed to create a card from 'setup_biome_back_card'.\nError: {exception}"
@@ -71,8 +98,14 @@ def setup_biome_back_card():
         )
 
 
-def setup_encounter_card():
-    """Creates an encounter card"""
+def load_encounter_card_data():
+    """Loads the title and the image paths of an encounter card
+
+    Returns
+    -------
+    str, dict
+        the title of the card and the paths to the images that will be drawn on it
+    """
     # Load the data from the TOML file
     encounter_data = toml.load("toml/encounter_card.toml")
 
@@ -95,10 +128,17 @@ def setup_encounter_card():
         "struggle_icon_paths": struggle_icon_paths,
     }
 
+    return title, image_paths
+
+
+def setup_encounter_card(output_sink=None):
+    """Creates an encounter card"""
+    title, image_paths = load_encounter_card_data()
+
     ensure_all_image_paths_exist(image_paths)
 
     try:
-        create_card(title, image_paths, "encounter")
+        create_card(title, image_paths, "encounter", output_sink)
     except MissingTitleYCoordinateError as exception:
         raise FailedToCreateCardException(
             f"Failed to create a card from 'setup_encounter_card'.\nError: {exception}"
@@ -113,8 +153,14 @@ def setup_encounter_card():
         )
 
 
-def setup_exploration_zone_card():
-    """Setups the necessary data to create an exploration zone card"""
+def load_exploration_zone_card_data():
+    """Loads the title and the image paths of an exploration zone card
+
+    Returns
+    -------
+    str, dict
+        the title of the card and the paths to the images that will be drawn on it
+    """
     # Load the data from the TOML file
     exploration_zone_data = toml.load("toml/exploration_zone.toml")
 
@@ -130,10 +176,17 @@ def setup_exploration_zone_card():
         "biome_icon_paths": biome_icon_paths,
     }
 
+    return title, image_paths
+
+
+def setup_exploration_zone_card(output_sink=None):
+    """Setups the necessary data to create an exploration zone card"""
+    title, image_paths = load_exploration_zone_card_data()
+
     ensure_all_image_paths_exist(image_paths)
 
     try:
-        create_card(title, image_paths, "exploration_zone")
+        create_card(title, image_paths, "exploration_zone", output_sink)
     except MissingTitleYCoordinateError as exception:
         raise FailedToCreateCardException(
             f"Failed to create a card from 'setup_exploration_zone_card'.\nError: {exception}"
@@ -148,9 +201,14 @@ def setup_exploration_zone_card():
         )
 
 
-def setup_exploration_zone_back_card():
-    """Creates the back of an exploration zone card"""
+def load_exploration_zone_back_card_data():
+    """Loads the image paths of the back of an exploration zone card
 
+    Returns
+    -------
+    None, dict
+        the backs have no title, and the paths to the images that will be drawn on it
+    """
     # Load the data from the TOML file
     exploration_zone_back_data = toml.load("toml/exploration_zone_back.toml")
 
@@ -162,10 +220,17 @@ def setup_exploration_zone_back_card():
         "back_icon_path": back_icon_path,
     }
 
+    return None, image_paths
+
+
+def setup_exploration_zone_back_card(output_sink=None):
+    """Creates the back of an exploration zone card"""
+    title, image_paths = load_exploration_zone_back_card_data()
+
     ensure_all_image_paths_exist(image_paths)
 
     try:
-        create_card(None, image_paths, "exploration_zone_back")
+        create_card(title, image_paths, "exploration_zone_back", output_sink)
     except MissingTitleYCoordinateError as exception:
         raise FailedToCreateCardException(
             f"Failed to create a card from 'setup_exploration_zone_back_card'.\nError: {exception}"
@@ -178,3 +243,52 @@ def setup_exploration_zone_back_card():
         raise FailedToCreateCardException(
             f"I was unable to create a card from 'setup_exploration_zone_back_card'.\nError: {exception}"
         )
+
+
+def load_card_data(card_type):
+    """Loads the title and the image paths of a card from its TOML file
+
+    Parameters
+    ----------
+    card_type : str
+        The type of the card, such as 'biome'
+
+    Returns
+    -------
+    str, dict
+        the title of the card (None for the backs) and the paths to its images
+    """
+    if card_type == "encounter":
+        return load_encounter_card_data()
+    if card_type == "biome":
+        return load_biome_card_data()
+    if card_type == "biome_back":
+        return load_biome_back_card_data()
+    if card_type == "exploration_zone":
+        return load_exploration_zone_card_data()
+    if card_type == "exploration_zone_back":
+        return load_exploration_zone_back_card_data()
+
+    raise UnhandledCardTypeException(
+        f"Failed to load the data of a card: the card type '{card_type}' hasn't been handled."
+    )
+
+
+def check_layout_of_card(card_type):
+    """Computes the layout of a card without rendering it and looks for problems
+
+    Parameters
+    ----------
+    card_type : str
+        The type of the card, such as 'biome'
+
+    Returns
+    -------
+    list
+        the LayoutProblem found, empty if the layout is fine
+    """
+    title, image_paths = load_card_data(card_type)
+
+    ensure_all_image_paths_exist(image_paths)
+
+    return find_layout_problems(layout_card(title, image_paths, card_type))
@@ -0,0 +1,257 @@
+"""Deck
+
+This script renders every card listed in a deck manifest: a TOML file where each
+[[cards]] table holds the 'card_type', the 'title' and the 'image_paths' of one
+card, with the same keys that 'create_card' expects. See 'toml/deck.toml'. Large
+decks can come as JSON lines or CSV exports instead, which are read one row at
+a time (see 'manifest_streams.py').
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * load_deck_manifest - loads the cards listed in a deck manifest
+
+Usage: python deck.py toml/deck.toml --output output/deck.zip --memory-budget-mb 512
+       python deck.py cards.csv --column-mapping columns.json
+       python deck.py toml/deck.toml --resume
+       python deck.py cards.jsonl --metrics-textfile /var/lib/node_exporter/cards.prom
+"""
+
+import argparse
+import json
+
+import toml
+
+from assets import persist_asset_index
+from batch_rendering import (
+    DEFAULT_ENCODER_THREADS,
+    DEFAULT_MAX_ATTEMPTS,
+    FailedToRenderBatchException,
+    render_batch,
+)
+from file_utils import OUTPUT_DIRECTORY
+from gallery import Gallery
+from manifest_streams import UnhandledManifestFormatException, open_manifest_stream
+from metrics import MetricsRegistry, write_metrics
+from output_sinks import UnhandledOutputDestinationException, open_output_sink
+from png_optimizer import PngOptimizer
+from render_journal import RenderJournal
+
+
+def parse_positive_integer(value):
+    """Parses a command line argument that must be an integer of at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' isn't an integer.")
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"It must be at least 1, not {number}.")
+
+    return number
+
+
+def load_deck_manifest(manifest_path):
+    """Loads the cards listed in a deck manifest
+
+    Parameters
+    ----------
+    manifest_path : str
+        The path to the TOML deck manifest
+
+    Returns
+    -------
+    list
+        the card data of every card, as dictionaries
+    """
+    deck_data = toml.load(manifest_path)
+
+    return deck_data.get("cards", [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deck Generator")
+    parser.add_argument(
+        "manifest",
+        help="Path to the manifest of the deck: a TOML file, or a JSON lines or CSV "
+        "export, which get read one row at a time.",
+    )
+    parser.add_argument(
+        "--column-mapping",
+        help="Path to a JSON object that maps the headers of a CSV manifest to the keys of the card data.",
+    )
+    parser.add_argument(
+        "--output",
+        help="Path to a '.zip' or '.tar' archive to stream the cards into. "
+        "By default, every card is saved as a PNG file under the output directory.",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=parse_positive_integer,
+        help="The resident memory above which the image caches get emptied and the pipeline drains. "
+        "It's ignored if the process already uses more when the run starts.",
+    )
+
+    parser.add_argument(
+        "--journal",
+        default=f"{OUTPUT_DIRECTORY}/render_journal.jsonl",
+        help="Path to the journal where every rendered and failed card is recorded.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip the cards the journal has as rendered, if their inputs and output didn't change.",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help="How many times a failing card is tried, across resumed runs, before giving up on it.",
+    )
+
+    parser.add_argument(
+        "--encoder-threads",
+        type=parse_positive_integer,
+        default=DEFAULT_ENCODER_THREADS,
+        help="How many threads encode and write the rendered cards.",
+    )
+    parser.add_argument(
+        "--optimize-png",
+        action="store_true",
+        help="Encode every card as the smallest lossless PNG, and report the bytes saved.",
+    )
+    parser.add_argument(
+        "--min-psnr",
+        type=float,
+        help="Also quantize the cards to 256 colours when they stay above this PSNR in decibels. Implies '--optimize-png'.",
+    )
+    parser.add_argument(
+        "--exhaustive-compression",
+        action="store_true",
+        help="Search for the best compression, which is several times slower. Implies '--optimize-png'.",
+    )
+
+    parser.add_argument(
+        "--gallery",
+        help="The directory of a gallery of the deck, whose contact sheets only get redrawn when their cards change.",
+    )
+
+    parser.add_argument(
+        "--metrics-textfile",
+        help="Where to write the metrics of the run as a Prometheus textfile, such as 'output/deck.prom'.",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        help="Where to write the metrics of the run as JSON, such as 'output/deck_metrics.json'.",
+    )
+
+    args = parser.parse_args()
+
+    memory_budget = None
+
+    if args.memory_budget_mb is not None:
+        memory_budget = args.memory_budget_mb * 1024 * 1024
+
+    column_mapping = None
+
+    if args.column_mapping is not None:
+        with open(args.column_mapping, encoding="utf-8") as column_mapping_file:
+            column_mapping = json.load(column_mapping_file)
+
+    try:
+        manifest_stream = open_manifest_stream(args.manifest, column_mapping)
+    except UnhandledManifestFormatException as exception:
+        print(f"Failed to render the deck from main.\nError: {exception}")
+        return
+
+    persist_asset_index()
+
+    journal = RenderJournal(args.journal, resume=args.resume)
+
+    png_optimizer = None
+
+    # Both only tune the optimizer, so asking for them asks for it
+    if args.optimize_png or args.min_psnr is not None or args.exhaustive_compression:
+        png_optimizer = PngOptimizer(args.min_psnr, args.exhaustive_compression)
+
+    gallery = None
+
+    if args.gallery is not None:
+        gallery = Gallery(args.gallery)
+
+    metrics = None
+
+    if args.metrics_textfile is not None or args.metrics_json is not None:
+        metrics = MetricsRegistry()
+
+    try:
+        with open_output_sink(args.output) as output_sink:
+            report = render_batch(
+                manifest_stream,
+                output_sink,
+                memory_budget,
+                journal=journal,
+                max_attempts=args.max_attempts,
+                encoder_threads=args.encoder_threads,
+                png_optimizer=png_optimizer,
+                gallery=gallery,
+                metrics=metrics,
+            )
+
+        if gallery is not None:
+            gallery.close()
+    except UnhandledOutputDestinationException as exception:
+        print(f"Failed to render the deck from main.\nError: {exception}")
+        return
+    except FailedToRenderBatchException as exception:
+        print(f"Failed to render the deck from main.\nError: {exception}")
+        return
+    finally:
+        journal.close()
+
+        if metrics is not None:
+            metrics.increment("manifest_rows_invalid_total", amount=len(manifest_stream.invalid_rows))
+            write_metrics(metrics, args.metrics_textfile, args.metrics_json)
+
+    print(f"Rendered {len(report['written_paths'])} cards.")
+
+    if report["skipped_cards"]:
+        print(f"Skipped {report['skipped_cards']} cards that were already rendered.")
+
+    for failed_card in report["failed_cards"]:
+        print(failed_card["error"])
+
+    for invalid_row in manifest_stream.invalid_rows:
+        print(f"Skipped an invalid row of the manifest. {invalid_row['error']}")
+
+    if report["memory_budget_disabled"]:
+        print(
+            f"Warning: the memory budget of {args.memory_budget_mb} MB was ignored, since the process "
+            f"already used {report['starting_rss'] / 1024 / 1024:.1f} MB when the run started."
+        )
+
+    for card_type, peak_rss in sorted(report["peak_rss_by_card_type"].items()):
+        print(f"Peak RSS while rendering '{card_type}' cards: {peak_rss / 1024 / 1024:.1f} MB")
+
+    if png_optimizer is not None:
+        for optimization in png_optimizer.reports:
+            print(
+                f"'{optimization['title']}' ({optimization['card_type']}): "
+                f"{optimization['original_bytes']} -> {optimization['optimized_bytes']} bytes "
+                f"({optimization['method']}, PSNR {optimization['psnr']:.1f} dB)"
+            )
+
+        print(f"The PNG optimizer saved {png_optimizer.calculate_bytes_saved()} bytes.")
+
+    if gallery is not None:
+        print(
+            f"The gallery has {len(gallery.pages)} pages: {gallery.redrawn_pages} were redrawn, "
+            f"and {gallery.created_thumbnails} cards were downscaled."
+        )
+
+    if report["cache_clears"]:
+        print(f"The image caches were emptied {report['cache_clears']} times to stay within the budget.")
+
+
+if __name__ == "__main__":
+    main()
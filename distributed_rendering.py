@@ -0,0 +1,577 @@
+"""Distributed Rendering
+
+This script splits the rendering of a deck across several machines. A coordinator
+shards the deck manifest into work units, and workers on any node that can see
+the same queue directory (a network share, for instance) claim the units, render
+their cards through 'create_card' and report the results back.
+
+The queue directory holds a subdirectory per state of the units:
+
+    * pending - the units waiting for a worker
+    * claimed - the units being rendered, named after the worker holding them
+    * results - the results reported by the workers, one per finished unit
+    * failed - the units whose lease expired too many times
+
+A worker claims a unit by renaming it from 'pending' to 'claimed', which only one
+worker can win. The modification time of the claimed unit is its lease: the worker
+keeps touching it while it renders, and the coordinator puts the units whose lease
+expired back into 'pending', so the cards of a worker that died get rendered by
+another one. Since the cards are written atomically, rendering a unit twice is
+harmless.
+
+Everything can run on one machine, with worker processes standing in for nodes.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * shard_deck - splits the cards of a deck into work units in the queue directory
+    * wait_for_units - waits for the workers to render every unit of the queue
+    * run_coordinator - shards a deck and waits for the workers to render all of it
+    * run_worker - claims and renders work units until the coordinator is done
+
+Usage: python distributed_rendering.py coordinate toml/deck.toml --queue-directory queue --local-workers 4
+       python distributed_rendering.py work --queue-directory /mnt/shared/queue
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+
+from card_elements import MissingTitleYCoordinateError
+from card_generation import (
+    CardCreationFailedException,
+    SavingCardFailedError,
+    create_card,
+)
+from card_rendering import InvalidCardDataException, read_card_data
+from deck import load_deck_manifest
+from file_utils import (
+    IncorrectImagePathException,
+    ensure_all_image_paths_exist,
+    write_file_atomically,
+)
+
+PENDING = "pending"
+CLAIMED = "claimed"
+RESULTS = "results"
+FAILED = "failed"
+QUEUE_STATES = (PENDING, CLAIMED, RESULTS, FAILED)
+
+# Tells the workers that every unit is finished
+STOP_FILENAME = "stop"
+
+DEFAULT_UNIT_SIZE = 16
+DEFAULT_LEASE_DURATION = 30.0
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_MAX_LEASE_EXPIRATIONS = 3
+
+
+class FailedToCoordinateRenderingException(Exception):
+    pass
+
+
+def get_state_directory(queue_directory, state):
+    return os.path.join(queue_directory, state)
+
+
+def write_json_atomically(filename, content):
+    encoded_content = json.dumps(content).encode("utf-8")
+
+    write_file_atomically(filename, lambda json_file: json_file.write(encoded_content))
+
+
+def read_json(filename):
+    with open(filename, encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def shard_deck(cards, queue_directory, unit_size=DEFAULT_UNIT_SIZE):
+    """Splits the cards of a deck into work units in the queue directory. Whatever
+    was left in the queue directory by a previous run is removed
+
+    Parameters
+    ----------
+    cards : iterable
+        The card data of every card, as dictionaries
+    queue_directory : str
+        The directory shared by the coordinator and the workers
+    unit_size : int
+        How many cards each work unit holds
+
+    Returns
+    -------
+    list
+        the IDs of the work units
+    """
+    for state in QUEUE_STATES:
+        shutil.rmtree(get_state_directory(queue_directory, state), ignore_errors=True)
+        os.makedirs(get_state_directory(queue_directory, state))
+
+    stop_path = os.path.join(queue_directory, STOP_FILENAME)
+
+    if os.path.exists(stop_path):
+        os.remove(stop_path)
+
+    unit_ids = []
+    unit_cards = []
+
+    def write_unit():
+        unit_id = f"unit-{len(unit_ids):05d}"
+        write_json_atomically(
+            os.path.join(get_state_directory(queue_directory, PENDING), f"{unit_id}.json"),
+            {"unit_id": unit_id, "cards": unit_cards},
+        )
+        unit_ids.append(unit_id)
+
+    for index, card_data in enumerate(cards):
+        unit_cards.append({"index": index, "card_data": card_data})
+
+        if len(unit_cards) == unit_size:
+            write_unit()
+            unit_cards = []
+
+    if unit_cards:
+        write_unit()
+
+    return unit_ids
+
+
+def get_unit_id(filename):
+    """Gets the ID of a unit from its filename, in any of the states"""
+    return filename.split("@")[0].removesuffix(".json")
+
+
+class Lease:
+    """Keeps a claimed unit alive by touching it periodically while it's rendered"""
+
+    def __init__(self, claimed_path, lease_duration):
+        self.claimed_path = claimed_path
+        self.heartbeat_interval = lease_duration / 3
+        self.lost = threading.Event()
+        self.released = threading.Event()
+        self.heartbeat = threading.Thread(target=self.beat, daemon=True)
+
+    def start(self):
+        self.heartbeat.start()
+
+    def beat(self):
+        while not self.released.wait(self.heartbeat_interval):
+            try:
+                os.utime(self.claimed_path)
+            except FileNotFoundError:
+                # The coordinator gave the unit to another worker
+                self.lost.set()
+                return
+
+    def release(self):
+        self.released.set()
+        self.heartbeat.join()
+
+
+def claim_unit(queue_directory, worker_id):
+    """Claims the first pending unit that no other worker claimed
+
+    Parameters
+    ----------
+    queue_directory : str
+        The directory shared by the coordinator and the workers
+    worker_id : str
+        The ID of the worker claiming the unit
+
+    Returns
+    -------
+    str
+        the path to the claimed unit, or None if there was no pending unit left
+    """
+    pending_directory = get_state_directory(queue_directory, PENDING)
+    claimed_directory = get_state_directory(queue_directory, CLAIMED)
+
+    try:
+        pending_filenames = sorted(os.listdir(pending_directory))
+    except FileNotFoundError:
+        # The coordinator hasn't sharded the deck yet, or it's sharding it again
+        return None
+
+    for filename in pending_filenames:
+        pending_path = os.path.join(pending_directory, filename)
+        claimed_path = os.path.join(
+            claimed_directory, f"{get_unit_id(filename)}@{worker_id}.json"
+        )
+
+        try:
+            # Renaming keeps the modification time, which would make the lease look expired
+            os.utime(pending_path)
+            os.rename(pending_path, claimed_path)
+        except FileNotFoundError:
+            # Another worker claimed it first
+            continue
+
+        return claimed_path
+
+    return None
+
+
+def get_stop_signature(queue_directory):
+    """Identifies the stop file, so a stop left by a previous run can be told apart
+    from the one of the current run, without comparing the clocks of the machines"""
+    try:
+        stat = os.stat(os.path.join(queue_directory, STOP_FILENAME))
+    except FileNotFoundError:
+        return None
+
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def render_unit(unit, lease):
+    """Renders every card of a unit, as long as the worker still holds its lease
+
+    Returns
+    -------
+    dict
+        the 'written_paths' and the 'failed_cards' of the unit, or None if the lease was lost
+    """
+    written_paths = []
+    failed_cards = []
+
+    for unit_card in unit["cards"]:
+        if lease.lost.is_set():
+            return None
+
+        try:
+            title, image_paths, card_type = read_card_data(unit_card["card_data"])
+
+            ensure_all_image_paths_exist(image_paths)
+
+            written_paths.append(create_card(title, image_paths, card_type))
+        except (
+            InvalidCardDataException,
+            IncorrectImagePathException,
+            MissingTitleYCoordinateError,
+            SavingCardFailedError,
+            CardCreationFailedException,
+            OSError,
+        ) as exception:
+            failed_cards.append(
+                {
+                    "index": unit_card["index"],
+                    "error": f"Failed to render the card at index {unit_card['index']}.\nError: {exception}",
+                }
+            )
+
+    return {"written_paths": written_paths, "failed_cards": failed_cards}
+
+
+def run_worker(
+    queue_directory,
+    worker_id=None,
+    lease_duration=DEFAULT_LEASE_DURATION,
+    poll_interval=DEFAULT_POLL_INTERVAL,
+):
+    """Claims and renders work units until the coordinator says every unit is finished
+
+    Parameters
+    ----------
+    queue_directory : str
+        The directory shared by the coordinator and the workers
+    worker_id : str
+        The ID of the worker. By default, it's made of the host name and the process ID
+    lease_duration : float
+        How many seconds a claimed unit stays with this worker without a heartbeat.
+        It must be the same as the coordinator's
+    poll_interval : float
+        How many seconds to wait before looking for pending units again
+
+    Returns
+    -------
+    int
+        how many units this worker rendered
+    """
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    results_directory = get_state_directory(queue_directory, RESULTS)
+    rendered_units = 0
+
+    # A worker started before the coordinator mustn't obey the stop of the previous run
+    stale_stop_signature = get_stop_signature(queue_directory)
+
+    while get_stop_signature(queue_directory) in (None, stale_stop_signature):
+        claimed_path = claim_unit(queue_directory, worker_id)
+
+        if claimed_path is None:
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            unit = read_json(claimed_path)
+        except FileNotFoundError:
+            # The lease expired before the unit could even be read
+            continue
+
+        lease = Lease(claimed_path, lease_duration)
+        lease.start()
+
+        try:
+            result = render_unit(unit, lease)
+        finally:
+            lease.release()
+
+        if result is None:
+            continue
+
+        result["unit_id"] = unit["unit_id"]
+        result["worker_id"] = worker_id
+
+        try:
+            write_json_atomically(
+                os.path.join(results_directory, f"{unit['unit_id']}.json"), result
+            )
+        except FileNotFoundError:
+            # The coordinator started a new run and reset the queue while this unit rendered
+            continue
+
+        try:
+            os.remove(claimed_path)
+        except FileNotFoundError:
+            pass
+
+        rendered_units += 1
+
+    return rendered_units
+
+
+def reap_expired_leases(queue_directory, lease_duration, lease_expirations, max_lease_expirations):
+    """Puts the claimed units whose lease expired back into 'pending', or into
+    'failed' once their lease expired too many times"""
+    claimed_directory = get_state_directory(queue_directory, CLAIMED)
+    expired_before = time.time() - lease_duration
+
+    for filename in os.listdir(claimed_directory):
+        claimed_path = os.path.join(claimed_directory, filename)
+        unit_id = get_unit_id(filename)
+
+        try:
+            if os.stat(claimed_path).st_mtime >= expired_before:
+                continue
+
+            lease_expirations[unit_id] = lease_expirations.get(unit_id, 0) + 1
+            state = PENDING
+
+            if lease_expirations[unit_id] >= max_lease_expirations:
+                state = FAILED
+
+            os.rename(
+                claimed_path,
+                os.path.join(get_state_directory(queue_directory, state), f"{unit_id}.json"),
+            )
+        except FileNotFoundError:
+            # The worker finished the unit in the meantime
+            pass
+
+
+def wait_for_units(
+    unit_ids,
+    queue_directory,
+    lease_duration=DEFAULT_LEASE_DURATION,
+    max_lease_expirations=DEFAULT_MAX_LEASE_EXPIRATIONS,
+    poll_interval=DEFAULT_POLL_INTERVAL,
+    timeout=None,
+):
+    """Waits for the workers to render every unit, reaping the expired leases, and
+    then tells the workers to stop
+
+    Parameters
+    ----------
+    unit_ids : list
+        The IDs of the work units, as returned by 'shard_deck'
+    queue_directory : str
+        The directory shared by the coordinator and the workers
+    lease_duration : float
+        How many seconds a claimed unit stays with a worker without a heartbeat
+    max_lease_expirations : int
+        How many times the lease of a unit can expire before giving up on it
+    poll_interval : float
+        How many seconds to wait between two checks of the queue
+    timeout : float
+        How many seconds to wait for the workers. By default, there's no limit
+
+    Returns
+    -------
+    dict
+        the 'written_paths', the 'failed_cards', the 'failed_units' whose lease
+        expired too many times, the number of 'lease_expirations' and the
+        'units_by_worker'
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    lease_expirations = {}
+
+    results_directory = get_state_directory(queue_directory, RESULTS)
+    failed_directory = get_state_directory(queue_directory, FAILED)
+
+    try:
+        while True:
+            reap_expired_leases(
+                queue_directory, lease_duration, lease_expirations, max_lease_expirations
+            )
+
+            finished_unit_ids = {
+                get_unit_id(filename)
+                for filename in os.listdir(results_directory) + os.listdir(failed_directory)
+            }
+
+            if finished_unit_ids.issuperset(unit_ids):
+                break
+
+            if deadline is not None and time.monotonic() > deadline:
+                raise FailedToCoordinateRenderingException(
+                    f"From 'wait_for_units', {len(unit_ids) - len(finished_unit_ids)} units "
+                    f"were still not rendered after {timeout} seconds."
+                )
+
+            time.sleep(poll_interval)
+    finally:
+        with open(os.path.join(queue_directory, STOP_FILENAME), "w", encoding="utf-8"):
+            pass
+
+    report = {
+        "written_paths": [],
+        "failed_cards": [],
+        "failed_units": sorted(map(get_unit_id, os.listdir(failed_directory))),
+        "lease_expirations": sum(lease_expirations.values()),
+        "units_by_worker": {},
+    }
+
+    for filename in sorted(os.listdir(results_directory)):
+        result = read_json(os.path.join(results_directory, filename))
+
+        report["written_paths"].extend(result["written_paths"])
+        report["failed_cards"].extend(result["failed_cards"])
+        report["units_by_worker"][result["worker_id"]] = (
+            report["units_by_worker"].get(result["worker_id"], 0) + 1
+        )
+
+    return report
+
+
+def run_coordinator(cards, queue_directory, unit_size=DEFAULT_UNIT_SIZE, **wait_options):
+    """Shards a deck into the queue directory and waits for the workers to render all of it
+
+    Parameters
+    ----------
+    cards : iterable
+        The card data of every card, as dictionaries
+    queue_directory : str
+        The directory shared by the coordinator and the workers
+    unit_size : int
+        How many cards each work unit holds
+    wait_options
+        The options of 'wait_for_units', such as the 'lease_duration'
+
+    Returns
+    -------
+    dict
+        the report of 'wait_for_units'
+    """
+    unit_ids = shard_deck(cards, queue_directory, unit_size)
+
+    return wait_for_units(unit_ids, queue_directory, **wait_options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed Deck Generator")
+    parser.add_argument(
+        "--queue-directory",
+        required=True,
+        help="The directory shared by the coordinator and the workers.",
+    )
+    parser.add_argument(
+        "--lease-duration",
+        type=float,
+        default=DEFAULT_LEASE_DURATION,
+        help="How many seconds a claimed unit stays with a worker without a heartbeat.",
+    )
+
+    subparsers = parser.add_subparsers(dest="role", required=True)
+
+    coordinator_parser = subparsers.add_parser(
+        "coordinate", help="Shard a deck manifest and wait for the workers to render it."
+    )
+    coordinator_parser.add_argument("manifest", help="Path to the TOML manifest of the deck.")
+    coordinator_parser.add_argument(
+        "--unit-size",
+        type=int,
+        default=DEFAULT_UNIT_SIZE,
+        help="How many cards each work unit holds.",
+    )
+    coordinator_parser.add_argument(
+        "--local-workers",
+        type=int,
+        default=0,
+        help="How many worker processes to start on this machine.",
+    )
+    coordinator_parser.add_argument(
+        "--timeout", type=float, help="How many seconds to wait for the workers."
+    )
+
+    worker_parser = subparsers.add_parser(
+        "work", help="Claim and render work units until the coordinator is done."
+    )
+    worker_parser.add_argument("--worker-id", help="The ID of this worker.")
+
+    args = parser.parse_args()
+
+    if args.role == "work":
+        rendered_units = run_worker(args.queue_directory, args.worker_id, args.lease_duration)
+        print(f"Rendered {rendered_units} units.")
+        return
+
+    # The queue has to exist before the local workers start polling it
+    unit_ids = shard_deck(
+        load_deck_manifest(args.manifest), args.queue_directory, args.unit_size
+    )
+    local_workers = []
+
+    for worker_number in range(args.local_workers):
+        worker = multiprocessing.Process(
+            target=run_worker,
+            args=(args.queue_directory, f"local-{worker_number}", args.lease_duration),
+        )
+        worker.start()
+        local_workers.append(worker)
+
+    try:
+        report = wait_for_units(
+            unit_ids,
+            args.queue_directory,
+            args.lease_duration,
+            timeout=args.timeout,
+        )
+    except FailedToCoordinateRenderingException as exception:
+        print(f"Failed to render the deck from main.\nError: {exception}")
+        return
+    finally:
+        for worker in local_workers:
+            worker.join()
+
+    print(f"Rendered {len(report['written_paths'])} cards.")
+
+    for failed_card in report["failed_cards"]:
+        print(failed_card["error"])
+
+    for unit_id in report["failed_units"]:
+        print(f"Gave up on '{unit_id}' after its lease expired too many times.")
+
+    if report["lease_expirations"]:
+        print(f"Leases expired {report['lease_expirations']} times.")
+
+    for worker_id, units in sorted(report["units_by_worker"].items()):
+        print(f"'{worker_id}' rendered {units} units.")
+
+
+if __name__ == "__main__":
+    main()
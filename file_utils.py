@@ -1,4 +1,5 @@
 import os
+import threading
 
 from errors import UnhandledCardTypeException
 
@@ -9,12 +10,24 @@ class IncorrectImagePathException(Exception):
     pass
 
 
+class InvalidCardTitleException(Exception):
+    pass
+
+
 def check_file_exists(path):
     return os.path.exists(path)
 
 
 def ensure_all_image_paths_exist(image_paths):
     for key, value in image_paths.items():
+        # The card data can come from JSON, where a path can be null or a number
+        if not isinstance(value, (str, list)) or (
+            isinstance(value, list) and not all(isinstance(path, str) for path in value)
+        ):
+            raise IncorrectImagePathException(
+                f"The path for '{key}' must be a string or a list of strings, not '{value}'."
+            )
+
         if not isinstance(value, list):
             if not check_file_exists(value):
                 raise IncorrectImagePathException(
@@ -30,15 +43,46 @@ def ensure_all_image_paths_exist(image_paths):
 
 
 
-def save_card_as_png(title, card, card_type):
-    """Saves the card image as a PNG file
+def write_file_atomically(filename, write_content):
+    """Writes a file through a temporary file that then replaces it, so the file is
+    either missing or complete, even if the process dies while writing it
 
     Parameters
     ----------
-    title : str
-        The title of the card, to use as part of the filename
-    card : Image
-        The image that will get saved to a PNG file
+    filename : str
+        The path of the file to write
+    write_content : callable
+        Receives the temporary file, opened in binary mode, and writes the content
+    """
+    # Unique per process and thread, so concurrent writers never share a temporary file
+    temporary_path = os.path.join(
+        os.path.dirname(filename),
+        f".{os.path.basename(filename)}.{os.getpid()}.{threading.get_ident()}.tmp",
+    )
+
+    try:
+        with open(temporary_path, "wb") as temporary_file:
+            write_content(temporary_file)
+
+        os.replace(temporary_path, filename)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def get_card_type_directory(card_type):
+    """Gets the directory, inside the output directory, where a type of card is saved
+
+    Parameters
+    ----------
+    card_type : str
+        The type of the card, such as 'biome'
+
+    Returns
+    -------
+    str
+        the name of the directory for that type of card
     """
 
     if card_type == "biome" or card_type == "biome_back":
@@ -52,13 +96,88 @@ def save_card_as_png(title, card, card_type):
             f"Failed to save a card to a file: can't handle card type '{card_type}'"
         )
 
-    full_path = format(f"{OUTPUT_DIRECTORY}/{card_type_directory}")
+    return card_type_directory
+
+
+def ensure_title_is_a_filename(title):
+    """Makes sure that a title can't lead the file of its card out of the
+    directory of its card type, since it's used as part of the filename
+
+    Parameters
+    ----------
+    title : str
+        The title of the card. It can be None, as in the case of card backs
+    """
+    if title is None:
+        return
+
+    if not isinstance(title, str):
+        raise InvalidCardTitleException(f"The title of a card must be a string, not '{title}'.")
+
+    if "/" in title or "\\" in title or ".." in title or "\0" in title:
+        raise InvalidCardTitleException(
+            f"The title '{title}' can't contain a path separator or '..'."
+        )
+
 
-    if not os.path.exists(full_path):
-        os.makedirs(full_path)
+def get_card_filename(title, card_type):
+    """Gets the path of the PNG file where a card gets saved
 
-    filename = f"{full_path}/{title}_card.png"
+    Parameters
+    ----------
+    title : str
+        The title of the card, to use as part of the filename
+    card_type : str
+        The type of the card, such as 'biome'
 
-    card.save(filename)
+    Returns
+    -------
+    str
+        the path of the PNG file, inside the output directory
+    """
+    ensure_title_is_a_filename(title)
+
+    full_path = format(f"{OUTPUT_DIRECTORY}/{get_card_type_directory(card_type)}")
+
+    return f"{full_path}/{title}_card.png"
+
+
+def save_card_as_png(title, card, card_type, output_sink=None):
+    """Saves the card image as a PNG file
+
+    Parameters
+    ----------
+    title : str
+        The title of the card, to use as part of the filename
+    card : Image or bytes
+        The image that will get saved to a PNG file, or its PNG bytes if it was
+        already encoded, for instance by the PNG optimizer
+    output_sink : ArchiveOutputSink
+        If given, the card gets written to this sink (for example a ZIP archive)
+        instead of to a file under the output directory
+
+    Returns
+    -------
+    str
+        the path of the saved PNG file
+    """
+    if output_sink is not None:
+        return output_sink.write_card(title, card, card_type)
+
+    filename = get_card_filename(title, card_type)
+
+    full_path = os.path.dirname(filename)
+
+    # Several threads can save the first cards of a type at the same time
+    os.makedirs(full_path, exist_ok=True)
+
+    if isinstance(card, bytes):
+        write_file_atomically(filename, lambda png_file: png_file.write(card))
+    else:
+        write_file_atomically(
+            filename, lambda png_file: card.save(png_file, format="PNG")
+        )
 
     print(f"Card '{filename}' saved successfully.")
+
+    return filename
@@ -1,6 +1,17 @@
+import threading
+from functools import lru_cache
+
 from PIL import ImageFont
 
+# Every card type draws its titles with the same few fonts
+FONT_CACHE_SIZE = 16
+
+# The fonts are shared by every thread, but a FreeType face can't measure or draw
+# from several threads at once. Drawing the titles is a small part of a card
+FONT_LOCK = threading.RLock()
 
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
 def load_font(font_path, size):
     """Loads a font
 
@@ -14,10 +25,22 @@ def load_font(font_path, size):
     Returns
     -------
     FreeTypeFont
-        the loaded font
+        the loaded font, which is cached and so must not be modified
     """
     return ImageFont.truetype(font_path, size)
 
 
-BIOME_TITLE_FONT = load_font("fonts/Roboto-Bold.ttf", 60)
-ENCOUNTER_TITLE_FONT = load_font("fonts/Roboto-Bold.ttf", 42)
+TITLE_FONT_PATH = "fonts/Roboto-Bold.ttf"
+BIOME_TITLE_FONT_SIZE = 60
+ENCOUNTER_TITLE_FONT_SIZE = 42
+
+
+def load_biome_title_font():
+    """Loads the font of the titles of the biome cards, the first time it's needed"""
+    return load_font(TITLE_FONT_PATH, BIOME_TITLE_FONT_SIZE)
+
+
+def load_encounter_title_font():
+    """Loads the font of the titles of the encounter and exploration zone cards, the
+    first time it's needed"""
+    return load_font(TITLE_FONT_PATH, ENCOUNTER_TITLE_FONT_SIZE)
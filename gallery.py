@@ -0,0 +1,420 @@
+"""Gallery
+
+This script builds a gallery of a deck to review it at a glance: paginated
+contact sheets, with a grid of thumbnails on each page, and a static HTML index
+linking every page and every card.
+
+The cards are added in deck order, once they're written, while they're still
+in memory. Each card is downscaled only once, and its thumbnail is kept under the
+gallery, named after the hash of the PNG bytes of the card. A card that renders
+the same is never downscaled again, while any change to the renderer that
+changes its pixels gets a new thumbnail. Only the thumbnails of the current page are
+kept, until the page is full and they get pasted onto its sheet, so there's
+never more than one page worth of thumbnails in memory.
+
+The gallery keeps the fingerprint of every page, made from the fingerprints of
+its cards, and only draws the sheets and the HTML of the pages whose cards
+changed since the last time.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * create_thumbnail - downscales a card into its thumbnail
+    * fingerprint_card_bytes - hashes the PNG bytes of a rendered card
+
+Usage: python gallery.py output --gallery-directory output/gallery
+"""
+
+import argparse
+import hashlib
+import html
+import io
+import json
+import math
+import os
+
+from PIL import Image, ImageDraw
+
+from card_elements import get_default_card_dimensions
+from file_utils import write_file_atomically
+from fonts import TITLE_FONT_PATH, load_font
+
+DEFAULT_GALLERY_DIRECTORY = "output/gallery"
+GALLERY_INDEX_FILENAME = "gallery.json"
+THUMBNAIL_DIRECTORY = "thumbnails"
+
+DEFAULT_COLUMNS = 6
+DEFAULT_ROWS = 4
+
+# The cards get reduced by this factor, which turns a 750x1039 card into 188x260
+THUMBNAIL_REDUCTION = 4
+
+SHEET_MARGIN = 16
+LABEL_HEIGHT = 24
+SHEET_BACKGROUND_COLOR = (32, 32, 32)
+LABEL_FONT_SIZE = 14
+
+
+def get_default_thumbnail_size():
+    card_width, card_height = get_default_card_dimensions()
+
+    return (
+        math.ceil(card_width / THUMBNAIL_REDUCTION),
+        math.ceil(card_height / THUMBNAIL_REDUCTION),
+    )
+
+
+def create_thumbnail(card):
+    """Downscales a card into its thumbnail
+
+    Parameters
+    ----------
+    card : Image
+        The finished card
+
+    Returns
+    -------
+    Image
+        the thumbnail, in RGBA mode
+    """
+    return card.convert("RGBA").reduce(THUMBNAIL_REDUCTION)
+
+
+def encode_thumbnail(image):
+    # The thumbnails and the sheets are only for reviewing, so they favor a fast encoding
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+
+    return buffer.getvalue()
+
+
+def fingerprint_card_bytes(card_bytes):
+    """Hashes the PNG bytes of a rendered card, the same way as 'fingerprint_file'
+
+    Parameters
+    ----------
+    card_bytes : bytes
+        The PNG bytes of the card, as they were written
+
+    Returns
+    -------
+    str
+        the fingerprint of the rendered card
+    """
+    return hashlib.sha256(card_bytes).hexdigest()
+
+
+def fingerprint_file(path):
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class Gallery:
+    """Lays out the cards of a deck on contact sheets, one page at a time"""
+
+    def __init__(
+        self,
+        gallery_directory=DEFAULT_GALLERY_DIRECTORY,
+        columns=DEFAULT_COLUMNS,
+        rows=DEFAULT_ROWS,
+        thumbnail_size=None,
+    ):
+        """
+        Parameters
+        ----------
+        gallery_directory : str
+            Where the sheets, the thumbnails and the HTML pages get written
+        columns : int
+            How many thumbnails each row of a sheet holds
+        rows : int
+            How many rows of thumbnails each sheet holds
+        thumbnail_size : tuple
+            The size of the grid cells. By default, the size of the thumbnails of
+            cards of the default dimensions
+        """
+        self.gallery_directory = gallery_directory
+        self.columns = columns
+        self.rows = rows
+        self.thumbnail_width, self.thumbnail_height = (
+            thumbnail_size or get_default_thumbnail_size()
+        )
+
+        self.previous_pages = self.load_previous_pages()
+        self.pages = []
+        self.page_cards = []
+        self.redrawn_pages = 0
+        self.created_thumbnails = 0
+
+        os.makedirs(os.path.join(gallery_directory, THUMBNAIL_DIRECTORY), exist_ok=True)
+
+    def load_previous_pages(self):
+        try:
+            with open(
+                os.path.join(self.gallery_directory, GALLERY_INDEX_FILENAME), encoding="utf-8"
+            ) as index_file:
+                return json.load(index_file)["pages"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def get_thumbnail_path(self, fingerprint):
+        return os.path.join(self.gallery_directory, THUMBNAIL_DIRECTORY, f"{fingerprint}.png")
+
+    def get_sheet_filename(self, page_number):
+        return f"page-{page_number:04d}.png"
+
+    def get_page_filename(self, page_number):
+        return f"page-{page_number:04d}.html"
+
+    def add_card(self, title, card_type, fingerprint, card=None, card_path=None):
+        """Adds the next card of the deck to the gallery
+
+        Parameters
+        ----------
+        title : str
+            The title of the card. It can be None, as in the case of card backs
+        card_type : str
+            The type of the card, such as 'biome'
+        fingerprint : str
+            The fingerprint of the rendered card, from 'fingerprint_card_bytes' or
+            'fingerprint_file', which changes whenever its pixels do
+        card : Image
+            The finished card, if it's in memory. Otherwise, the thumbnail must have
+            been created before, or the card gets loaded from 'card_path'
+        card_path : str
+            The path to the PNG file of the card, which the gallery links to
+        """
+        thumbnail_path = self.get_thumbnail_path(fingerprint)
+        thumbnail = None
+
+        if not os.path.exists(thumbnail_path):
+            if card is None and card_path is not None and os.path.isfile(card_path):
+                card = Image.open(card_path)
+
+            if card is not None:
+                thumbnail = create_thumbnail(card)
+                thumbnail_bytes = encode_thumbnail(thumbnail)
+                write_file_atomically(
+                    thumbnail_path, lambda thumbnail_file: thumbnail_file.write(thumbnail_bytes)
+                )
+                self.created_thumbnails += 1
+
+        self.page_cards.append(
+            {
+                "title": title,
+                "card_type": card_type,
+                "fingerprint": fingerprint,
+                "card_path": card_path,
+                # Only the thumbnails of the current page are kept in memory
+                "thumbnail": thumbnail,
+            }
+        )
+
+        if len(self.page_cards) == self.columns * self.rows:
+            self.finish_page()
+
+    def fingerprint_page(self):
+        page_content = json.dumps(
+            {
+                "grid": [self.columns, self.rows, self.thumbnail_width, self.thumbnail_height],
+                "cards": [
+                    [page_card["fingerprint"], page_card["title"], page_card["card_path"]]
+                    for page_card in self.page_cards
+                ],
+            }
+        )
+
+        return hashlib.sha256(page_content.encode("utf-8")).hexdigest()
+
+    def finish_page(self):
+        """Draws the sheet and the HTML of the current page, unless its cards didn't change"""
+        page_number = len(self.pages) + 1
+        page = {
+            "fingerprint": self.fingerprint_page(),
+            "sheet": self.get_sheet_filename(page_number),
+            "html": self.get_page_filename(page_number),
+            "cards": [
+                {key: page_card[key] for key in ("title", "card_type", "card_path")}
+                for page_card in self.page_cards
+            ],
+        }
+
+        previous_page = None
+
+        if page_number <= len(self.previous_pages):
+            previous_page = self.previous_pages[page_number - 1]
+
+        if (
+            previous_page is None
+            or previous_page["fingerprint"] != page["fingerprint"]
+            or not os.path.exists(os.path.join(self.gallery_directory, page["sheet"]))
+        ):
+            self.draw_sheet(page)
+            self.write_page_html(page, page_number)
+            self.redrawn_pages += 1
+
+        self.pages.append(page)
+        self.page_cards = []
+
+    def draw_sheet(self, page):
+        cell_width = self.thumbnail_width + SHEET_MARGIN
+        cell_height = self.thumbnail_height + LABEL_HEIGHT + SHEET_MARGIN
+
+        sheet = Image.new(
+            "RGB",
+            (self.columns * cell_width + SHEET_MARGIN, self.rows * cell_height + SHEET_MARGIN),
+            SHEET_BACKGROUND_COLOR,
+        )
+        draw = ImageDraw.Draw(sheet)
+
+        for slot, page_card in enumerate(self.page_cards):
+            x = SHEET_MARGIN + (slot % self.columns) * cell_width
+            y = SHEET_MARGIN + (slot // self.columns) * cell_height
+
+            thumbnail = page_card["thumbnail"]
+
+            if thumbnail is None and os.path.exists(self.get_thumbnail_path(page_card["fingerprint"])):
+                thumbnail = Image.open(self.get_thumbnail_path(page_card["fingerprint"]))
+                thumbnail.load()
+
+            if thumbnail is not None:
+                if thumbnail.size != (self.thumbnail_width, self.thumbnail_height):
+                    thumbnail = thumbnail.resize(
+                        (self.thumbnail_width, self.thumbnail_height), Image.LANCZOS
+                    )
+
+                sheet.paste(thumbnail, (x, y), thumbnail)
+
+            label = page_card["title"] or page_card["card_type"]
+            draw.text(
+                (x, y + self.thumbnail_height + 4),
+                label,
+                font=load_font(TITLE_FONT_PATH, LABEL_FONT_SIZE),
+                fill="white",
+            )
+
+        sheet_bytes = encode_thumbnail(sheet)
+        write_file_atomically(
+            os.path.join(self.gallery_directory, page["sheet"]),
+            lambda sheet_file: sheet_file.write(sheet_bytes),
+        )
+
+    def get_card_link(self, card_path):
+        if card_path is None:
+            return None
+
+        return os.path.relpath(card_path, self.gallery_directory)
+
+    def write_page_html(self, page, page_number):
+        card_items = []
+
+        for page_card in page["cards"]:
+            label = html.escape(str(page_card["title"] or page_card["card_type"]))
+            card_link = self.get_card_link(page_card["card_path"])
+
+            if card_link is not None:
+                label = f'<a href="{html.escape(card_link)}">{label}</a>'
+
+            card_items.append(f"<li>{label} <small>({html.escape(page_card['card_type'])})</small></li>")
+
+        page_html = (
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+            f"<title>Page {page_number}</title></head><body>\n"
+            f'<p><a href="index.html">Index</a></p>\n'
+            f'<img src="{page["sheet"]}" alt="Page {page_number}">\n'
+            "<ol>\n" + "\n".join(card_items) + "\n</ol>\n</body></html>\n"
+        )
+
+        write_file_atomically(
+            os.path.join(self.gallery_directory, page["html"]),
+            lambda page_file: page_file.write(page_html.encode("utf-8")),
+        )
+
+    def close(self):
+        """Finishes the last page, removes the pages left over from a bigger deck, and
+        writes the index"""
+        if self.page_cards:
+            self.finish_page()
+
+        for page_number in range(len(self.pages) + 1, len(self.previous_pages) + 1):
+            for filename in (
+                self.get_sheet_filename(page_number),
+                self.get_page_filename(page_number),
+            ):
+                try:
+                    os.remove(os.path.join(self.gallery_directory, filename))
+                except FileNotFoundError:
+                    pass
+
+        page_links = "\n".join(
+            f'<li><a href="{page["html"]}"><img src="{page["sheet"]}" width="240"></a> '
+            f"Page {page_number}: {len(page['cards'])} cards</li>"
+            for page_number, page in enumerate(self.pages, start=1)
+        )
+        index_html = (
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Deck gallery</title>"
+            "</head><body>\n<ol>\n" + page_links + "\n</ol>\n</body></html>\n"
+        )
+
+        write_file_atomically(
+            os.path.join(self.gallery_directory, "index.html"),
+            lambda index_file: index_file.write(index_html.encode("utf-8")),
+        )
+
+        gallery_index = json.dumps({"pages": self.pages}, indent=1).encode("utf-8")
+        write_file_atomically(
+            os.path.join(self.gallery_directory, GALLERY_INDEX_FILENAME),
+            lambda index_file: index_file.write(gallery_index),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deck Gallery")
+    parser.add_argument(
+        "card_directory", help="The directory whose PNG cards go into the gallery."
+    )
+    parser.add_argument(
+        "--gallery-directory",
+        default=DEFAULT_GALLERY_DIRECTORY,
+        help="Where the sheets, the thumbnails and the HTML pages get written.",
+    )
+    parser.add_argument("--columns", type=int, default=DEFAULT_COLUMNS)
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+
+    args = parser.parse_args()
+
+    gallery = Gallery(args.gallery_directory, args.columns, args.rows)
+    gallery_directory = os.path.abspath(args.gallery_directory)
+
+    for root, directories, filenames in os.walk(args.card_directory):
+        # The gallery's own images aren't cards
+        directories[:] = sorted(
+            directory
+            for directory in directories
+            if os.path.abspath(os.path.join(root, directory)) != gallery_directory
+        )
+
+        for filename in sorted(filenames):
+            if filename.endswith("_card.png"):
+                card_path = os.path.join(root, filename)
+                gallery.add_card(
+                    filename.removesuffix("_card.png"),
+                    os.path.basename(root),
+                    fingerprint_file(card_path),
+                    card_path=card_path,
+                )
+
+    gallery.close()
+
+    print(
+        f"The gallery has {len(gallery.pages)} pages: {gallery.redrawn_pages} were redrawn, "
+        f"and {gallery.created_thumbnails} cards were downscaled."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+from functools import lru_cache
+
 from PIL import Image
 
+from assets import KeyedLocks, get_content_id, load_image_once
 from image_utils import calculate_centered_x, convert_image_to_rgba, create_shadow_mask
 
 BACK_ICON_SIZE = 300
@@ -18,11 +21,47 @@ SHADOW_OPACITY = 50
 
 GAP_BETWEEN_ICONS = 10
 
+# How many resized icons, along with their shadows, are kept in memory
+ICON_CACHE_SIZE = 256
+
+ICON_LOAD_LOCKS = KeyedLocks()
+
+
+@lru_cache(maxsize=ICON_CACHE_SIZE)
+def load_icon_with_shadow_by_content_id(content_id, icon_size):
+    icon = load_image_once(content_id).resize(
+        (icon_size, icon_size), Image.LANCZOS
+    )
+
+    icon = convert_image_to_rgba(icon)
+
+    return icon, create_shadow_mask(icon, SHADOW_OFFSET, SHADOW_OPACITY)
+
+
+def load_icon_with_shadow(icon_path, icon_size):
+    """Loads an icon resized to the given size, along with its shadow. Both are only
+    created once for each distinct image and size, so they must not be modified
+
+    Parameters
+    ----------
+    icon_path : str
+        The path to the icon
+    icon_size : int
+        The width and height the icon is resized to
+
+    Returns
+    -------
+    Image, Image
+        the icon in RGBA mode, and its shadow mask
+    """
+    content_id = get_content_id(icon_path)
+
+    # The threads that need the same icon wait for the first one to resize it
+    with ICON_LOAD_LOCKS.get((content_id, icon_size)):
+        return load_icon_with_shadow_by_content_id(content_id, icon_size)
 
-def draw_shadow_for_icon(icon, starting_x, icons_y, card):
-    # Create the shadow mask
-    shadow_mask = create_shadow_mask(icon, SHADOW_OFFSET, SHADOW_OPACITY)
 
+def draw_shadow_for_icon(shadow_mask, starting_x, icons_y, card):
     # Draw the shadow
     card.paste(
         shadow_mask, (starting_x + SHADOW_OFFSET, icons_y + SHADOW_OFFSET), shadow_mask
@@ -31,11 +70,9 @@ def draw_shadow_for_icon(icon, starting_x, icons_y, card):
 
 def draw_row_of_icons(icon_paths, icon_size, starting_x, icons_y, card):
     for icon_path in icon_paths:
-        icon = Image.open(icon_path).resize((icon_size, icon_size), Image.LANCZOS)
+        icon, shadow_mask = load_icon_with_shadow(icon_path, icon_size)
 
-        icon = convert_image_to_rgba(icon)
-
-        draw_shadow_for_icon(icon, starting_x, icons_y, card)
+        draw_shadow_for_icon(shadow_mask, starting_x, icons_y, card)
 
         # Paste the icon on the card
         card.paste(icon, (starting_x, icons_y), icon)
@@ -44,12 +81,8 @@ def draw_row_of_icons(icon_paths, icon_size, starting_x, icons_y, card):
 
 
 def calculate_total_width_of_icons(icon_paths, icon_size):
-    total_icons_width = 0
-
-    # Calculate the total width of the icons and the gaps
-    for icon_path in icon_paths:
-        icon = Image.open(icon_path).resize((icon_size, icon_size), Image.LANCZOS)
-        total_icons_width += icon.width + GAP_BETWEEN_ICONS
+    # Every icon gets resized to 'icon_size', so there's no need to load them
+    total_icons_width = len(icon_paths) * (icon_size + GAP_BETWEEN_ICONS)
 
     total_icons_width -= GAP_BETWEEN_ICONS  # Remove the gap after the last icon
 
@@ -84,8 +117,8 @@ def draw_icons(icon_paths, card, icon_size, icons_y, canvas_height, canvas_width
 def draw_icon_in_absolute_center(
     icon_path, card, icon_size, canvas_height, canvas_width
 ):
-    # Load the icon image
-    icon = Image.open(icon_path).resize((icon_size, icon_size), Image.LANCZOS)
+    # Load the icon image, already resized and in RGBA mode
+    icon, shadow_mask = load_icon_with_shadow(icon_path, icon_size)
 
     # Calculate the center of the canvas
     canvas_center_x = canvas_width // 2
@@ -95,10 +128,7 @@ def draw_icon_in_absolute_center(
     icon_x = canvas_center_x - (icon.width // 2)
     icon_y = canvas_center_y - (icon.height // 2)
 
-    # Convert the icon to RGBA mode if necessary
-    icon = convert_image_to_rgba(icon)
-
-    draw_shadow_for_icon(icon, icon_x, icon_y, card)
+    draw_shadow_for_icon(shadow_mask, icon_x, icon_y, card)
 
     # Paste the icon onto the card at the calculated coordinates
     card.paste(icon, (icon_x, icon_y), icon)
@@ -6,11 +6,14 @@ This file can also be imported as a module and contains the following
 functions:
 
     * convert_image_to_rgba - if necessary, a loaded image will get converted to RGBA
-    * create_mask_with_rounded_corners - creates a mask image with rounded corners
+    * create_mask_with_rounded_corners - creates (once per size) a mask image with rounded corners
     * apply_rounded_corners_to_card - applies a mask with rounded corners to a card image
+    * finalize_card - the last stage of every card: rounds its corners by only touching them
     * load_card_image_frame - loads the frame for a card image
 """
 
+from functools import lru_cache
+
 from PIL import Image, ImageDraw, ImageFilter
 
 
@@ -62,8 +65,10 @@ def create_shadow_mask(icon, shadow_offset, shadow_opacity):
     return shadow_mask
 
 
-def create_mask_with_rounded_corners(width, height):
-    """Creates a mask image with rounded corners
+@lru_cache(maxsize=None)
+def create_mask_with_rounded_corners(width, height, radius=ROUNDED_CORNER_RADIUS):
+    """Creates a mask image with rounded corners. The mask is only built once for
+    each size and radius, so it's shared and must not be modified
 
     Parameters
     ----------
@@ -71,6 +76,8 @@ def create_mask_with_rounded_corners(width, height):
         The width that the mask must have
     height : int
         The height that the mask must have
+    radius : int
+        The radius of the rounded corners
 
     Returns
     -------
@@ -81,37 +88,67 @@ def create_mask_with_rounded_corners(width, height):
     mask = Image.new("L", (width, height), 0)
     mask_draw = ImageDraw.Draw(mask)
 
+    mask_draw.ellipse((0, 0, 2 * radius, 2 * radius), fill=255)  # Upper-left
     mask_draw.ellipse(
-        (0, 0, 2 * ROUNDED_CORNER_RADIUS, 2 * ROUNDED_CORNER_RADIUS), fill=255
-    )  # Upper-left
-    mask_draw.ellipse(
-        (width - 2 * ROUNDED_CORNER_RADIUS, 0, width, 2 * ROUNDED_CORNER_RADIUS),
+        (width - 2 * radius, 0, width, 2 * radius),
         fill=255,
     )  # Upper-right
     mask_draw.ellipse(
-        (0, height - 2 * ROUNDED_CORNER_RADIUS, 2 * ROUNDED_CORNER_RADIUS, height),
+        (0, height - 2 * radius, 2 * radius, height),
         fill=255,
     )  # Lower-left
     mask_draw.ellipse(
         (
-            width - 2 * ROUNDED_CORNER_RADIUS,
-            height - 2 * ROUNDED_CORNER_RADIUS,
+            width - 2 * radius,
+            height - 2 * radius,
             width,
             height,
         ),
         fill=255,
     )  # Lower-right
 
-    mask_draw.rectangle(
-        (ROUNDED_CORNER_RADIUS, 0, width - ROUNDED_CORNER_RADIUS, height), fill=255
-    )
-    mask_draw.rectangle(
-        (0, ROUNDED_CORNER_RADIUS, width, height - ROUNDED_CORNER_RADIUS), fill=255
-    )
+    mask_draw.rectangle((radius, 0, width - radius, height), fill=255)
+    mask_draw.rectangle((0, radius, width, height - radius), fill=255)
 
     return mask
 
 
+def calculate_corner_boxes(width, height, radius):
+    # Outside of these squares, the rectangles of the mask leave everything opaque
+    return (
+        (0, 0, radius, radius),
+        (width - radius, 0, width, radius),
+        (0, height - radius, radius, height),
+        (width - radius, height - radius, width, height),
+    )
+
+
+@lru_cache(maxsize=None)
+def create_corner_masks(width, height, radius=ROUNDED_CORNER_RADIUS):
+    """Cuts the four corners out of the mask with rounded corners, once for each size
+
+    Parameters
+    ----------
+    width : int
+        The width of the card
+    height : int
+        The height of the card
+    radius : int
+        The radius of the rounded corners
+
+    Returns
+    -------
+    tuple
+        the box of each corner, along with its piece of the mask
+    """
+    mask = create_mask_with_rounded_corners(width, height, radius)
+
+    return tuple(
+        (corner_box, mask.crop(corner_box))
+        for corner_box in calculate_corner_boxes(width, height, radius)
+    )
+
+
 def apply_rounded_corners_to_card(card):
     """Applies a mask with rounded corners to the card image
 
@@ -124,6 +161,38 @@ def apply_rounded_corners_to_card(card):
     card.putalpha(create_mask_with_rounded_corners(card.width, card.height))
 
 
+def finalize_card(card):
+    """Rounds the corners of a composed card. It's the last stage of every card
+
+    An opaque card only gets its four corners masked, instead of having its whole
+    alpha replaced by a mask. The result is the same as 'apply_rounded_corners_to_card'
+
+    Parameters
+    ----------
+    card : Image
+        The composed card
+
+    Returns
+    -------
+    Image
+        the finished card, in RGBA mode
+    """
+    if card.mode != "RGB":
+        # The card may already have an alpha of its own, which the mask has to replace
+        apply_rounded_corners_to_card(card)
+        return card
+
+    # Promotes the card to RGBA in place, with a constant alpha that needs no mask
+    card.putalpha(255)
+
+    for corner_box, corner_mask in create_corner_masks(card.width, card.height):
+        corner = card.crop(corner_box)
+        corner.putalpha(corner_mask)
+        card.paste(corner, corner_box)
+
+    return card
+
+
 def calculate_new_image_dimensions_respecting_aspect_ratio(
     image, canvas_width, canvas_height
 ):
@@ -0,0 +1,310 @@
+"""Card Layout
+
+This script computes the bounding box of every element of a card from the
+metadata of its images and the metrics of its font, without decoding a single
+pixel. That makes it cheap enough to check thousands of cards per second for
+elements that run off the card or collide with each other before rendering.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * read_image_size - reads the dimensions of an image from its header
+    * layout_card - computes the bounding boxes of every element of a card
+    * find_layout_problems - flags the elements that overflow the card or collide
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations
+
+from PIL import Image
+
+from card_elements import (
+    CARD_IMAGE_DISTANCE_FROM_TOP,
+    CARD_IMAGE_MARGIN,
+    CROP_MARGIN,
+    TEXT_BANNER_PADDING,
+    calculate_title_dimensions,
+    get_default_card_dimensions,
+)
+from card_generation import CARD_BACK_TYPES, prepare_card_type_data
+from icons import (
+    BACK_ICON_SIZE,
+    BIOME_ICONS_DISTANCE_FROM_BOTTOM_IN_EXPLORATION_ZONE_CARD,
+    BIOME_ICON_SIZE_IN_EXPLORATION_ZONE_CARD,
+    GAP_BETWEEN_ICONS,
+    STRUGGLE_ICON_DISTANCE_FROM_BOTTOM,
+    STRUGGLE_ICON_SIZE,
+    calculate_total_width_of_icons,
+)
+from image_utils import calculate_centered_x, calculate_width_of_image_for_canvas
+
+ElementBox = namedtuple("ElementBox", ["name", "left", "top", "right", "bottom"])
+CardLayout = namedtuple(
+    "CardLayout", ["title", "card_type", "width", "height", "elements"]
+)
+LayoutProblem = namedtuple("LayoutProblem", ["kind", "element_names", "message"])
+
+OUT_OF_BOUNDS = "out_of_bounds"
+COLLISION = "collision"
+
+# The background and the frame cover the whole card on purpose, and the title is
+# meant to sit on top of its own banner.
+FULL_BLEED_ELEMENTS = ("background", "card_image_frame")
+STACKED_ELEMENTS = (("title_banner", "title"),)
+
+
+@lru_cache(maxsize=None)
+def read_image_size(image_path):
+    """Reads the dimensions of an image from its header, without decoding it
+
+    Parameters
+    ----------
+    image_path : str
+        The path to the image
+
+    Returns
+    -------
+    int, int
+        the width and height of the image
+    """
+    with Image.open(image_path) as image:
+        return image.size
+
+
+def calculate_card_image_box(card_image_path, canvas_width):
+    # Mirrors the resizing and cropping that 'draw_card_image' does to the image
+    image_width, image_height = read_image_size(card_image_path)
+
+    resized_width = calculate_width_of_image_for_canvas(canvas_width, CARD_IMAGE_MARGIN)
+    resized_height = int(resized_width * image_height / image_width)
+
+    crop_x = int(resized_width * CROP_MARGIN)
+    crop_y = int(resized_height * CROP_MARGIN)
+    cropped_width = resized_width - 2 * crop_x
+    cropped_height = resized_height - 2 * crop_y
+
+    left = calculate_centered_x(resized_width, canvas_width)
+    left += (resized_width - cropped_width) // 2
+
+    return ElementBox(
+        "card_image",
+        left,
+        CARD_IMAGE_DISTANCE_FROM_TOP,
+        left + cropped_width,
+        CARD_IMAGE_DISTANCE_FROM_TOP + cropped_height,
+    )
+
+
+def calculate_card_image_frame_box(card_image_frame_path, canvas_width):
+    frame_width, frame_height = read_image_size(card_image_frame_path)
+
+    return ElementBox(
+        "card_image_frame",
+        0,
+        0,
+        canvas_width,
+        int(canvas_width * frame_height / frame_width),
+    )
+
+
+def calculate_title_boxes(title, title_banner_path, font, title_y, canvas_width):
+    title_width, title_height = calculate_title_dimensions(title, font)
+    title_x = calculate_centered_x(title_width, canvas_width)
+
+    boxes = []
+
+    if title_banner_path is not None:
+        boxes.append(
+            ElementBox(
+                "title_banner",
+                title_x - TEXT_BANNER_PADDING,
+                title_y - TEXT_BANNER_PADDING,
+                title_x + title_width + TEXT_BANNER_PADDING,
+                title_y + title_height + TEXT_BANNER_PADDING,
+            )
+        )
+
+    boxes.append(
+        ElementBox(
+            "title", title_x, title_y, title_x + title_width, title_y + title_height
+        )
+    )
+
+    return boxes
+
+
+def calculate_row_of_icon_boxes(name, icon_paths, icon_size, icons_y, canvas_width):
+    # Mirrors 'draw_icons': every icon is resized to 'icon_size' and centered as a row
+    starting_x = calculate_centered_x(
+        calculate_total_width_of_icons(icon_paths, icon_size), canvas_width
+    )
+
+    boxes = []
+
+    for index in range(len(icon_paths)):
+        icon_x = starting_x + index * (icon_size + GAP_BETWEEN_ICONS)
+        boxes.append(
+            ElementBox(
+                f"{name}_{index}", icon_x, icons_y, icon_x + icon_size, icons_y + icon_size
+            )
+        )
+
+    return boxes
+
+
+def calculate_centered_icon_box(name, icon_size, canvas_height, canvas_width):
+    icon_x = canvas_width // 2 - icon_size // 2
+    icon_y = canvas_height // 2 - icon_size // 2
+
+    return ElementBox(name, icon_x, icon_y, icon_x + icon_size, icon_y + icon_size)
+
+
+def layout_card(title, image_paths, card_type):
+    """Computes the bounding boxes of every element of a card, in drawing order
+
+    Parameters
+    ----------
+    title : str
+        The title of the card. It can be None, as in the case of card backs
+    image_paths : dict
+        All the paths to the images that would be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+
+    Returns
+    -------
+    CardLayout
+        the dimensions of the card and the boxes of all of its elements
+    """
+    canvas_width, canvas_height = get_default_card_dimensions()
+
+    card_type_data = prepare_card_type_data(card_type)
+
+    elements = [ElementBox("background", 0, 0, canvas_width, canvas_height)]
+
+    if "card_image_path" in image_paths:
+        elements.append(
+            calculate_card_image_box(image_paths["card_image_path"], canvas_width)
+        )
+
+    if "card_image_frame_path" in image_paths:
+        elements.append(
+            calculate_card_image_frame_box(
+                image_paths["card_image_frame_path"], canvas_width
+            )
+        )
+
+    if card_type not in CARD_BACK_TYPES:
+        elements.extend(
+            calculate_title_boxes(
+                title,
+                image_paths.get("title_banner_path"),
+                card_type_data["font"],
+                card_type_data["title_y"],
+                canvas_width,
+            )
+        )
+
+    if "biome_icon_path" in image_paths:
+        elements.extend(
+            calculate_row_of_icon_boxes(
+                "biome_icon",
+                [image_paths["biome_icon_path"]],
+                card_type_data["biome_icon_size"],
+                canvas_height - card_type_data["biome_icon_distance_from_bottom"],
+                canvas_width,
+            )
+        )
+
+    if "struggle_icon_paths" in image_paths:
+        elements.extend(
+            calculate_row_of_icon_boxes(
+                "struggle_icon",
+                image_paths["struggle_icon_paths"],
+                STRUGGLE_ICON_SIZE,
+                canvas_height - STRUGGLE_ICON_DISTANCE_FROM_BOTTOM,
+                canvas_width,
+            )
+        )
+
+    if "biome_icon_paths" in image_paths:
+        elements.extend(
+            calculate_row_of_icon_boxes(
+                "biome_icon",
+                image_paths["biome_icon_paths"],
+                BIOME_ICON_SIZE_IN_EXPLORATION_ZONE_CARD,
+                canvas_height - BIOME_ICONS_DISTANCE_FROM_BOTTOM_IN_EXPLORATION_ZONE_CARD,
+                canvas_width,
+            )
+        )
+
+    if "back_icon_path" in image_paths:
+        elements.append(
+            calculate_centered_icon_box(
+                "back_icon", BACK_ICON_SIZE, canvas_height, canvas_width
+            )
+        )
+
+    return CardLayout(title, card_type, canvas_width, canvas_height, elements)
+
+
+def boxes_overlap(first_box, second_box):
+    return (
+        first_box.left < second_box.right
+        and second_box.left < first_box.right
+        and first_box.top < second_box.bottom
+        and second_box.top < first_box.bottom
+    )
+
+
+def is_box_inside_card(box, width, height):
+    return box.left >= 0 and box.top >= 0 and box.right <= width and box.bottom <= height
+
+
+def find_layout_problems(card_layout):
+    """Flags the elements that run off the card or collide with each other
+
+    Parameters
+    ----------
+    card_layout : CardLayout
+        The layout computed by 'layout_card'
+
+    Returns
+    -------
+    list
+        the LayoutProblem found, empty if the layout is fine
+    """
+    problems = []
+
+    elements = [
+        element
+        for element in card_layout.elements
+        if element.name not in FULL_BLEED_ELEMENTS
+    ]
+
+    for element in elements:
+        if not is_box_inside_card(element, card_layout.width, card_layout.height):
+            problems.append(
+                LayoutProblem(
+                    OUT_OF_BOUNDS,
+                    (element.name,),
+                    f"'{element.name}' at {tuple(element[1:])} runs off the "
+                    f"{card_layout.width}x{card_layout.height} card.",
+                )
+            )
+
+    for first_element, second_element in combinations(elements, 2):
+        if (first_element.name, second_element.name) in STACKED_ELEMENTS:
+            continue
+
+        if boxes_overlap(first_element, second_element):
+            problems.append(
+                LayoutProblem(
+                    COLLISION,
+                    (first_element.name, second_element.name),
+                    f"'{first_element.name}' collides with '{second_element.name}'.",
+                )
+            )
+
+    return problems
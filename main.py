@@ -1,24 +1,69 @@
+"""Card Generator CLI
+
+This script creates a single card of the given type from its TOML file under
+'toml/', or only checks its layout. The modules that render the cards, along
+with Pillow and the fonts, only get imported once the arguments are validated
+and a card actually needs them, so that '--help' and the invalid commands return
+right away. See 'benchmark_startup.py'.
+
+Usage: python main.py biome
+       python main.py encounter --check-layout
+"""
+
 import argparse
-from card_elements import MissingTitleYCoordinateError
-
-from card_setups import (
-    FailedToCreateCardException,
-    setup_biome_card,
-    setup_biome_back_card,
-    setup_encounter_card,
-    setup_exploration_zone_card,
-    setup_exploration_zone_back_card,
-)
+
+from errors import UnhandledCardTypeException
 from file_utils import IncorrectImagePathException
 
 RAW_IMAGES_DIRECTORY = "raw_images"
 
+CARD_TYPES = (
+    "encounter",
+    "biome",
+    "biome_back",
+    "exploration_zone",
+    "exploration_zone_back",
+)
+
+
+def report_layout_problems(card_type):
+    # pylint: disable=import-outside-toplevel
+    from card_setups import check_layout_of_card
+
+    try:
+        problems = check_layout_of_card(card_type)
+    except UnhandledCardTypeException:
+        print(f"Not implemented for type of card '{card_type}'")
+        return
+    except IncorrectImagePathException as exception:
+        print(
+            f"Failed to check the layout from main because some image path doesn't lead to an actual file.\nError: {exception}"
+        )
+        return
+
+    if not problems:
+        print(f"The layout of the '{card_type}' card has no problems.")
+        return
+
+    for problem in problems:
+        print(f"Layout problem ({problem.kind}): {problem.message}")
+
 
 def main():
     parser = argparse.ArgumentParser(description="Card Generator")
     parser.add_argument(
         "type_of_card",
-        help="Name of the type of card. The options are 'encounter', 'biome', 'exploration_zone'.",
+        help=f"Name of the type of card. The options are {', '.join(repr(card_type) for card_type in CARD_TYPES)}.",
+    )
+
+    parser.add_argument(
+        "--check-layout",
+        action="store_true",
+        help="Only compute the layout of the card and report overlapping elements, without rendering it.",
+    )
+    parser.add_argument(
+        "--output",
+        help="Path to a '.zip' or '.tar' archive to write the card into, instead of the output directory.",
     )
 
     args = parser.parse_args()
@@ -27,17 +72,46 @@ def main():
         print("Error: The name of the type of card to create can't be empty")
         return
 
+    if args.type_of_card not in CARD_TYPES:
+        print(f"Not implemented for type of card '{args.type_of_card}'")
+        return
+
+    if args.check_layout:
+        report_layout_problems(args.type_of_card)
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from output_sinks import UnhandledOutputDestinationException, open_output_sink
+
+    try:
+        output_sink = open_output_sink(args.output)
+    except UnhandledOutputDestinationException as exception:
+        print(f"Failed to create a card from main.\nError: {exception}")
+        return
+
+    from assets import persist_asset_index
+    from card_setups import (
+        FailedToCreateCardException,
+        setup_biome_back_card,
+        setup_biome_card,
+        setup_encounter_card,
+        setup_exploration_zone_back_card,
+        setup_exploration_zone_card,
+    )
+
+    persist_asset_index()
+
     try:
         if args.type_of_card == "encounter":
-            setup_encounter_card()
+            setup_encounter_card(output_sink)
         elif args.type_of_card == "biome":
-            setup_biome_card()
+            setup_biome_card(output_sink)
         elif args.type_of_card == "biome_back":
-            setup_biome_back_card()
+            setup_biome_back_card(output_sink)
         elif args.type_of_card == "exploration_zone":
-            setup_exploration_zone_card()
+            setup_exploration_zone_card(output_sink)
         elif args.type_of_card == "exploration_zone_back":
-            setup_exploration_zone_back_card()
+            setup_exploration_zone_back_card(output_sink)
         else:
             print(f"Not implemented for type of card '{args.type_of_card}'")
             return
@@ -49,6 +123,8 @@ def main():
             f"Failed to create a card from main because some image path doesn't lead to an actual file.\nError: {exception}"
         )
         return
+    finally:
+        output_sink.close()
 
 
 if __name__ == "__main__":
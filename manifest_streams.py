@@ -0,0 +1,273 @@
+"""Manifest Streams
+
+This script reads the cards of a deck one row at a time from a JSON lines or a
+CSV export, such as the ones of the spreadsheet and the database where the card
+data lives, so that a deck of any size can be fed to the render pipeline with
+constant memory. Every row is validated as it's read: the rows that aren't valid
+are skipped and recorded, along with their line and the reason. The valid cards
+keep their 'line_number', so the cards that fail later get reported by their line.
+
+In a JSON lines file, each line holds the card data as 'create_card' expects it:
+
+    {"card_type": "biome", "title": "Forest", "image_paths": {"background_image_path": "..."}}
+
+In a CSV file, each column holds the 'card_type', the 'title' or one of the image
+paths, under the same names. The columns that hold several icons separate their
+paths with ';', and the empty cells are left out. A column mapping can rename the
+headers of an export to these names.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * validate_card_data - validates the card data of a row
+    * open_manifest_stream - opens the stream that fits the format of a manifest
+"""
+
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+
+import toml
+
+from card_generation import CARD_BACK_TYPES, prepare_card_type_data
+from card_rendering import InvalidCardDataException, read_card_data
+from file_utils import (
+    IncorrectImagePathException,
+    UnhandledCardTypeException,
+    ensure_all_image_paths_exist,
+)
+
+IMAGE_PATH_KEYS = (
+    "background_image_path",
+    "card_image_path",
+    "card_image_frame_path",
+    "title_banner_path",
+    "biome_icon_path",
+    "back_icon_path",
+)
+IMAGE_PATH_LIST_KEYS = ("struggle_icon_paths", "biome_icon_paths")
+
+# Separates the paths of the columns that hold several icons in a CSV file
+LIST_SEPARATOR = ";"
+
+
+class InvalidManifestRowException(Exception):
+    pass
+
+
+class UnhandledManifestFormatException(Exception):
+    pass
+
+
+def validate_card_data(card_data):
+    """Validates the card data of a row, as far as it can be without rendering it
+
+    Parameters
+    ----------
+    card_data : dict
+        The card data read from the row
+
+    Returns
+    -------
+    dict
+        the card data, with the 'title', the 'card_type' and the 'image_paths' it needs
+    """
+    try:
+        title, image_paths, card_type = read_card_data(card_data)
+
+        prepare_card_type_data(card_type)
+
+        ensure_all_image_paths_exist(image_paths)
+    except (
+        InvalidCardDataException,
+        UnhandledCardTypeException,
+        IncorrectImagePathException,
+    ) as exception:
+        raise InvalidManifestRowException(str(exception))
+
+    for key in IMAGE_PATH_LIST_KEYS:
+        if key in image_paths and not isinstance(image_paths[key], list):
+            raise InvalidManifestRowException(f"The image paths '{key}' must be a list.")
+
+    for key in IMAGE_PATH_KEYS:
+        if key in image_paths and not isinstance(image_paths[key], str):
+            raise InvalidManifestRowException(f"The image path '{key}' must be a single path.")
+
+    unknown_keys = set(image_paths) - set(IMAGE_PATH_KEYS) - set(IMAGE_PATH_LIST_KEYS)
+
+    if unknown_keys:
+        raise InvalidManifestRowException(
+            f"The image paths {sorted(unknown_keys)} aren't drawn on any card."
+        )
+
+    if "background_image_path" not in image_paths:
+        raise InvalidManifestRowException("The row doesn't contain a 'background_image_path'.")
+
+    if card_type not in CARD_BACK_TYPES and not title:
+        raise InvalidManifestRowException(
+            f"The row doesn't contain the 'title' that a '{card_type}' card needs."
+        )
+
+    return {"title": title, "card_type": card_type, "image_paths": image_paths}
+
+
+def convert_csv_row_to_card_data(row, column_mapping):
+    """Converts the cells of a CSV row into the card data that 'create_card' expects"""
+    card_data = {"image_paths": {}}
+
+    for header, cell in row.items():
+        # A row with more cells than headers puts the extra ones under None
+        if header is None or cell is None:
+            raise InvalidManifestRowException("The row has more cells than the header.")
+
+        key = column_mapping.get(header, header)
+        cell = cell.strip()
+
+        if not cell:
+            continue
+
+        if key in ("title", "card_type"):
+            card_data[key] = cell
+        elif key in IMAGE_PATH_LIST_KEYS:
+            card_data["image_paths"][key] = [
+                path.strip() for path in cell.split(LIST_SEPARATOR) if path.strip()
+            ]
+        else:
+            card_data["image_paths"][key] = cell
+
+    return card_data
+
+
+class ManifestStream(ABC):
+    """Reads the valid cards of a manifest one row at a time, recording the invalid rows"""
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.invalid_rows = []
+
+    @abstractmethod
+    def read_rows(self):
+        """Yields the line number and the card data of every row, as they're read.
+        The line number is None when the format can't tell it. The rows that can't
+        even be parsed get recorded as invalid here"""
+
+    def __iter__(self):
+        for line_number, card_data in self.read_rows():
+            try:
+                yield {**validate_card_data(card_data), "line_number": line_number}
+            except InvalidManifestRowException as exception:
+                self.invalid_rows.append(
+                    {
+                        "line": line_number,
+                        "error": f"Line {line_number}: {exception}"
+                        if line_number is not None
+                        else str(exception),
+                    }
+                )
+
+
+class JsonLinesManifestStream(ManifestStream):
+    """Reads the cards of a JSON lines manifest, one card per line"""
+
+    def read_rows(self):
+        with open(self.manifest_path, encoding="utf-8") as manifest_file:
+            for line_number, line in enumerate(manifest_file, start=1):
+                if not line.strip():
+                    continue
+
+                try:
+                    card_data = json.loads(line)
+                except ValueError as exception:
+                    self.invalid_rows.append(
+                        {"line": line_number, "error": f"Line {line_number}: {exception}"}
+                    )
+                    continue
+
+                yield line_number, card_data
+
+
+class CsvManifestStream(ManifestStream):
+    """Reads the cards of a CSV manifest, one card per row"""
+
+    def __init__(self, manifest_path, column_mapping=None):
+        """
+        Parameters
+        ----------
+        manifest_path : str
+            The path to the CSV file, whose first row holds the headers
+        column_mapping : dict
+            Maps the headers of the CSV file to the keys of the card data, such as
+            {"Name": "title"}. The headers that aren't mapped are used as they are
+        """
+        super().__init__(manifest_path)
+        self.column_mapping = column_mapping or {}
+
+    def read_rows(self):
+        with open(self.manifest_path, encoding="utf-8", newline="") as manifest_file:
+            reader = csv.DictReader(manifest_file)
+
+            for row in reader:
+                try:
+                    card_data = convert_csv_row_to_card_data(row, self.column_mapping)
+                except InvalidManifestRowException as exception:
+                    self.invalid_rows.append(
+                        {"line": reader.line_num, "error": f"Line {reader.line_num}: {exception}"}
+                    )
+                    continue
+
+                yield reader.line_num, card_data
+
+
+class TomlManifestStream(ManifestStream):
+    """Reads the cards of a TOML deck manifest. TOML can't be read one row at a
+    time, so the whole file is loaded first; it's meant for small decks"""
+
+    def read_rows(self):
+        with open(self.manifest_path, encoding="utf-8") as manifest_file:
+            manifest_text = manifest_file.read()
+
+        cards = toml.loads(manifest_text).get("cards", [])
+
+        # The parser doesn't keep the lines, but each card starts at its [[cards]] header
+        header_line_numbers = [
+            line_number
+            for line_number, line in enumerate(manifest_text.splitlines(), start=1)
+            if line.strip() == "[[cards]]"
+        ]
+
+        if len(header_line_numbers) != len(cards):
+            header_line_numbers = [None] * len(cards)
+
+        yield from zip(header_line_numbers, cards)
+
+
+def open_manifest_stream(manifest_path, column_mapping=None):
+    """Opens the stream that fits the format of a manifest, from its extension
+
+    Parameters
+    ----------
+    manifest_path : str
+        The path to a '.jsonl', '.csv' or '.toml' manifest
+    column_mapping : dict
+        For CSV manifests, maps the headers to the keys of the card data
+
+    Returns
+    -------
+    ManifestStream
+        the stream, which yields the card data of every valid row when iterated
+    """
+    extension = os.path.splitext(manifest_path)[1].lower()
+
+    if extension in (".jsonl", ".ndjson"):
+        return JsonLinesManifestStream(manifest_path)
+
+    if extension == ".csv":
+        return CsvManifestStream(manifest_path, column_mapping)
+
+    if extension == ".toml":
+        return TomlManifestStream(manifest_path)
+
+    raise UnhandledManifestFormatException(
+        f"The manifest '{manifest_path}' isn't a '.jsonl', '.csv' or '.toml' file."
+    )
@@ -0,0 +1,347 @@
+"""Metrics
+
+This script collects the metrics of the card build, so the dashboards can follow
+how it behaves from one run to the next: the cards rendered and failed per card
+type, the throughput, the latency of every stage of the rendering, the hit
+ratios of the caches, the encoded bytes and the depth of the queues.
+
+The metrics are kept in a registry, which the batch runs and the render daemon
+write at the end of each run as a Prometheus textfile, for the textfile collector
+of the node exporter, and as JSON.
+
+The stages of 'compose_card' get timed through 'time_stage', which does nothing
+unless a registry was activated, so rendering without metrics costs nothing.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * activate_registry - makes a registry collect the stage latencies of this process
+    * time_stage - times a stage of the rendering of a card
+    * record_cache_metrics - records the hits and the misses of the caches of this process
+    * write_metrics - writes a registry as a Prometheus textfile and as JSON
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from assets import load_image_by_content_id
+from file_utils import write_file_atomically
+from fonts import load_font
+from icons import load_icon_with_shadow_by_content_id
+from image_utils import create_corner_masks, create_mask_with_rounded_corners
+
+METRIC_PREFIX = "card_render_"
+
+# In seconds. A card takes from tens of milliseconds to a few seconds to encode
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+METRIC_DESCRIPTIONS = {
+    "cards_rendered_total": "The cards rendered and written, per card type.",
+    "cards_failed_total": "The cards that failed to render or to be written, per card type.",
+    "cards_skipped_total": "The cards a resumed run skipped because they were already rendered.",
+    "manifest_rows_invalid_total": "The rows of the manifest skipped because they weren't valid.",
+    "jobs_rejected_total": "The render jobs rejected because the queue was full.",
+    "encoded_bytes_total": "The bytes of the encoded cards, per card type.",
+    "cards_per_second": "The cards rendered per second over the run.",
+    "run_duration_seconds": "How long the run has taken.",
+    "peak_rss_bytes": "The peak resident memory seen while rendering each card type.",
+    "cache_hits": "The hits of each cache.",
+    "cache_misses": "The misses of each cache.",
+    "cache_hit_ratio": "The share of the lookups of each cache that were hits.",
+    "stage_duration_seconds": "How long each stage of the rendering of a card took.",
+    "job_duration_seconds": "How long each render job of the daemon took, from its request to its result.",
+    "queue_depth": "How many items were waiting in each queue, sampled as the cards went through.",
+}
+
+CACHED_FUNCTIONS = {
+    "images": load_image_by_content_id,
+    "icons": load_icon_with_shadow_by_content_id,
+    "rounded_corner_masks": create_mask_with_rounded_corners,
+    "corner_masks": create_corner_masks,
+    "fonts": load_font,
+}
+
+
+class MismatchedHistogramBucketsException(Exception):
+    pass
+
+
+class Histogram:
+    """Counts the observed values in cumulative buckets, as Prometheus does"""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+                break
+
+        self.count += 1
+        self.sum += value
+
+    def merge(self, histogram_data):
+        # The counts are added bucket by bucket, so they must have the same bounds
+        if tuple(histogram_data["buckets"]) != self.buckets:
+            raise MismatchedHistogramBucketsException(
+                f"Can't merge a histogram with the buckets {list(histogram_data['buckets'])} "
+                f"into one with the buckets {list(self.buckets)}."
+            )
+
+        for index, bucket_count in enumerate(histogram_data["bucket_counts"]):
+            self.bucket_counts[index] += bucket_count
+
+        self.count += histogram_data["count"]
+        self.sum += histogram_data["sum"]
+
+    def to_dict(self):
+        return {
+            "buckets": list(self.buckets),
+            "bucket_counts": list(self.bucket_counts),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+def get_metric_key(name, labels):
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{label}="{escape_label_value(value)}"' for label, value in labels) + "}"
+
+
+def format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Holds the counters, the gauges and the histograms of a run. It's thread-safe"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def increment(self, name, labels=None, amount=1):
+        key = get_metric_key(name, labels)
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, labels=None, value=0):
+        with self.lock:
+            self.gauges[get_metric_key(name, labels)] = value
+
+    def observe(self, name, labels=None, value=0, buckets=DEFAULT_LATENCY_BUCKETS):
+        key = get_metric_key(name, labels)
+
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+
+            self.histograms[key].observe(value)
+
+    def to_dict(self):
+        """Exports every metric, in a form that can be merged into another registry or written as JSON"""
+        with self.lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.gauges.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+    def merge(self, metrics_data):
+        """Adds up the metrics exported by another registry, such as the one of a
+        worker process. Its gauges replace the ones of this registry"""
+        for counter in metrics_data["counters"]:
+            self.increment(counter["name"], counter["labels"], counter["value"])
+
+        for gauge in metrics_data["gauges"]:
+            self.set_gauge(gauge["name"], gauge["labels"], gauge["value"])
+
+        for histogram_data in metrics_data["histograms"]:
+            key = get_metric_key(histogram_data["name"], histogram_data["labels"])
+
+            with self.lock:
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(histogram_data["buckets"])
+
+                self.histograms[key].merge(histogram_data)
+
+    def to_prometheus_text(self):
+        """Exports every metric in the Prometheus text exposition format
+
+        Returns
+        -------
+        str
+            the metrics, as the textfile collector expects them
+        """
+        lines = []
+        metrics_data = self.to_dict()
+
+        def describe(name, metric_type):
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {METRIC_DESCRIPTIONS.get(name, name)}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+
+        for metric_kind, metric_type in (("counters", "counter"), ("gauges", "gauge")):
+            described_names = set()
+
+            for metric in metrics_data[metric_kind]:
+                if metric["name"] not in described_names:
+                    describe(metric["name"], metric_type)
+                    described_names.add(metric["name"])
+
+                labels = format_labels(sorted(metric["labels"].items()))
+                lines.append(f"{METRIC_PREFIX}{metric['name']}{labels} {format_number(metric['value'])}")
+
+        described_names = set()
+
+        for histogram in metrics_data["histograms"]:
+            name = histogram["name"]
+
+            if name not in described_names:
+                describe(name, "histogram")
+                described_names.add(name)
+
+            cumulative_count = 0
+
+            for upper_bound, bucket_count in zip(
+                histogram["buckets"] + [float("inf")],
+                histogram["bucket_counts"] + [histogram["count"] - sum(histogram["bucket_counts"])],
+            ):
+                cumulative_count += bucket_count
+                labels = format_labels(
+                    sorted(histogram["labels"].items()) + [("le", format_number(upper_bound))]
+                )
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{labels} {cumulative_count}")
+
+            labels = format_labels(sorted(histogram["labels"].items()))
+            lines.append(f"{METRIC_PREFIX}{name}_sum{labels} {format_number(histogram['sum'])}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{labels} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+ACTIVE_REGISTRY = None
+
+
+def activate_registry(registry):
+    """Makes a registry collect the stage latencies of this process
+
+    Parameters
+    ----------
+    registry : MetricsRegistry
+        The registry, or None to stop collecting
+
+    Returns
+    -------
+    MetricsRegistry
+        the registry that was active before, to restore it afterwards
+    """
+    global ACTIVE_REGISTRY  # pylint: disable=global-statement
+
+    previous_registry = ACTIVE_REGISTRY
+    ACTIVE_REGISTRY = registry
+
+    return previous_registry
+
+
+@contextmanager
+def time_stage(stage, card_type):
+    """Times a stage of the rendering of a card into the active registry, if there's one
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage, such as 'title'
+    card_type : str
+        The type of the card, such as 'biome'
+    """
+    registry = ACTIVE_REGISTRY
+
+    if registry is None:
+        yield
+        return
+
+    start_time = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        registry.observe(
+            "stage_duration_seconds",
+            {"stage": stage, "card_type": card_type},
+            time.perf_counter() - start_time,
+        )
+
+
+def record_cache_metrics(registry, labels=None):
+    """Records the hits and the misses of the caches of this process
+
+    Parameters
+    ----------
+    registry : MetricsRegistry
+        The registry where the metrics get recorded
+    labels : dict
+        Extra labels, such as the process the caches belong to
+    """
+    for cache_name, cached_function in CACHED_FUNCTIONS.items():
+        cache_info = cached_function.cache_info()
+        cache_labels = {"cache": cache_name, **(labels or {})}
+        lookups = cache_info.hits + cache_info.misses
+
+        registry.set_gauge("cache_hits", cache_labels, cache_info.hits)
+        registry.set_gauge("cache_misses", cache_labels, cache_info.misses)
+        registry.set_gauge(
+            "cache_hit_ratio", cache_labels, cache_info.hits / lookups if lookups else 0.0
+        )
+
+
+def write_metrics(registry, textfile_path=None, json_path=None):
+    """Writes a registry as a Prometheus textfile and as JSON. Both are replaced
+    atomically, so the collector never reads a file halfway written
+
+    Parameters
+    ----------
+    registry : MetricsRegistry
+        The registry to write
+    textfile_path : str
+        The path to the '.prom' textfile, if any
+    json_path : str
+        The path to the JSON file, if any
+    """
+    if textfile_path is not None:
+        metrics_text = registry.to_prometheus_text().encode("utf-8")
+        write_file_atomically(textfile_path, lambda metrics_file: metrics_file.write(metrics_text))
+
+    if json_path is not None:
+        metrics_json = json.dumps(registry.to_dict(), indent=1).encode("utf-8")
+        write_file_atomically(json_path, lambda metrics_file: metrics_file.write(metrics_json))
@@ -0,0 +1,224 @@
+"""Output Sinks
+
+This script provides the destinations where the rendered cards get written. The
+cards can be saved as loose PNG files under the output directory, as always, or
+streamed one by one into a single uncompressed ZIP or TAR archive, which is much
+faster to write, sync and upload than thousands of small files. The archives get
+a 'manifest.json' index of every card they contain. Every sink refuses to write
+two cards to the same file or entry, rather than silently keeping the last one.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * open_output_sink - opens the output sink that fits the given destination
+"""
+
+import io
+import json
+from abc import ABC, abstractmethod
+import tarfile
+import threading
+import time
+import zipfile
+
+from file_utils import (
+    ensure_title_is_a_filename,
+    get_card_filename,
+    get_card_type_directory,
+    save_card_as_png,
+)
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+class DuplicateArchiveEntryException(Exception):
+    pass
+
+
+class UnhandledOutputDestinationException(Exception):
+    pass
+
+
+class DirectoryOutputSink:
+    """Saves every card as a PNG file under the output directory"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filenames = set()
+
+    def write_card(self, title, card, card_type):
+        filename = get_card_filename(title, card_type)
+
+        # The name is taken before writing, so the encoder threads write in parallel
+        with self.lock:
+            if filename in self.filenames:
+                raise DuplicateArchiveEntryException(
+                    f"The output directory already contains a card named '{filename}' from this run."
+                )
+
+            self.filenames.add(filename)
+
+        try:
+            return save_card_as_png(title, card, card_type)
+        except BaseException:
+            # Lets the card be written again when it's retried
+            with self.lock:
+                self.filenames.discard(filename)
+            raise
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class ArchiveOutputSink(ABC):
+    """Base class for the sinks that stream the cards into a single archive"""
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.lock = threading.Lock()
+        self.manifest = []
+        self.entry_names = set()
+
+    def write_card(self, title, card, card_type):
+        """Encodes a card and appends it to the archive right away
+
+        Parameters
+        ----------
+        title : str
+            The title of the card, to use as part of the entry name
+        card : Image or bytes
+            The card that will be written to the archive, or its PNG bytes if
+            it was already encoded
+        card_type : str
+            The type of the card, such as 'biome'
+
+        Returns
+        -------
+        str
+            the path of the card inside the archive
+        """
+        ensure_title_is_a_filename(title)
+        entry_name = f"{get_card_type_directory(card_type)}/{title}_card.png"
+
+        # PNG is already compressed, so the archive stores the bytes as they are
+        if isinstance(card, bytes):
+            card_bytes = card
+        else:
+            # Imported here so that opening a sink doesn't import the whole renderer
+            from card_rendering import encode_card  # pylint: disable=import-outside-toplevel
+
+            card_bytes = encode_card(card, "PNG")
+
+        with self.lock:
+            if entry_name in self.entry_names:
+                raise DuplicateArchiveEntryException(
+                    f"The archive '{self.archive_path}' already contains a card named '{entry_name}'."
+                )
+
+            self.write_entry(entry_name, card_bytes)
+
+            self.entry_names.add(entry_name)
+            self.manifest.append(
+                {
+                    "path": entry_name,
+                    "title": title,
+                    "card_type": card_type,
+                    "size": len(card_bytes),
+                }
+            )
+
+        return f"{self.archive_path}:{entry_name}"
+
+    @abstractmethod
+    def write_entry(self, entry_name, content):
+        """Appends a file to the archive. It's called with the lock held
+
+        Parameters
+        ----------
+        entry_name : str
+            The path of the file inside the archive
+        content : bytes
+            The content of the file
+        """
+
+    @abstractmethod
+    def close_archive(self):
+        """Finishes the archive once every card and the manifest were written"""
+
+    def close(self):
+        with self.lock:
+            manifest = json.dumps({"cards": self.manifest}, indent=2)
+            self.write_entry(MANIFEST_FILENAME, manifest.encode("utf-8"))
+            self.close_archive()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class ZipOutputSink(ArchiveOutputSink):
+    """Streams every card into an uncompressed ZIP archive"""
+
+    def __init__(self, archive_path):
+        super().__init__(archive_path)
+        self.archive = zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED)
+
+    def write_entry(self, entry_name, content):
+        self.archive.writestr(entry_name, content)
+
+    def close_archive(self):
+        self.archive.close()
+
+
+class TarOutputSink(ArchiveOutputSink):
+    """Streams every card into an uncompressed TAR archive"""
+
+    def __init__(self, archive_path):
+        super().__init__(archive_path)
+        self.archive = tarfile.open(archive_path, "w")
+
+    def write_entry(self, entry_name, content):
+        entry_info = tarfile.TarInfo(entry_name)
+        entry_info.size = len(content)
+        entry_info.mtime = int(time.time())
+
+        self.archive.addfile(entry_info, io.BytesIO(content))
+
+    def close_archive(self):
+        self.archive.close()
+
+
+def open_output_sink(destination=None):
+    """Opens the output sink that fits the given destination
+
+    Parameters
+    ----------
+    destination : str
+        The path to a '.zip' or '.tar' archive. If it's None, the cards get saved
+        as PNG files under the output directory
+
+    Returns
+    -------
+    DirectoryOutputSink, ZipOutputSink or TarOutputSink
+        the sink where the cards will be written
+    """
+    if destination is None:
+        return DirectoryOutputSink()
+
+    if destination.endswith(".zip"):
+        return ZipOutputSink(destination)
+
+    if destination.endswith(".tar"):
+        return TarOutputSink(destination)
+
+    raise UnhandledOutputDestinationException(
+        f"Can't write the cards to '{destination}': the archive must end in '.zip' or '.tar'."
+    )
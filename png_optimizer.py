@@ -0,0 +1,194 @@
+"""PNG Optimizer
+
+This script shrinks the PNG files of the cards after they're composed. Every
+card is encoded as it would be otherwise, and then as each of the following
+candidates, keeping whichever is the smallest:
+
+    * a palette image, when the card has few enough colours to fit one exactly,
+      which doesn't change a single pixel
+    * a palette image quantized to the closest 256 colours, only if a minimum
+      quality is given and the quantized card stays above it
+
+The metadata of the card, such as its ICC profile, is never written. The
+optimizer is thread-safe, so it can run on the encoder threads of a batch run,
+and it keeps a report of the bytes saved for every card.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * create_exact_palette_card - converts a card to a palette image without losing any pixel
+    * calculate_psnr - measures how close an image is to the original, in decibels
+"""
+
+import io
+import math
+import threading
+
+from PIL import Image, ImageChops
+
+# The most colours a PNG palette can hold
+MAX_PALETTE_COLORS = 256
+
+ORIGINAL = "original"
+EXACT_PALETTE = "exact_palette"
+QUANTIZED = "quantized"
+
+
+def encode_png(card, exhaustive_compression=False):
+    buffer = io.BytesIO()
+    card.save(buffer, format="PNG", optimize=exhaustive_compression)
+
+    return buffer.getvalue()
+
+
+def create_exact_palette_card(card):
+    """Converts a card to a palette image without losing any pixel
+
+    Parameters
+    ----------
+    card : Image
+        The card, in RGB or RGBA mode
+
+    Returns
+    -------
+    Image
+        the card as a palette image, or None if it has too many colours for a palette
+    """
+    colors = card.getcolors(MAX_PALETTE_COLORS)
+
+    if colors is None:
+        return None
+
+    palette_card = card.quantize(
+        colors=len(colors), method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE
+    )
+
+    # The quantizer usually keeps every colour when they fit, but that's not guaranteed
+    if ImageChops.difference(palette_card.convert(card.mode), card).getbbox() is not None:
+        return None
+
+    return palette_card
+
+
+def calculate_psnr(original, image):
+    """Measures how close an image is to the original, as the peak signal-to-noise ratio
+
+    Parameters
+    ----------
+    original : Image
+        The original image
+    image : Image
+        The image to compare, of the same size
+
+    Returns
+    -------
+    float
+        the PSNR in decibels, the higher the closer. It's infinite for identical images
+    """
+    histogram = ImageChops.difference(original, image.convert(original.mode)).histogram()
+
+    squared_error = sum(
+        count * (index % 256) ** 2 for index, count in enumerate(histogram)
+    )
+
+    if squared_error == 0:
+        return math.inf
+
+    mean_squared_error = squared_error / (len(histogram) // 256 * original.width * original.height)
+
+    return 10 * math.log10(255**2 / mean_squared_error)
+
+
+class PngOptimizer:
+    """Encodes every card as the smallest PNG among the candidates allowed"""
+
+    def __init__(self, min_psnr=None, exhaustive_compression=False):
+        """
+        Parameters
+        ----------
+        min_psnr : float
+            The minimum PSNR, in decibels, of a quantized card. By default, the
+            cards are never quantized, only reduced to a palette when it's lossless
+        exhaustive_compression : bool
+            Whether to let the encoder search for the best compression of the chosen
+            candidate, which saves a few more percent but takes several times longer
+        """
+        self.min_psnr = min_psnr
+        self.exhaustive_compression = exhaustive_compression
+        self.lock = threading.Lock()
+        self.reports = []
+
+    def optimize(self, title, card, card_type):
+        """Encodes a card as the smallest PNG among the candidates allowed
+
+        Parameters
+        ----------
+        title : str
+            The title of the card, for the report
+        card : Image
+            The finished card
+        card_type : str
+            The type of the card, for the report
+
+        Returns
+        -------
+        bytes
+            the PNG bytes of the card
+        """
+        if card.info:
+            # The metadata would otherwise be written along with the pixels
+            card = card.copy()
+            card.info = {}
+
+        original_bytes = encode_png(card)
+        candidates = [(ORIGINAL, card, original_bytes)]
+        psnr = math.inf
+
+        palette_card = create_exact_palette_card(card)
+
+        if palette_card is not None:
+            candidates.append((EXACT_PALETTE, palette_card, encode_png(palette_card)))
+        elif self.min_psnr is not None:
+            quantized_card = card.quantize(
+                colors=MAX_PALETTE_COLORS,
+                method=Image.Quantize.FASTOCTREE,
+                dither=Image.Dither.NONE,
+            )
+            quantized_psnr = calculate_psnr(card, quantized_card)
+
+            if quantized_psnr >= self.min_psnr:
+                candidates.append((QUANTIZED, quantized_card, encode_png(quantized_card)))
+                psnr = quantized_psnr
+
+        method, chosen_card, chosen_bytes = min(
+            candidates, key=lambda candidate: len(candidate[2])
+        )
+
+        if method != QUANTIZED:
+            psnr = math.inf
+
+        if self.exhaustive_compression:
+            chosen_bytes = min(
+                chosen_bytes, encode_png(chosen_card, exhaustive_compression=True), key=len
+            )
+
+        with self.lock:
+            self.reports.append(
+                {
+                    "title": title,
+                    "card_type": card_type,
+                    "method": method,
+                    "original_bytes": len(original_bytes),
+                    "optimized_bytes": len(chosen_bytes),
+                    "psnr": psnr,
+                }
+            )
+
+        return chosen_bytes
+
+    def calculate_bytes_saved(self):
+        with self.lock:
+            return sum(
+                report["original_bytes"] - report["optimized_bytes"]
+                for report in self.reports
+            )
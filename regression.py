@@ -0,0 +1,548 @@
+"""Regression
+
+This script renders a reference deck and compares every card to its stored
+golden image, so that a refactor of the drawing code can be checked against
+thousands of cards instead of by eye. The cards are rendered and compared in
+parallel, in a pool of worker processes.
+
+Each golden is stored along with the digest of its pixels and its perceptual
+hash, so most cards are compared without even decoding their golden:
+
+    * if the pixels of the card have the same digest, the card is identical
+    * if the perceptual hashes are far apart, the card is different, and the
+      pixel diff only serves to draw the diff image
+    * otherwise, the pixels are compared with the given tolerance
+
+Every card that doesn't match gets a diff image showing the golden, the rendered
+card and their difference side by side, linked from an HTML report.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * calculate_perceptual_hash - calculates the difference hash of an image
+    * update_goldens - renders a reference deck and stores its cards as the goldens
+    * check_goldens - renders a reference deck and compares its cards to the goldens
+
+Usage: python regression.py toml/deck.toml --update
+       python regression.py toml/deck.toml --max-channel-difference 2 --max-differing-pixels 0.001
+"""
+
+import argparse
+import hashlib
+import html
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageChops
+
+from card_rendering import encode_card, read_card_data, render_card
+from deck import load_deck_manifest
+from file_utils import get_card_type_directory, write_file_atomically
+
+DEFAULT_GOLDEN_DIRECTORY = "goldens"
+DEFAULT_REPORT_DIRECTORY = "regression_report"
+GOLDEN_INDEX_FILENAME = "index.json"
+
+# The perceptual hash compares the brightness of neighbouring cells of a 9x8 grid
+PERCEPTUAL_HASH_WIDTH = 9
+PERCEPTUAL_HASH_HEIGHT = 8
+
+# Beyond this many differing bits, two images are different whatever the tolerance
+DEFAULT_MAX_HASH_DISTANCE = 10
+
+# How much the difference gets amplified in the diff images, so small changes show
+DIFF_AMPLIFICATION = 8
+DIFF_IMAGE_SUFFIX = "_diff.png"
+
+IDENTICAL = "identical"
+WITHIN_TOLERANCE = "within_tolerance"
+DIFFERENT = "different"
+MISSING_GOLDEN = "missing_golden"
+FAILED = "failed"
+STORED = "stored"
+PASSING_STATUSES = (IDENTICAL, WITHIN_TOLERANCE)
+
+
+def calculate_pixel_digest(image):
+    digest = hashlib.sha256(f"{image.mode} {image.size}".encode("utf-8"))
+    digest.update(image.tobytes())
+
+    return digest.hexdigest()
+
+
+def calculate_perceptual_hash(image):
+    """Calculates the difference hash of an image, which barely changes when the
+    image changes slightly, so that the distance between two hashes tells how
+    different two images look
+
+    Parameters
+    ----------
+    image : Image
+        The image to hash
+
+    Returns
+    -------
+    int
+        the 64 bits of the hash
+    """
+    grid = image.convert("L").resize(
+        (PERCEPTUAL_HASH_WIDTH, PERCEPTUAL_HASH_HEIGHT), Image.BILINEAR
+    )
+    brightness = list(grid.getdata())
+
+    perceptual_hash = 0
+
+    for row in range(PERCEPTUAL_HASH_HEIGHT):
+        for column in range(PERCEPTUAL_HASH_WIDTH - 1):
+            cell = row * PERCEPTUAL_HASH_WIDTH + column
+            perceptual_hash = perceptual_hash << 1 | (brightness[cell] > brightness[cell + 1])
+
+    return perceptual_hash
+
+
+def calculate_hash_distance(first_hash, second_hash):
+    return bin(first_hash ^ second_hash).count("1")
+
+
+def get_golden_name(title, card_type):
+    # The backs have no title, so they're named after their card type
+    return f"{get_card_type_directory(card_type)}/{title or card_type}_card.png"
+
+
+def load_golden_index(golden_directory):
+    try:
+        with open(
+            os.path.join(golden_directory, GOLDEN_INDEX_FILENAME), encoding="utf-8"
+        ) as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_golden(card_data, golden_directory):
+    """Renders a card and stores it as a golden, in a worker process
+
+    Returns
+    -------
+    dict
+        the 'golden_name' and the 'status' of the card, which is FAILED along with
+        a 'message' if it couldn't be rendered, and the 'golden_entry' of the index
+        if it was stored
+    """
+    try:
+        title, _, card_type = read_card_data(card_data)
+        card = render_card(card_data)
+    except Exception as exception:  # pylint: disable=broad-except
+        return {"golden_name": None, "status": FAILED, "message": str(exception)}
+
+    golden_name = get_golden_name(title, card_type)
+    golden_path = os.path.join(golden_directory, golden_name)
+    card_bytes = encode_card(card, "PNG")
+
+    os.makedirs(os.path.dirname(golden_path), exist_ok=True)
+    write_file_atomically(golden_path, lambda golden_file: golden_file.write(card_bytes))
+
+    return {
+        "golden_name": golden_name,
+        "status": STORED,
+        "message": "",
+        "golden_entry": {
+            "pixel_digest": calculate_pixel_digest(card),
+            "perceptual_hash": calculate_perceptual_hash(card),
+        },
+    }
+
+
+def count_differing_pixels(golden, card, max_channel_difference):
+    # The largest difference among the channels of each pixel
+    difference = ImageChops.difference(golden, card)
+    largest_difference = difference.getchannel(0)
+
+    for band in range(1, len(difference.getbands())):
+        largest_difference = ImageChops.lighter(largest_difference, difference.getchannel(band))
+
+    histogram = largest_difference.histogram()
+
+    return sum(histogram[max_channel_difference + 1 :])
+
+
+def draw_diff_image(golden, card):
+    """Puts the golden, the rendered card and their amplified difference side by side"""
+    width = max(golden.width, card.width)
+    height = max(golden.height, card.height)
+
+    diff_image = Image.new("RGB", (width * 3, height), "white")
+    diff_image.paste(golden.convert("RGB"), (0, 0))
+    diff_image.paste(card.convert("RGB"), (width, 0))
+
+    if golden.size == card.size:
+        difference = ImageChops.difference(golden.convert("RGB"), card.convert("RGB"))
+        diff_image.paste(
+            difference.point(lambda value: min(255, value * DIFF_AMPLIFICATION)),
+            (width * 2, 0),
+        )
+
+    return diff_image
+
+
+def compare_card_to_golden(card_data, golden_directory, golden_entry, tolerance):
+    """Renders a card and compares it to its golden, in a worker process
+
+    Parameters
+    ----------
+    card_data : dict
+        The card data, as accepted by 'read_card_data'
+    golden_directory : str
+        The directory where the goldens are stored
+    golden_entry : dict
+        The entry of the golden in the index, or None if there's no golden
+    tolerance : dict
+        The 'max_channel_difference', the ratio of 'max_differing_pixels', and the
+        'max_hash_distance' beyond which the card is different without a pixel diff
+
+    Returns
+    -------
+    dict
+        the 'status' of the card, along with the PNG bytes of the 'diff_image' if
+        it doesn't match its golden
+    """
+    try:
+        title, _, card_type = read_card_data(card_data)
+        card = render_card(card_data)
+    except Exception as exception:  # pylint: disable=broad-except
+        return {"golden_name": None, "status": FAILED, "message": str(exception)}
+
+    golden_name = get_golden_name(title, card_type)
+    result = {"golden_name": golden_name, "status": IDENTICAL, "message": ""}
+
+    if (
+        golden_entry is None
+        or "pixel_digest" not in golden_entry
+        or "perceptual_hash" not in golden_entry
+    ):
+        result["status"] = MISSING_GOLDEN
+        result["message"] = "There's no golden for this card. Run with '--update' to store it."
+        return result
+
+    # The fast path: the golden doesn't even need to be decoded
+    if calculate_pixel_digest(card) == golden_entry["pixel_digest"]:
+        return result
+
+    try:
+        golden = Image.open(os.path.join(golden_directory, golden_name))
+        golden.load()
+    except OSError as exception:
+        result["status"] = MISSING_GOLDEN
+        result["message"] = (
+            f"The golden of this card can't be read. Run with '--update' to store it again.\nError: {exception}"
+        )
+        return result
+
+    hash_distance = calculate_hash_distance(
+        calculate_perceptual_hash(card), golden_entry["perceptual_hash"]
+    )
+
+    if golden.size != card.size or golden.mode != card.mode:
+        result["status"] = DIFFERENT
+        result["message"] = (
+            f"The card is {card.mode} {card.size}, the golden is {golden.mode} {golden.size}."
+        )
+    elif hash_distance > tolerance["max_hash_distance"]:
+        result["status"] = DIFFERENT
+        result["message"] = f"The perceptual hashes are {hash_distance} bits apart."
+    else:
+        differing_pixels = count_differing_pixels(
+            golden, card, tolerance["max_channel_difference"]
+        )
+        differing_ratio = differing_pixels / (card.width * card.height)
+
+        if differing_ratio <= tolerance["max_differing_pixels"]:
+            result["status"] = WITHIN_TOLERANCE
+        else:
+            result["status"] = DIFFERENT
+
+        result["message"] = (
+            f"{differing_pixels} pixels ({differing_ratio:.4%}) differ by more than "
+            f"{tolerance['max_channel_difference']}; the perceptual hashes are "
+            f"{hash_distance} bits apart."
+        )
+
+    if result["status"] == DIFFERENT:
+        diff_image_bytes = io.BytesIO()
+        draw_diff_image(golden, card).save(diff_image_bytes, format="PNG")
+        result["diff_image"] = diff_image_bytes.getvalue()
+
+    return result
+
+
+def update_goldens(cards, golden_directory=DEFAULT_GOLDEN_DIRECTORY, workers=None):
+    """Renders a reference deck and stores its cards as the goldens. A card that
+    fails to render keeps its previous golden, if it had one. A card with the same
+    golden name as an earlier card of the deck isn't stored, and gets reported
+
+    Parameters
+    ----------
+    cards : list
+        The card data of every card, as accepted by 'read_card_data'
+    golden_directory : str
+        The directory where the goldens get stored
+    workers : int
+        How many worker processes render the cards. By default, one per CPU
+
+    Returns
+    -------
+    list
+        the result of every card, as returned by 'render_golden', without the golden entries
+    """
+    golden_index = load_golden_index(golden_directory)
+
+    golden_names = set()
+    duplicate_results = {}
+
+    for index, card_data in enumerate(cards):
+        try:
+            title, _, card_type = read_card_data(card_data)
+            golden_name = get_golden_name(title, card_type)
+        except Exception:  # pylint: disable=broad-except
+            # The worker reports the invalid card data
+            continue
+
+        # The second card would overwrite the golden of the first one
+        if golden_name in golden_names:
+            duplicate_results[index] = {
+                "golden_name": golden_name,
+                "status": FAILED,
+                "message": "An earlier card of the deck has the same golden name.",
+            }
+
+        golden_names.add(golden_name)
+
+    rendered_cards = [
+        card_data for index, card_data in enumerate(cards) if index not in duplicate_results
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rendered_results = iter(
+            list(
+                executor.map(
+                    render_golden, rendered_cards, [golden_directory] * len(rendered_cards)
+                )
+            )
+        )
+
+    results = [
+        duplicate_results[index] if index in duplicate_results else next(rendered_results)
+        for index in range(len(cards))
+    ]
+
+    for result in results:
+        if result["status"] == STORED:
+            golden_index[result["golden_name"]] = result.pop("golden_entry")
+
+    index_content = json.dumps(golden_index, indent=1, sort_keys=True).encode("utf-8")
+    write_file_atomically(
+        os.path.join(golden_directory, GOLDEN_INDEX_FILENAME),
+        lambda index_file: index_file.write(index_content),
+    )
+
+    return results
+
+
+def write_report(results, report_directory):
+    """Writes the diff images of the cards that don't match, and an HTML report listing every card"""
+    os.makedirs(report_directory, exist_ok=True)
+
+    # The diff images of a previous run would otherwise linger next to the new report
+    for root, _, filenames in os.walk(report_directory):
+        for filename in filenames:
+            if filename.endswith(DIFF_IMAGE_SUFFIX):
+                os.remove(os.path.join(root, filename))
+
+    rows = []
+
+    for result in results:
+        diff_image_link = ""
+
+        if "diff_image" in result:
+            diff_image_name = result["golden_name"].replace(".png", DIFF_IMAGE_SUFFIX)
+            diff_image_path = os.path.join(report_directory, diff_image_name)
+            diff_image = result.pop("diff_image")
+
+            os.makedirs(os.path.dirname(diff_image_path), exist_ok=True)
+            write_file_atomically(diff_image_path, lambda diff_file: diff_file.write(diff_image))
+
+            diff_image_link = f'<a href="{html.escape(diff_image_name)}"><img src="{html.escape(diff_image_name)}" width="480"></a>'
+
+        rows.append(
+            f"<tr class=\"{result['status']}\"><td>{html.escape(str(result['golden_name']))}</td>"
+            f"<td>{result['status']}</td><td>{html.escape(result['message'])}</td>"
+            f"<td>{diff_image_link}</td></tr>"
+        )
+
+    report = (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Regression report</title>"
+        "<style>td{padding:4px;vertical-align:top}.different,.failed,.missing_golden{background:#fdd}</style>"
+        "</head><body><table>\n<tr><th>Card</th><th>Status</th><th>Details</th><th>Golden | Rendered | Difference</th></tr>\n"
+        + "\n".join(rows)
+        + "\n</table></body></html>\n"
+    )
+
+    write_file_atomically(
+        os.path.join(report_directory, "index.html"),
+        lambda report_file: report_file.write(report.encode("utf-8")),
+    )
+
+
+def check_goldens(
+    cards,
+    golden_directory=DEFAULT_GOLDEN_DIRECTORY,
+    report_directory=DEFAULT_REPORT_DIRECTORY,
+    tolerance=None,
+    workers=None,
+):
+    """Renders a reference deck and compares every card to its golden
+
+    Parameters
+    ----------
+    cards : list
+        The card data of every card, as accepted by 'read_card_data'
+    golden_directory : str
+        The directory where the goldens are stored
+    report_directory : str
+        The directory where the diff images and the HTML report get written
+    tolerance : dict
+        As accepted by 'compare_card_to_golden'. By default, the cards must be identical
+    workers : int
+        How many worker processes render and compare the cards. By default, one per CPU
+
+    Returns
+    -------
+    list
+        the result of every card, as returned by 'compare_card_to_golden', without the diff images
+    """
+    if tolerance is None:
+        tolerance = {
+            "max_channel_difference": 0,
+            "max_differing_pixels": 0.0,
+            "max_hash_distance": DEFAULT_MAX_HASH_DISTANCE,
+        }
+
+    golden_index = load_golden_index(golden_directory)
+
+    golden_entries = []
+
+    for card_data in cards:
+        try:
+            title, _, card_type = read_card_data(card_data)
+            golden_entries.append(golden_index.get(get_golden_name(title, card_type)))
+        except Exception:  # pylint: disable=broad-except
+            # The worker reports the invalid card data
+            golden_entries.append(None)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                compare_card_to_golden,
+                cards,
+                [golden_directory] * len(cards),
+                golden_entries,
+                [tolerance] * len(cards),
+            )
+        )
+
+    write_report(results, report_directory)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden Image Regression")
+    parser.add_argument("manifest", help="Path to the TOML manifest of the reference deck.")
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Store the rendered cards as the new goldens instead of comparing them.",
+    )
+    parser.add_argument(
+        "--goldens", default=DEFAULT_GOLDEN_DIRECTORY, help="The directory of the goldens."
+    )
+    parser.add_argument(
+        "--report",
+        default=DEFAULT_REPORT_DIRECTORY,
+        help="The directory where the diff images and the HTML report get written.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="How many worker processes to use."
+    )
+    parser.add_argument(
+        "--max-channel-difference",
+        type=int,
+        default=0,
+        help="How much a channel of a pixel can differ from the golden before the pixel counts as differing.",
+    )
+    parser.add_argument(
+        "--max-differing-pixels",
+        type=float,
+        default=0.0,
+        help="The ratio of differing pixels a card can have and still pass.",
+    )
+    parser.add_argument(
+        "--max-hash-distance",
+        type=int,
+        default=DEFAULT_MAX_HASH_DISTANCE,
+        help="How many bits the perceptual hashes can differ by before the card is different, whatever the tolerance.",
+    )
+
+    args = parser.parse_args()
+
+    cards = load_deck_manifest(args.manifest)
+
+    if args.update:
+        results = update_goldens(cards, args.goldens, args.workers)
+        failing_results = [result for result in results if result["status"] == FAILED]
+
+        for result in failing_results:
+            print(f"{result['status']}: {result['golden_name']}. {result['message']}")
+
+        print(
+            f"Stored {len(results) - len(failing_results)} of {len(results)} goldens in '{args.goldens}'."
+        )
+
+        if failing_results:
+            sys.exit(1)
+
+        return
+
+    results = check_goldens(
+        cards,
+        args.goldens,
+        args.report,
+        {
+            "max_channel_difference": args.max_channel_difference,
+            "max_differing_pixels": args.max_differing_pixels,
+            "max_hash_distance": args.max_hash_distance,
+        },
+        args.workers,
+    )
+
+    failing_results = [
+        result for result in results if result["status"] not in PASSING_STATUSES
+    ]
+
+    for result in failing_results:
+        print(f"{result['status']}: {result['golden_name']}. {result['message']}")
+
+    print(
+        f"{len(results) - len(failing_results)} of {len(results)} cards match their goldens. "
+        f"See '{args.report}/index.html'."
+    )
+
+    if failing_results:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,528 @@
+"""Render Daemon
+
+This script runs a resident render server, so that tools like the level editor
+or the deck builder don't pay the interpreter startup, the Pillow import and the
+loading of the fonts for every preview. The fonts get loaded once, and a pool of
+workers is kept warm to render the cards.
+
+The workers are either processes, the default, or threads. Each worker process
+decodes and caches its own copy of every asset, while the threads share a single
+asset cache and set of fonts. Most of the time of a card goes into Pillow, which
+releases the GIL while it resizes, blurs, pastes and encodes, so the threads
+render in parallel with a fraction of the memory. See 'benchmark_backends.py'.
+
+The server listens on local HTTP and accepts the following requests:
+
+    * POST /render - renders the card described by a JSON body such as
+      {"card_type": "biome", "title": "Forest", "image_paths": {...}, "output": "png"}.
+      With "output" set to "png" (the default), the PNG bytes are returned; with
+      "path", the card is saved to the output directory and its path is returned
+    * GET /stats - returns the queue state and the render latencies per card type
+    * GET /metrics - returns the metrics of the daemon in the Prometheus format,
+      including the stage latencies and the cache hit ratios of the workers
+
+When it shuts down, the daemon can also write its metrics as a Prometheus
+textfile and as JSON.
+
+Usage: python render_daemon.py --port 8765 --workers 4 --max-queued-jobs 32
+       python render_daemon.py --backend thread --workers 4
+       python render_daemon.py --metrics-textfile /var/lib/node_exporter/render_daemon.prom
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from card_rendering import encode_card, render_card
+from errors import UnhandledCardTypeException
+from file_utils import (
+    IncorrectImagePathException,
+    InvalidCardTitleException,
+    ensure_all_image_paths_exist,
+    ensure_title_is_a_filename,
+    get_card_type_directory,
+    save_card_as_png,
+)
+from fonts import load_biome_title_font, load_encounter_title_font
+from metrics import (
+    QUEUE_DEPTH_BUCKETS,
+    MetricsRegistry,
+    activate_registry,
+    record_cache_metrics,
+    time_stage,
+    write_metrics,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUED_JOBS = 32
+
+# How many of the latest latencies per card type are kept to compute the percentiles
+LATENCY_WINDOW = 1000
+
+OUTPUT_FORMATS = ("png", "path")
+
+RENDER_BACKENDS = ("process", "thread")
+DEFAULT_RENDER_BACKEND = "process"
+
+
+class InvalidRenderRequestException(Exception):
+    pass
+
+
+class UnhandledRenderBackendException(Exception):
+    pass
+
+
+def warm_up_worker(_):
+    """Runs in each worker process once, so the first real job doesn't pay for the startup"""
+    # The fonts only get loaded when they're first needed
+    load_biome_title_font()
+    load_encounter_title_font()
+
+    return os.getpid()
+
+
+def render_and_encode_card(title, image_paths, card_type, output, metrics):
+    """Renders a card and encodes it as PNG
+
+    Parameters
+    ----------
+    title : str
+        The title of the card. It can be None, as in the case of card backs
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+    output : str
+        Either 'png', to get the encoded bytes back, or 'path', to save the card
+    metrics : MetricsRegistry
+        Where the encoded bytes get recorded
+
+    Returns
+    -------
+    bytes or str
+        the PNG bytes of the card, or the path where it was saved
+    """
+    card = render_card({"title": title, "image_paths": image_paths, "card_type": card_type})
+
+    with time_stage("encode", card_type):
+        card_bytes = encode_card(card, "PNG")
+
+    metrics.increment("encoded_bytes_total", {"card_type": card_type}, len(card_bytes))
+
+    if output == "path":
+        with time_stage("write", card_type):
+            return save_card_as_png(title, card_bytes, card_type)
+
+    return card_bytes
+
+
+def render_job(title, image_paths, card_type, output):
+    """Renders a card inside a worker process
+
+    Parameters
+    ----------
+    title : str
+        The title of the card. It can be None, as in the case of card backs
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+    output : str
+        Either 'png', to get the encoded bytes back, or 'path', to save the card
+
+    Returns
+    -------
+    bytes or str, dict
+        the PNG bytes of the card, or the path where it was saved, and the metrics
+        of the job as exported by 'MetricsRegistry.to_dict'
+    """
+    worker_metrics = MetricsRegistry()
+    previous_registry = activate_registry(worker_metrics)
+
+    try:
+        result = render_and_encode_card(title, image_paths, card_type, output, worker_metrics)
+    finally:
+        activate_registry(previous_registry)
+
+    # Each worker has caches of its own
+    record_cache_metrics(worker_metrics, {"worker": str(os.getpid())})
+
+    return result, worker_metrics.to_dict()
+
+
+def parse_render_request(body):
+    """Validates the JSON body of a render request
+
+    Parameters
+    ----------
+    body : bytes
+        The raw body of the HTTP request
+
+    Returns
+    -------
+    str, dict, str, str
+        the title, the image paths, the card type and the output format
+    """
+    try:
+        render_request = json.loads(body)
+    except ValueError as exception:
+        raise InvalidRenderRequestException(
+            f"The body of the render request isn't valid JSON.\nError: {exception}"
+        )
+
+    if not isinstance(render_request, dict):
+        raise InvalidRenderRequestException(
+            "The body of the render request must be a JSON object."
+        )
+
+    for key in ("card_type", "image_paths"):
+        if key not in render_request:
+            raise InvalidRenderRequestException(
+                f"The render request doesn't contain the key '{key}'."
+            )
+
+    if not isinstance(render_request["card_type"], str):
+        raise InvalidRenderRequestException(
+            "The 'card_type' of the render request must be a string."
+        )
+
+    try:
+        get_card_type_directory(render_request["card_type"])
+    except UnhandledCardTypeException as exception:
+        raise InvalidRenderRequestException(
+            f"The card type of the render request isn't handled.\nError: {exception}"
+        )
+
+    if not isinstance(render_request["image_paths"], dict):
+        raise InvalidRenderRequestException(
+            "The 'image_paths' of the render request must be a JSON object."
+        )
+
+    # With the "path" output, the title becomes part of a filename on the server
+    try:
+        ensure_title_is_a_filename(render_request.get("title"))
+    except InvalidCardTitleException as exception:
+        raise InvalidRenderRequestException(
+            f"The title of the render request can't be used.\nError: {exception}"
+        )
+
+    output = render_request.get("output", "png")
+
+    if output not in OUTPUT_FORMATS:
+        raise InvalidRenderRequestException(
+            f"The output '{output}' isn't handled. The options are {OUTPUT_FORMATS}."
+        )
+
+    try:
+        ensure_all_image_paths_exist(render_request["image_paths"])
+    except IncorrectImagePathException as exception:
+        raise InvalidRenderRequestException(
+            f"Some image path of the render request doesn't lead to an actual file.\nError: {exception}"
+        )
+
+    return (
+        render_request.get("title"),
+        render_request["image_paths"],
+        render_request["card_type"],
+        output,
+    )
+
+
+class RenderStats:
+    """Keeps count of the jobs and of their latencies, per card type"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.jobs_rejected = 0
+        self.jobs_in_queue = 0
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def record_latency(self, card_type, seconds):
+        with self.lock:
+            self.jobs_completed += 1
+            self.latencies[card_type].append(seconds * 1000)
+
+    def record_failure(self):
+        with self.lock:
+            self.jobs_failed += 1
+
+    def record_rejection(self):
+        with self.lock:
+            self.jobs_rejected += 1
+
+    def change_jobs_in_queue(self, difference):
+        with self.lock:
+            self.jobs_in_queue += difference
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "jobs_completed": self.jobs_completed,
+                "jobs_failed": self.jobs_failed,
+                "jobs_rejected": self.jobs_rejected,
+                "jobs_in_queue": self.jobs_in_queue,
+                "latency_ms": {
+                    card_type: summarize_latencies(latencies)
+                    for card_type, latencies in self.latencies.items()
+                },
+            }
+
+
+def summarize_latencies(latencies):
+    ordered_latencies = sorted(latencies)
+
+    def percentile(fraction):
+        return ordered_latencies[int(fraction * (len(ordered_latencies) - 1))]
+
+    return {
+        "count": len(ordered_latencies),
+        "mean": sum(ordered_latencies) / len(ordered_latencies),
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "max": ordered_latencies[-1],
+    }
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """Handles the HTTP requests sent to the render daemon"""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path == "/stats":
+            self.send_json(200, self.server.stats.to_dict())
+        elif self.path == "/metrics":
+            self.send_bytes(
+                200,
+                self.server.collect_metrics().to_prometheus_text().encode("utf-8"),
+                "text/plain; version=0.0.4",
+            )
+        else:
+            self.send_json(404, {"error": f"Unknown path '{self.path}'."})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        if self.path != "/render":
+            self.send_json(404, {"error": f"Unknown path '{self.path}'."})
+            return
+
+        try:
+            content_length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            content_length = -1
+
+        if content_length < 0:
+            self.send_json(400, {"error": "The 'Content-Length' header must be a number of bytes."})
+            return
+
+        body = self.rfile.read(content_length)
+
+        try:
+            title, image_paths, card_type, output = parse_render_request(body)
+        except InvalidRenderRequestException as exception:
+            self.send_json(400, {"error": str(exception)})
+            return
+
+        # Reject the job right away instead of letting the queue grow without bounds
+        if not self.server.queue_slots.acquire(blocking=False):
+            self.server.stats.record_rejection()
+            self.server.metrics.increment("jobs_rejected_total")
+            self.send_json(503, {"error": "The render queue is full."})
+            return
+
+        self.server.metrics.observe(
+            "queue_depth",
+            {"queue": "render"},
+            self.server.stats.jobs_in_queue,
+            QUEUE_DEPTH_BUCKETS,
+        )
+        self.server.stats.change_jobs_in_queue(1)
+        start_time = time.perf_counter()
+
+        try:
+            result = self.server.run_render_job(title, image_paths, card_type, output)
+        except Exception as exception:  # pylint: disable=broad-except
+            self.server.stats.record_failure()
+            self.server.metrics.increment("cards_failed_total", {"card_type": card_type})
+            self.send_json(500, {"error": f"Failed to render the card.\nError: {exception}"})
+            return
+        finally:
+            self.server.stats.change_jobs_in_queue(-1)
+            self.server.queue_slots.release()
+
+        latency = time.perf_counter() - start_time
+        self.server.stats.record_latency(card_type, latency)
+        self.server.metrics.increment("cards_rendered_total", {"card_type": card_type})
+        self.server.metrics.observe("job_duration_seconds", {"card_type": card_type}, latency)
+
+        if output == "path":
+            self.send_json(200, {"path": result})
+        else:
+            self.send_bytes(200, result, "image/png")
+
+    def send_json(self, status, content):
+        self.send_bytes(status, json.dumps(content).encode("utf-8"), "application/json")
+
+    def send_bytes(self, status, content, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        # The latencies are available from /stats; logging every request is just noise.
+        pass
+
+
+class RenderDaemon(ThreadingHTTPServer):
+    """HTTP server that dispatches the render jobs to a pool of warm workers"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        workers,
+        max_queued_jobs,
+        metrics_textfile=None,
+        metrics_json=None,
+        backend=DEFAULT_RENDER_BACKEND,
+    ):
+        if backend not in RENDER_BACKENDS:
+            raise UnhandledRenderBackendException(
+                f"The render backend '{backend}' isn't handled. The options are {RENDER_BACKENDS}."
+            )
+
+        super().__init__(address, RenderRequestHandler)
+
+        self.backend = backend
+        self.queue_slots = threading.BoundedSemaphore(max_queued_jobs)
+        self.stats = RenderStats()
+        self.metrics = MetricsRegistry()
+        self.metrics_textfile = metrics_textfile
+        self.metrics_json = metrics_json
+        self.start_time = time.perf_counter()
+        self.previous_registry = None
+
+        if backend == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+
+            # Start every worker now, rather than on the first requests
+            list(self.executor.map(warm_up_worker, range(workers)))
+        elif backend == "thread":
+            self.executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="render-worker"
+            )
+
+            # The threads share the fonts and the caches of this process, and its metrics
+            warm_up_worker(None)
+            self.previous_registry = activate_registry(self.metrics)
+
+    def run_render_job(self, title, image_paths, card_type, output):
+        """Renders a card on one of the workers and waits for it
+
+        Returns
+        -------
+        bytes or str
+            the PNG bytes of the card, or the path where it was saved
+        """
+        if self.backend == "thread":
+            return self.executor.submit(
+                render_and_encode_card, title, image_paths, card_type, output, self.metrics
+            ).result()
+
+        result, worker_metrics = self.executor.submit(
+            render_job, title, image_paths, card_type, output
+        ).result()
+        self.metrics.merge(worker_metrics)
+
+        return result
+
+    def collect_metrics(self):
+        """Updates the gauges that depend on the uptime, and returns the metrics"""
+        uptime = time.perf_counter() - self.start_time
+
+        self.metrics.set_gauge("run_duration_seconds", value=uptime)
+
+        if self.backend == "thread":
+            record_cache_metrics(self.metrics)
+        self.metrics.set_gauge(
+            "cards_per_second", value=self.stats.jobs_completed / uptime if uptime else 0.0
+        )
+
+        return self.metrics
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+        if self.backend == "thread":
+            activate_registry(self.previous_registry)
+
+        write_metrics(self.collect_metrics(), self.metrics_textfile, self.metrics_json)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Card Render Daemon")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="The address to listen on.")
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="The port to listen on."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="How many cards can get rendered at the same time.",
+    )
+    parser.add_argument(
+        "--max-queued-jobs",
+        type=int,
+        default=DEFAULT_MAX_QUEUED_JOBS,
+        help="How many render jobs can be waiting or rendering before new ones get rejected.",
+    )
+
+    parser.add_argument(
+        "--backend",
+        choices=RENDER_BACKENDS,
+        default=DEFAULT_RENDER_BACKEND,
+        help="Whether the workers are processes, each with its own caches, or threads that share them.",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        help="Where to write the metrics as a Prometheus textfile when the daemon stops.",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        help="Where to write the metrics as JSON when the daemon stops.",
+    )
+
+    args = parser.parse_args()
+
+    server = RenderDaemon(
+        (args.host, args.port),
+        args.workers,
+        args.max_queued_jobs,
+        args.metrics_textfile,
+        args.metrics_json,
+        args.backend,
+    )
+
+    print(f"Render daemon listening on http://{args.host}:{args.port} ({args.backend} workers)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
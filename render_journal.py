@@ -0,0 +1,174 @@
+"""Render Journal
+
+This script keeps an append-only journal of a batch run, one JSON line per card
+that got rendered or that failed. Each line holds the fingerprint of the inputs
+of the card, so a run that crashed can be resumed: the cards whose inputs didn't
+change and whose output is still the file that was written get skipped, and
+the cards that failed get retried a bounded number of times.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * fingerprint_card - fingerprints the title, the type and the images of a card
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from assets import get_content_id
+
+DONE = "done"
+FAILED = "failed"
+
+
+def fingerprint_card(title, image_paths, card_type):
+    """Fingerprints the inputs of a card, including the content of its images
+
+    Parameters
+    ----------
+    title : str
+        The title of the card. It can be None, as in the case of card backs
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+
+    Returns
+    -------
+    str
+        the fingerprint, which changes if the card or any of its images change
+    """
+    image_content_ids = {
+        key: [get_content_id(path) for path in value]
+        if isinstance(value, list)
+        else get_content_id(value)
+        for key, value in image_paths.items()
+    }
+
+    card_inputs = json.dumps(
+        {
+            "title": title,
+            "card_type": card_type,
+            "image_paths": image_paths,
+            "image_content_ids": image_content_ids,
+        },
+        sort_keys=True,
+    )
+
+    return hashlib.sha256(card_inputs.encode("utf-8")).hexdigest()
+
+
+class RenderJournal:
+    """The append-only record of the cards rendered, or failed, in a batch run"""
+
+    def __init__(self, journal_path, resume=False):
+        """
+        Parameters
+        ----------
+        journal_path : str
+            The path to the JSON lines journal
+        resume : bool
+            Whether to keep the records of the previous run. Otherwise, the journal
+            starts empty
+        """
+        self.journal_path = journal_path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.failed_attempts = {}
+
+        if resume:
+            self.load()
+
+        os.makedirs(os.path.dirname(journal_path) or ".", exist_ok=True)
+        self.journal_file = open(  # pylint: disable=consider-using-with
+            journal_path, "a" if resume else "w", encoding="utf-8"
+        )
+
+    def load(self):
+        try:
+            with open(self.journal_path, encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may have been cut short by a crash
+                        continue
+
+                    if entry["status"] == FAILED:
+                        self.failed_attempts[entry["fingerprint"]] = entry["attempts"]
+                    else:
+                        self.entries[entry["fingerprint"]] = entry
+                        self.failed_attempts.pop(entry["fingerprint"], None)
+        except OSError:
+            pass
+
+    def is_done(self, fingerprint):
+        """Checks whether a card was rendered, and its output is still what got written
+
+        Parameters
+        ----------
+        fingerprint : str
+            The fingerprint of the inputs of the card
+
+        Returns
+        -------
+        bool
+            True if the card can be skipped
+        """
+        entry = self.entries.get(fingerprint)
+
+        # Archive entries can't be verified from outside of the archive, so they're redone
+        if entry is None or "size" not in entry:
+            return False
+
+        try:
+            stat = os.stat(entry["output_path"])
+        except OSError:
+            return False
+
+        return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+    def get_failed_attempts(self, fingerprint):
+        return self.failed_attempts.get(fingerprint, 0)
+
+    def append(self, entry):
+        with self.lock:
+            self.journal_file.write(json.dumps(entry) + "\n")
+            self.journal_file.flush()
+
+    def record_done(self, fingerprint, index, title, card_type, output_path):
+        entry = {
+            "status": DONE,
+            "fingerprint": fingerprint,
+            "index": index,
+            "title": title,
+            "card_type": card_type,
+            "output_path": output_path,
+        }
+
+        if os.path.isfile(output_path):
+            stat = os.stat(output_path)
+            entry["size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+
+        self.entries[fingerprint] = entry
+        self.append(entry)
+
+    def record_failure(self, fingerprint, index, title, card_type, error, attempts):
+        self.failed_attempts[fingerprint] = attempts
+        self.append(
+            {
+                "status": FAILED,
+                "fingerprint": fingerprint,
+                "index": index,
+                "title": title,
+                "card_type": card_type,
+                "error": error,
+                "attempts": attempts,
+            }
+        )
+
+    def close(self):
+        self.journal_file.close()
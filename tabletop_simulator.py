@@ -0,0 +1,326 @@
+"""Tabletop Simulator
+
+This script exports a deck for Tabletop Simulator, which loads a deck from a few
+10x7 sprite sheets much faster than from one image per card. The fronts are
+packed into the sheets straight from the composites that the renderer keeps in
+memory, so no PNG gets written and decoded again, and the shared back is
+rendered once from the 'biome_back' or 'exploration_zone_back' card.
+
+Following the convention of Tabletop Simulator, the last slot of every sheet is
+kept for the image shown when a card is hidden, which is the back.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * pack_cards_into_sheets - packs the rendered fronts into sheets, one at a time
+    * export_deck_for_tabletop_simulator - writes the sheets, the back and the deck JSON
+
+Usage: python tabletop_simulator.py toml/deck.toml --back-type biome_back --card-width 500
+"""
+
+import argparse
+import json
+import os
+import pathlib
+
+from PIL import Image
+
+from card_elements import get_default_card_dimensions
+from card_generation import CARD_BACK_TYPES, CardCreationFailedException
+from card_rendering import InvalidCardDataException, read_card_data, render_card
+from card_setups import load_card_data
+from deck import load_deck_manifest, parse_positive_integer
+from errors import UnhandledCardTypeException
+from file_utils import (
+    OUTPUT_DIRECTORY,
+    IncorrectImagePathException,
+    ensure_all_image_paths_exist,
+    write_file_atomically,
+)
+
+SHEET_COLUMNS = 10
+SHEET_ROWS = 7
+
+TABLETOP_SIMULATOR_DIRECTORY = f"{OUTPUT_DIRECTORY}/tabletop_simulator"
+
+CARD_TRANSFORM = {
+    "posX": 0,
+    "posY": 1,
+    "posZ": 0,
+    "rotX": 0,
+    "rotY": 180,
+    "rotZ": 180,
+    "scaleX": 1,
+    "scaleY": 1,
+    "scaleZ": 1,
+}
+
+
+def calculate_sheet_card_dimensions(card_width=None):
+    """Calculates the size of each card on the sheets
+
+    Parameters
+    ----------
+    card_width : int
+        The width of each card on the sheets. By default, the cards keep their size
+
+    Returns
+    -------
+    int, int
+        the width and height of each card on the sheets, keeping the aspect ratio
+    """
+    default_width, default_height = get_default_card_dimensions()
+
+    if card_width is None:
+        return default_width, default_height
+
+    if card_width < 1:
+        raise ValueError(f"The cards must be at least 1 pixel wide on the sheets, not {card_width}.")
+
+    return card_width, int(card_width * default_height / default_width)
+
+
+def fit_card_to_sheet(card, card_dimensions):
+    if card.size == card_dimensions:
+        return card
+
+    return card.resize(card_dimensions, Image.LANCZOS)
+
+
+def pack_cards_into_sheets(
+    cards, hidden_card, card_dimensions, columns=SHEET_COLUMNS, rows=SHEET_ROWS
+):
+    """Renders the fronts and packs them into sheets, keeping only one sheet in memory
+
+    Parameters
+    ----------
+    cards : iterable
+        The card data of every front, as accepted by 'read_card_data'
+    hidden_card : Image
+        The image for the last slot of every sheet, shown when a card is hidden
+    card_dimensions : tuple
+        The width and height of each card on the sheets
+    columns : int
+        How many cards fit in a row of a sheet
+    rows : int
+        How many rows a sheet has
+
+    Yields
+    ------
+    Image, list
+        each sheet, and the titles of the cards packed into it in order
+    """
+    card_width, card_height = card_dimensions
+    cards_per_sheet = columns * rows - 1
+
+    hidden_card = fit_card_to_sheet(hidden_card, card_dimensions)
+
+    def new_sheet():
+        sheet = Image.new("RGBA", (columns * card_width, rows * card_height))
+        sheet.paste(
+            hidden_card, ((columns - 1) * card_width, (rows - 1) * card_height)
+        )
+        return sheet
+
+    sheet = None
+    titles = []
+
+    for card_data in cards:
+        if sheet is None:
+            sheet = new_sheet()
+
+        title, image_paths, card_type = read_card_data(card_data)
+
+        ensure_all_image_paths_exist(image_paths)
+
+        # The composite goes straight from the renderer to the sheet
+        card = fit_card_to_sheet(
+            render_card(
+                {"title": title, "image_paths": image_paths, "card_type": card_type}
+            ),
+            card_dimensions,
+        )
+
+        slot = len(titles)
+        sheet.paste(card, ((slot % columns) * card_width, (slot // columns) * card_height))
+        titles.append(title)
+
+        if len(titles) == cards_per_sheet:
+            yield sheet, titles
+            sheet = None
+            titles = []
+
+    if sheet is not None:
+        yield sheet, titles
+
+
+def save_image_atomically(image, path):
+    # Tabletop Simulator never loads a sheet or a back that was only partly written
+    write_file_atomically(path, lambda image_file: image.save(image_file, format="PNG"))
+
+
+def get_image_url(path, url_prefix):
+    if url_prefix is None:
+        return pathlib.Path(path).resolve().as_uri()
+
+    return f"{url_prefix.rstrip('/')}/{os.path.basename(path)}"
+
+
+def export_deck_for_tabletop_simulator(
+    cards,
+    back_type,
+    output_directory=TABLETOP_SIMULATOR_DIRECTORY,
+    card_width=None,
+    url_prefix=None,
+    deck_name="Deck",
+):
+    """Writes the sheets, the back and the deck JSON that Tabletop Simulator loads
+
+    Parameters
+    ----------
+    cards : iterable
+        The card data of every front, as accepted by 'read_card_data'
+    back_type : str
+        The type of back shared by every card, such as 'biome_back'
+    output_directory : str
+        The directory where the sheets, the back and the deck JSON are written
+    card_width : int
+        The width of each card on the sheets. By default, the cards keep their size
+    url_prefix : str
+        The URL where the images will be hosted. By default, the deck JSON points
+        to the local files
+    deck_name : str
+        The name of the deck inside Tabletop Simulator
+
+    Returns
+    -------
+    str
+        the path of the deck JSON
+    """
+    if back_type not in CARD_BACK_TYPES:
+        raise UnhandledCardTypeException(
+            f"Failed to export the deck: '{back_type}' isn't a type of card back."
+        )
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    back_title, back_image_paths = load_card_data(back_type)
+    ensure_all_image_paths_exist(back_image_paths)
+    back = render_card(
+        {"title": back_title, "image_paths": back_image_paths, "card_type": back_type}
+    )
+
+    card_dimensions = calculate_sheet_card_dimensions(card_width)
+
+    back_path = f"{output_directory}/back.png"
+    save_image_atomically(fit_card_to_sheet(back, card_dimensions), back_path)
+
+    custom_deck = {}
+    contained_objects = []
+
+    for sheet_index, (sheet, titles) in enumerate(
+        pack_cards_into_sheets(cards, back, card_dimensions), start=1
+    ):
+        sheet_path = f"{output_directory}/sheet_{sheet_index}.png"
+        save_image_atomically(sheet, sheet_path)
+
+        custom_deck[str(sheet_index)] = {
+            "FaceURL": get_image_url(sheet_path, url_prefix),
+            "BackURL": get_image_url(back_path, url_prefix),
+            "NumWidth": SHEET_COLUMNS,
+            "NumHeight": SHEET_ROWS,
+            "BackIsHidden": True,
+            "UniqueBack": False,
+            "Type": 0,
+        }
+
+        for slot, title in enumerate(titles):
+            contained_objects.append(
+                {
+                    "Name": "Card",
+                    "Nickname": title,
+                    "CardID": sheet_index * 100 + slot,
+                    "Transform": CARD_TRANSFORM,
+                }
+            )
+
+    deck_object = {
+        "ObjectStates": [
+            {
+                "Name": "DeckCustom",
+                "Nickname": deck_name,
+                "Transform": CARD_TRANSFORM,
+                "DeckIDs": [card["CardID"] for card in contained_objects],
+                "CustomDeck": custom_deck,
+                "ContainedObjects": contained_objects,
+            }
+        ]
+    }
+
+    deck_path = f"{output_directory}/{deck_name}.json"
+
+    deck_content = json.dumps(deck_object, indent=2)
+
+    write_file_atomically(
+        deck_path, lambda deck_file: deck_file.write(deck_content.encode("utf-8"))
+    )
+
+    return deck_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tabletop Simulator Deck Exporter")
+    parser.add_argument("manifest", help="Path to the TOML manifest of the deck.")
+    parser.add_argument(
+        "--back-type",
+        default="biome_back",
+        help="The back shared by every card. The options are 'biome_back', 'exploration_zone_back'.",
+    )
+    parser.add_argument(
+        "--card-width",
+        type=parse_positive_integer,
+        help="The width in pixels of each card on the sheets. By default, the cards keep their size.",
+    )
+    parser.add_argument(
+        "--output-directory",
+        default=TABLETOP_SIMULATOR_DIRECTORY,
+        help="Where the sheets, the back and the deck JSON are written.",
+    )
+    parser.add_argument(
+        "--url-prefix",
+        help="The URL where the images will be hosted. By default, the deck JSON points to the local files.",
+    )
+    parser.add_argument("--deck-name", default="Deck", help="The name of the deck.")
+
+    args = parser.parse_args()
+
+    try:
+        # The backs get rendered once as the shared back, never as fronts
+        fronts = [
+            card_data
+            for card_data in load_deck_manifest(args.manifest)
+            if read_card_data(card_data)[2] not in CARD_BACK_TYPES
+        ]
+
+        deck_path = export_deck_for_tabletop_simulator(
+            fronts,
+            args.back_type,
+            args.output_directory,
+            args.card_width,
+            args.url_prefix,
+            args.deck_name,
+        )
+    except (
+        UnhandledCardTypeException,
+        IncorrectImagePathException,
+        InvalidCardDataException,
+        CardCreationFailedException,
+    ) as exception:
+        print(f"Failed to export the deck from main.\nError: {exception}")
+        return
+
+    print(f"Deck '{deck_path}' exported successfully.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules of the repository live at its root, and read their files relative to it
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+
+
+@pytest.fixture
+def asset_directory(tmp_path, monkeypatch):
+    """Runs the test from an empty directory with its own 'raw_images' and asset index"""
+    import assets  # pylint: disable=import-outside-toplevel
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(assets, "ASSET_INDEX", None)
+    monkeypatch.setattr(assets, "ASSET_INDEX_PATH", None)
+    assets.load_image_by_content_id.cache_clear()
+
+    (tmp_path / "raw_images").mkdir()
+
+    yield tmp_path / "raw_images"
+
+    assets.load_image_by_content_id.cache_clear()
+
+
+@pytest.fixture
+def render_directory(asset_directory):
+    """Runs the test from an empty directory that still has the fonts of the repository"""
+    render_directory = asset_directory.parent
+    (render_directory / "fonts").symlink_to(os.path.join(REPOSITORY_DIRECTORY, "fonts"))
+
+    return render_directory
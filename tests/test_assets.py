@@ -0,0 +1,67 @@
+import os
+
+from PIL import Image
+
+import assets
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+
+def save_image(path, color, mtime_ns):
+    Image.new("RGB", (8, 8), color).save(path)
+    # Some filesystems only keep the modification time to the second
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_copy_keeps_its_content_after_the_canonical_file_is_rewritten(asset_directory):
+    save_image(asset_directory / "a.png", RED, 1_000_000_000)
+    save_image(asset_directory / "b.png", RED, 1_000_000_000)
+
+    assert assets.load_image("raw_images/b.png").getpixel((0, 0)) == RED
+
+    save_image(asset_directory / "a.png", BLUE, 2_000_000_000)
+    assets.load_image_by_content_id.cache_clear()
+
+    assert assets.load_image("raw_images/b.png").getpixel((0, 0)) == RED
+    assert assets.load_image("raw_images/a.png").getpixel((0, 0)) == BLUE
+
+
+def test_persisted_index_is_revalidated_after_the_canonical_file_is_rewritten(
+    asset_directory, monkeypatch
+):
+    save_image(asset_directory / "a.png", RED, 1_000_000_000)
+    save_image(asset_directory / "b.png", RED, 1_000_000_000)
+
+    assets.persist_asset_index()
+    assets.get_asset_index()
+
+    # A new run loads the index that the previous one saved
+    save_image(asset_directory / "a.png", BLUE, 2_000_000_000)
+    monkeypatch.setattr(assets, "ASSET_INDEX", None)
+    assets.load_image_by_content_id.cache_clear()
+
+    assert assets.load_image("raw_images/b.png").getpixel((0, 0)) == RED
+
+
+def test_deleted_file_is_forgotten(asset_directory):
+    save_image(asset_directory / "a.png", RED, 1_000_000_000)
+    save_image(asset_directory / "b.png", RED, 1_000_000_000)
+
+    assets.persist_asset_index()
+    assets.get_asset_index()
+    os.remove(asset_directory / "a.png")
+
+    assert assets.load_image("raw_images/b.png").getpixel((0, 0)) == RED
+    assert os.path.normpath("raw_images/a.png") not in assets.get_asset_index().entries
+
+
+def test_render_api_keeps_the_index_in_memory(asset_directory):
+    save_image(asset_directory / "a.png", RED, 1_000_000_000)
+    save_image(asset_directory / "b.png", RED, 1_000_000_000)
+
+    assert assets.load_image("raw_images/b.png").getpixel((0, 0)) == RED
+
+    # Only the loaded file was hashed, and nothing was written
+    assert list(assets.get_asset_index().entries) == [os.path.normpath("raw_images/b.png")]
+    assert sorted(os.listdir(asset_directory.parent)) == ["raw_images"]
@@ -0,0 +1,37 @@
+import pytest
+from PIL import Image
+
+import batch_rendering
+from batch_rendering import render_batch
+
+CARDS = [
+    {"title": title, "card_type": "biome", "image_paths": {}}
+    for title in ("Forest", "Desert", "Swamp")
+]
+
+
+@pytest.mark.parametrize("encoder_threads", [0, -1])
+def test_batch_run_needs_an_encoder_thread(encoder_threads):
+    with pytest.raises(ValueError):
+        render_batch([], encoder_threads=encoder_threads)
+
+
+@pytest.mark.parametrize("memory_budget, memory_budget_disabled", [(50, True), (150, False)])
+def test_budget_below_the_starting_memory_is_disabled(
+    render_directory, monkeypatch, memory_budget, memory_budget_disabled
+):
+    monkeypatch.setattr(batch_rendering, "get_current_rss", lambda: 100)
+    monkeypatch.setattr(
+        batch_rendering,
+        "compose_card",
+        lambda title, image_paths, card_type: Image.new("RGBA", (8, 8)),
+    )
+
+    report = render_batch(CARDS, memory_budget=memory_budget, max_attempts=1)
+
+    assert len(report["written_paths"]) == len(CARDS)
+    assert report["memory_budget_disabled"] is memory_budget_disabled
+    assert report["starting_rss"] == 100
+
+    # A budget the run starts above would otherwise empty the caches before every card
+    assert report["cache_clears"] == 0
@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+
+import distributed_rendering
+from distributed_rendering import STOP_FILENAME, claim_unit, run_worker
+
+
+def start_worker(queue_directory):
+    worker = threading.Thread(
+        target=run_worker,
+        args=(str(queue_directory),),
+        kwargs={"worker_id": "test", "poll_interval": 0.01},
+        daemon=True,
+    )
+    worker.start()
+
+    return worker
+
+
+def write_stop(queue_directory, mtime_ns):
+    stop_path = os.path.join(queue_directory, STOP_FILENAME)
+
+    with open(stop_path, "w", encoding="utf-8"):
+        pass
+
+    os.utime(stop_path, ns=(mtime_ns, mtime_ns))
+
+
+def test_claim_unit_on_a_missing_queue_finds_nothing(tmp_path):
+    assert claim_unit(str(tmp_path / "none"), "test") is None
+
+
+def test_worker_waits_for_a_queue_that_does_not_exist_yet(tmp_path):
+    queue_directory = tmp_path / "queue"
+    worker = start_worker(queue_directory)
+
+    time.sleep(0.1)
+    assert worker.is_alive()
+
+    queue_directory.mkdir()
+    write_stop(queue_directory, 2_000_000_000)
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+
+
+def test_worker_ignores_the_stop_of_a_previous_run(tmp_path):
+    write_stop(tmp_path, 1_000_000_000)
+    worker = start_worker(tmp_path)
+
+    time.sleep(0.1)
+    assert worker.is_alive()
+
+    # The coordinator of the new run removes the old stop when it shards the deck
+    distributed_rendering.shard_deck([], str(tmp_path))
+    write_stop(tmp_path, 2_000_000_000)
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
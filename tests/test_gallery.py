@@ -0,0 +1,73 @@
+import os
+
+from PIL import Image
+
+import batch_rendering
+from gallery import Gallery
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+CARDS = [
+    {"title": title, "card_type": "biome", "image_paths": {}}
+    for title in ("Forest", "Desert", "Swamp")
+]
+
+
+def render_gallery(gallery_directory, monkeypatch, color):
+    monkeypatch.setattr(
+        batch_rendering,
+        "compose_card",
+        lambda title, image_paths, card_type: Image.new("RGBA", (40, 40), color),
+    )
+    gallery = Gallery(str(gallery_directory), columns=2, rows=1, thumbnail_size=(10, 10))
+    result = batch_rendering.render_batch(CARDS, gallery=gallery, max_attempts=1)
+    gallery.close()
+
+    return gallery, result
+
+
+def test_gallery_is_redrawn_when_the_rendered_card_changes(render_directory, monkeypatch):
+    gallery_directory = render_directory / "gallery"
+
+    render_gallery(gallery_directory, monkeypatch, RED)
+    gallery, _ = render_gallery(gallery_directory, monkeypatch, RED)
+
+    assert gallery.created_thumbnails == 0
+    assert gallery.redrawn_pages == 0
+
+    # The inputs of the cards are the same, but the renderer draws them differently
+    gallery, _ = render_gallery(gallery_directory, monkeypatch, BLUE)
+
+    assert gallery.created_thumbnails == 1
+    assert gallery.redrawn_pages == 2
+
+    sheet = Image.open(gallery_directory / gallery.pages[0]["sheet"]).convert("RGB")
+    thumbnail_colors = {color for _, color in sheet.getcolors()}
+
+    assert BLUE in thumbnail_colors
+    assert RED not in thumbnail_colors
+
+
+def test_gallery_leaves_out_the_cards_that_failed_to_be_written(render_directory, monkeypatch):
+    save_card_as_png = batch_rendering.save_card_as_png
+
+    def fail_to_save_desert(title, card, card_type, output_sink=None):
+        if title == "Desert":
+            raise OSError("The disk is full.")
+
+        return save_card_as_png(title, card, card_type, output_sink)
+
+    monkeypatch.setattr(batch_rendering, "save_card_as_png", fail_to_save_desert)
+
+    gallery, result = render_gallery(render_directory / "gallery", monkeypatch, RED)
+
+    assert [failed_card["title"] for failed_card in result["failed_cards"]] == ["Desert"]
+    assert [
+        page_card["title"] for page in gallery.pages for page_card in page["cards"]
+    ] == ["Forest", "Swamp"]
+    assert all(
+        os.path.isfile(page_card["card_path"])
+        for page in gallery.pages
+        for page_card in page["cards"]
+    )
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from PIL import Image
+
+import batch_rendering
+from manifest_streams import ManifestStream, open_manifest_stream
+
+
+def write_manifest(path, rows):
+    path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+    return str(path)
+
+
+def make_row(title, background_image_path):
+    return json.dumps(
+        {
+            "card_type": "biome",
+            "title": title,
+            "image_paths": {"background_image_path": background_image_path},
+        }
+    )
+
+
+def test_manifest_stream_needs_its_rows_implemented(tmp_path):
+    with pytest.raises(TypeError):
+        ManifestStream(str(tmp_path / "cards.jsonl"))  # pylint: disable=abstract-class-instantiated
+
+
+def test_failed_cards_are_reported_by_their_line_in_the_manifest(render_directory, monkeypatch):
+    Image.new("RGB", (8, 8)).save(render_directory / "raw_images" / "background.png")
+    manifest_path = write_manifest(
+        render_directory / "cards.jsonl",
+        [
+            "not json",
+            make_row("Desert", "raw_images/missing.png"),
+            make_row("Forest", "raw_images/background.png"),
+            make_row("Swamp", "raw_images/background.png"),
+        ],
+    )
+
+    def fail_to_compose_swamp(title, image_paths, card_type):
+        if title == "Swamp":
+            raise ValueError("The frame is missing.")
+
+        return Image.new("RGBA", (8, 8))
+
+    monkeypatch.setattr(batch_rendering, "compose_card", fail_to_compose_swamp)
+    manifest_stream = open_manifest_stream(manifest_path)
+
+    report = batch_rendering.render_batch(manifest_stream, max_attempts=1)
+
+    assert [invalid_row["line"] for invalid_row in manifest_stream.invalid_rows] == [1, 2]
+    assert len(report["failed_cards"]) == 1
+    assert report["failed_cards"][0]["index"] == 1
+    assert report["failed_cards"][0]["line_number"] == 4
+    assert "on line 4 of the manifest" in report["failed_cards"][0]["error"]
+
+
+def test_toml_cards_keep_the_line_of_their_header(tmp_path):
+    manifest_path = tmp_path / "deck.toml"
+    manifest_path.write_text(
+        '# A deck\n\n[[cards]]\ncard_type = "biome"\n\n[[cards]]\ncard_type = "encounter"\n',
+        encoding="utf-8",
+    )
+
+    stream = open_manifest_stream(str(manifest_path))
+
+    assert [line_number for line_number, _ in stream.read_rows()] == [3, 6]
+
+
+@pytest.mark.parametrize(
+    "image_paths",
+    [
+        {"background_image_path": None},
+        {"background_image_path": 3},
+        {
+            "background_image_path": "raw_images/background.png",
+            "struggle_icon_paths": "raw_images/background.png",
+        },
+        {"background_image_path": "raw_images/background.png", "struggle_icon_paths": [None]},
+        {"background_image_path": ["raw_images/background.png"]},
+    ],
+)
+def test_rows_with_paths_of_the_wrong_type_are_skipped(render_directory, image_paths):
+    Image.new("RGB", (8, 8)).save(render_directory / "raw_images" / "background.png")
+    manifest_path = write_manifest(
+        render_directory / "cards.jsonl",
+        [
+            json.dumps({"card_type": "biome", "title": "Desert", "image_paths": image_paths}),
+            make_row("Forest", "raw_images/background.png"),
+        ],
+    )
+
+    manifest_stream = open_manifest_stream(manifest_path)
+
+    assert [card_data["title"] for card_data in manifest_stream] == ["Forest"]
+    assert [invalid_row["line"] for invalid_row in manifest_stream.invalid_rows] == [1]
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from metrics import (
+    QUEUE_DEPTH_BUCKETS,
+    MetricsRegistry,
+    MismatchedHistogramBucketsException,
+)
+
+
+def test_registries_merge_their_histograms():
+    registry = MetricsRegistry()
+    registry.observe("queue_depth", {"queue": "render"}, 3, QUEUE_DEPTH_BUCKETS)
+
+    worker_registry = MetricsRegistry()
+    worker_registry.observe("queue_depth", {"queue": "render"}, 40, QUEUE_DEPTH_BUCKETS)
+
+    # The metrics of the worker processes come back through JSON
+    registry.merge(json.loads(json.dumps(worker_registry.to_dict())))
+
+    histogram = registry.to_dict()["histograms"][0]
+    assert histogram["count"] == 2
+    assert histogram["bucket_counts"] == [0, 0, 0, 1, 0, 0, 0, 1]
+
+
+def test_histograms_with_other_buckets_are_not_merged():
+    registry = MetricsRegistry()
+    registry.observe("queue_depth", {"queue": "render"}, 3, QUEUE_DEPTH_BUCKETS)
+
+    worker_registry = MetricsRegistry()
+    worker_registry.observe("queue_depth", {"queue": "render"}, 3, (1, 10))
+
+    with pytest.raises(MismatchedHistogramBucketsException):
+        registry.merge(worker_registry.to_dict())
@@ -0,0 +1,73 @@
+import zipfile
+
+import pytest
+from PIL import Image
+
+import output_sinks
+from output_sinks import (
+    ArchiveOutputSink,
+    DirectoryOutputSink,
+    DuplicateArchiveEntryException,
+    ZipOutputSink,
+)
+
+
+@pytest.fixture
+def card():
+    return Image.new("RGBA", (8, 8), (255, 0, 0, 255))
+
+
+def test_archive_output_sink_needs_its_entries_implemented(tmp_path):
+    with pytest.raises(TypeError):
+        ArchiveOutputSink(str(tmp_path / "deck.zip"))  # pylint: disable=abstract-class-instantiated
+
+
+@pytest.mark.parametrize(
+    "open_sink",
+    [
+        lambda tmp_path: DirectoryOutputSink(),
+        lambda tmp_path: ZipOutputSink(str(tmp_path / "deck.zip")),
+    ],
+)
+def test_sinks_refuse_to_write_the_same_card_twice(tmp_path, monkeypatch, card, open_sink):
+    monkeypatch.chdir(tmp_path)
+
+    with open_sink(tmp_path) as output_sink:
+        output_sink.write_card("Forest", card, "biome")
+
+        with pytest.raises(DuplicateArchiveEntryException):
+            output_sink.write_card("Forest", card, "biome")
+
+        # The backs have no title, and each card type has its own directory
+        output_sink.write_card(None, card, "biome_back")
+        output_sink.write_card(None, card, "exploration_zone_back")
+
+
+def test_directory_sink_lets_a_failed_card_be_written_again(tmp_path, monkeypatch, card):
+    monkeypatch.chdir(tmp_path)
+    save_card_as_png = output_sinks.save_card_as_png
+    attempts = []
+
+    def fail_once(title, card, card_type):
+        attempts.append(title)
+
+        if len(attempts) == 1:
+            raise OSError("The disk is full.")
+
+        return save_card_as_png(title, card, card_type)
+
+    monkeypatch.setattr(output_sinks, "save_card_as_png", fail_once)
+    output_sink = DirectoryOutputSink()
+
+    with pytest.raises(OSError):
+        output_sink.write_card("Forest", card, "biome")
+
+    assert output_sink.write_card("Forest", card, "biome") == "output/biomes/Forest_card.png"
+
+
+def test_zip_sink_lists_every_card_in_its_manifest(tmp_path, card):
+    with ZipOutputSink(str(tmp_path / "deck.zip")) as output_sink:
+        output_sink.write_card("Forest", card, "biome")
+
+    with zipfile.ZipFile(tmp_path / "deck.zip") as archive:
+        assert archive.namelist() == ["biomes/Forest_card.png", output_sinks.MANIFEST_FILENAME]
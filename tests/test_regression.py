@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from conftest import REPOSITORY_DIRECTORY
+from deck import load_deck_manifest
+from regression import (
+    FAILED,
+    GOLDEN_INDEX_FILENAME,
+    MISSING_GOLDEN,
+    STORED,
+    check_goldens,
+    update_goldens,
+)
+
+
+def test_update_reports_the_cards_that_fail_to_render(tmp_path):
+    golden_directory = tmp_path / "goldens"
+    golden_directory.mkdir()
+    (golden_directory / GOLDEN_INDEX_FILENAME).write_text(
+        json.dumps({"biomes/Forest_card.png": {"pixel_digest": "", "perceptual_hash": 0}}),
+        encoding="utf-8",
+    )
+    cards = [
+        {
+            "card_type": "biome",
+            "title": "Forest",
+            "image_paths": {"background_image_path": str(tmp_path / "missing.png")},
+        }
+    ]
+
+    results = update_goldens(cards, str(golden_directory), workers=1)
+
+    assert [result["status"] for result in results] == [FAILED]
+    assert "missing.png" in results[0]["message"]
+
+    # The card keeps its previous golden
+    golden_index = json.loads((golden_directory / GOLDEN_INDEX_FILENAME).read_text(encoding="utf-8"))
+    assert "biomes/Forest_card.png" in golden_index
+
+
+@pytest.fixture
+def reference_deck(monkeypatch):
+    monkeypatch.chdir(REPOSITORY_DIRECTORY)
+
+    return load_deck_manifest("toml/deck.toml")
+
+
+def test_untitled_backs_get_their_own_goldens(reference_deck, tmp_path):
+    golden_directory = tmp_path / "goldens"
+    backs = [card_data for card_data in reference_deck if "title" not in card_data]
+
+    results = update_goldens(backs + backs[:1], str(golden_directory), workers=1)
+
+    assert [result["golden_name"] for result in results] == [
+        "biomes/biome_back_card.png",
+        "exploration_zones/exploration_zone_back_card.png",
+        "biomes/biome_back_card.png",
+    ]
+    assert [result["status"] for result in results] == [STORED, STORED, FAILED]
+
+
+def test_check_reports_a_golden_whose_image_is_missing(reference_deck, tmp_path):
+    golden_directory = tmp_path / "goldens"
+    cards = reference_deck[:2]
+    update_goldens(cards, str(golden_directory), workers=1)
+
+    os.remove(golden_directory / "biomes" / "Forest_card.png")
+    golden_index_path = golden_directory / GOLDEN_INDEX_FILENAME
+    golden_index = json.loads(golden_index_path.read_text(encoding="utf-8"))
+
+    # A different digest makes the check open the missing golden
+    golden_index["biomes/Forest_card.png"]["pixel_digest"] = ""
+    del golden_index["biomes/biome_back_card.png"]["perceptual_hash"]
+    golden_index_path.write_text(json.dumps(golden_index), encoding="utf-8")
+
+    results = check_goldens(cards, str(golden_directory), str(tmp_path / "report"), workers=1)
+
+    assert [result["status"] for result in results] == [MISSING_GOLDEN, MISSING_GOLDEN]
+    assert os.path.isfile(tmp_path / "report" / "index.html")
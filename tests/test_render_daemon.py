@@ -0,0 +1,125 @@
+import http.client
+import io
+import json
+import threading
+
+import pytest
+from PIL import Image, ImageChops
+
+from card_rendering import render_card
+from conftest import REPOSITORY_DIRECTORY
+from deck import load_deck_manifest
+from file_utils import InvalidCardTitleException, get_card_filename
+from render_daemon import InvalidRenderRequestException, RenderDaemon, parse_render_request
+
+
+def make_body(**render_request):
+    return json.dumps({"card_type": "biome", "image_paths": {}, **render_request}).encode("utf-8")
+
+
+@pytest.mark.parametrize("title", ["../../x", "a/b", "a\\b", "..", 3])
+def test_render_request_with_an_unsafe_title_is_rejected(title):
+    with pytest.raises(InvalidRenderRequestException):
+        parse_render_request(make_body(title=title, output="path"))
+
+
+@pytest.mark.parametrize("card_type", [["biome"], {"biome": 1}, 1])
+def test_render_request_with_a_card_type_that_isnt_a_string_is_rejected(card_type):
+    with pytest.raises(InvalidRenderRequestException):
+        parse_render_request(make_body(card_type=card_type))
+
+
+@pytest.mark.parametrize("card_type", ["nope", "encounter_back"])
+def test_render_request_with_an_unhandled_card_type_is_rejected(card_type):
+    with pytest.raises(InvalidRenderRequestException):
+        parse_render_request(make_body(card_type=card_type))
+
+
+@pytest.mark.parametrize(
+    "image_paths",
+    [{"background_image_path": None}, {"background_image_path": 3}, {"struggle_icon_paths": [None]}],
+)
+def test_render_request_with_image_paths_that_arent_strings_is_rejected(image_paths):
+    with pytest.raises(InvalidRenderRequestException):
+        parse_render_request(make_body(image_paths=image_paths))
+
+
+def test_card_filename_stays_inside_the_output_directory():
+    assert get_card_filename("Beast-Trees", "encounter") == "output/encounters/Beast-Trees_card.png"
+
+    with pytest.raises(InvalidCardTitleException):
+        get_card_filename("../../x", "biome")
+
+
+@pytest.fixture
+def render_daemon(monkeypatch):
+    monkeypatch.chdir(REPOSITORY_DIRECTORY)
+
+    daemon = RenderDaemon(("127.0.0.1", 0), 1, 1, backend="thread")
+    server_thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    server_thread.start()
+
+    yield daemon
+
+    daemon.shutdown()
+    daemon.server_close()
+    daemon.executor.shutdown()
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-1"])
+def test_render_request_with_an_invalid_content_length_gets_a_400(render_daemon, content_length):
+    connection = http.client.HTTPConnection(*render_daemon.server_address, timeout=10)
+    connection.putrequest("POST", "/render")
+    connection.putheader("Content-Length", content_length)
+    connection.endheaders()
+
+    response = connection.getresponse()
+
+    assert response.status == 400
+    assert "Content-Length" in json.loads(response.read())["error"]
+    connection.close()
+
+
+def test_render_request_with_an_unhashable_card_type_gets_a_400(render_daemon):
+    connection = http.client.HTTPConnection(*render_daemon.server_address, timeout=10)
+    connection.request("POST", "/render", make_body(card_type=["biome"]))
+
+    assert connection.getresponse().status == 400
+    connection.close()
+
+
+@pytest.mark.parametrize(
+    "render_request",
+    [{"card_type": "nope"}, {"image_paths": {"background_image_path": None}}],
+)
+def test_invalid_render_requests_get_a_400(render_daemon, render_request):
+    connection = http.client.HTTPConnection(*render_daemon.server_address, timeout=10)
+    connection.request("POST", "/render", make_body(**render_request))
+
+    assert connection.getresponse().status == 400
+    connection.close()
+
+
+def test_thread_backend_renders_the_same_card_as_render_card(render_daemon):
+    card_data = load_deck_manifest("toml/deck.toml")[0]
+
+    connection = http.client.HTTPConnection(*render_daemon.server_address, timeout=60)
+    connection.request("POST", "/render", json.dumps(card_data).encode("utf-8"))
+    response = connection.getresponse()
+
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "image/png"
+
+    card = Image.open(io.BytesIO(response.read()))
+    reference_card = render_card(card_data)
+
+    assert card.size == reference_card.size
+    assert ImageChops.difference(card.convert("RGBA"), reference_card.convert("RGBA")).getbbox() is None
+
+    connection.request("GET", "/stats")
+    stats = json.loads(connection.getresponse().read())
+
+    assert stats["jobs_completed"] == 1
+    assert stats["jobs_failed"] == 0
+    assert list(stats["latency_ms"]) == [card_data["card_type"]]
+    connection.close()
@@ -0,0 +1,61 @@
+from PIL import Image
+
+import batch_rendering
+from render_journal import RenderJournal
+
+CARDS = [
+    {"title": title, "card_type": "biome", "image_paths": {}}
+    for title in ("Forest", "Desert", "Swamp")
+]
+
+
+def render_with_journal(journal_path, monkeypatch, resume):
+    composed_titles = []
+
+    def compose_card(title, image_paths, card_type):
+        composed_titles.append(title)
+
+        return Image.new("RGBA", (8, 8), (255, 0, 0, 255))
+
+    monkeypatch.setattr(batch_rendering, "compose_card", compose_card)
+    journal = RenderJournal(str(journal_path), resume=resume)
+
+    try:
+        report = batch_rendering.render_batch(CARDS, journal=journal, max_attempts=1)
+    finally:
+        journal.close()
+
+    return report, composed_titles
+
+
+def test_resumed_run_skips_the_cards_already_rendered(render_directory, monkeypatch):
+    journal_path = render_directory / "output" / "render_journal.jsonl"
+
+    _, composed_titles = render_with_journal(journal_path, monkeypatch, resume=False)
+    assert composed_titles == ["Forest", "Desert", "Swamp"]
+
+    report, composed_titles = render_with_journal(journal_path, monkeypatch, resume=True)
+
+    assert composed_titles == []
+    assert report["skipped_cards"] == 3
+    assert report["written_paths"] == []
+
+
+def test_resumed_run_redoes_the_cards_whose_output_changed(render_directory, monkeypatch):
+    journal_path = render_directory / "output" / "render_journal.jsonl"
+
+    report, _ = render_with_journal(journal_path, monkeypatch, resume=False)
+
+    # The card was overwritten since it was recorded, so it's no longer what got rendered
+    desert_path = next(path for path in report["written_paths"] if "Desert" in path)
+    Image.new("RGBA", (4, 4)).save(desert_path)
+
+    report, composed_titles = render_with_journal(journal_path, monkeypatch, resume=True)
+
+    assert composed_titles == ["Desert"]
+    assert report["skipped_cards"] == 2
+
+    # Without resuming, the journal starts over and every card is rendered again
+    _, composed_titles = render_with_journal(journal_path, monkeypatch, resume=False)
+
+    assert composed_titles == ["Forest", "Desert", "Swamp"]
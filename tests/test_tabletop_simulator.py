@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from PIL import Image
+
+from tabletop_simulator import (
+    SHEET_COLUMNS,
+    SHEET_ROWS,
+    calculate_sheet_card_dimensions,
+    export_deck_for_tabletop_simulator,
+    pack_cards_into_sheets,
+)
+
+CARD_DIMENSIONS = (2, 3)
+HIDDEN_COLOR = (255, 255, 255, 255)
+
+
+def get_card_color(index):
+    return (index, 0, 0, 255)
+
+
+def make_cards(count):
+    return [
+        {"card_type": "biome", "title": str(index), "image_paths": {}} for index in range(count)
+    ]
+
+
+@pytest.fixture
+def fake_render_card(monkeypatch):
+    """Renders each card as a plain image whose red channel is its title"""
+
+    def render_card(card_data):
+        title = card_data["title"]
+        color = HIDDEN_COLOR if title is None else get_card_color(int(title))
+
+        return Image.new("RGBA", CARD_DIMENSIONS, color)
+
+    monkeypatch.setattr("tabletop_simulator.render_card", render_card)
+    monkeypatch.setattr("tabletop_simulator.load_card_data", lambda back_type: (None, {}))
+
+
+def get_slot_color(sheet, slot, columns):
+    card_width, card_height = CARD_DIMENSIONS
+
+    return sheet.getpixel(((slot % columns) * card_width, (slot // columns) * card_height))
+
+
+def test_cards_fill_the_slots_row_by_row_and_leave_the_last_one_to_the_back(fake_render_card):
+    columns, rows = 3, 2
+    hidden_card = Image.new("RGBA", CARD_DIMENSIONS, HIDDEN_COLOR)
+
+    sheets = list(
+        pack_cards_into_sheets(make_cards(7), hidden_card, CARD_DIMENSIONS, columns, rows)
+    )
+
+    assert [titles for _, titles in sheets] == [["0", "1", "2", "3", "4"], ["5", "6"]]
+
+    for sheet, titles in sheets:
+        for slot, title in enumerate(titles):
+            assert get_slot_color(sheet, slot, columns) == get_card_color(int(title))
+
+        assert get_slot_color(sheet, columns * rows - 1, columns) == HIDDEN_COLOR
+
+
+def test_deck_json_numbers_the_cards_by_sheet_and_slot(fake_render_card, tmp_path):
+    cards_per_sheet = SHEET_COLUMNS * SHEET_ROWS - 1
+
+    deck_path = export_deck_for_tabletop_simulator(
+        make_cards(cards_per_sheet + 2), "biome_back", str(tmp_path), card_width=CARD_DIMENSIONS[0]
+    )
+
+    with open(deck_path, encoding="utf-8") as deck_file:
+        deck_object = json.load(deck_file)["ObjectStates"][0]
+
+    card_ids = [card["CardID"] for card in deck_object["ContainedObjects"]]
+
+    assert card_ids == [100 + slot for slot in range(cards_per_sheet)] + [200, 201]
+    assert deck_object["DeckIDs"] == card_ids
+    assert sorted(deck_object["CustomDeck"]) == ["1", "2"]
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith(".")] == []
+
+
+def test_cards_must_be_at_least_one_pixel_wide():
+    assert calculate_sheet_card_dimensions(None) == (750, 1039)
+
+    with pytest.raises(ValueError):
+        calculate_sheet_card_dimensions(0)
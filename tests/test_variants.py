@@ -0,0 +1,58 @@
+import pytest
+from PIL import ImageChops
+
+from card_generation import compose_card
+from card_rendering import read_card_data
+from conftest import REPOSITORY_DIRECTORY
+from deck import load_deck_manifest
+from variants import InvalidVariantException, compose_variants, create_variants
+
+
+@pytest.fixture
+def variant_card(monkeypatch):
+    monkeypatch.chdir(REPOSITORY_DIRECTORY)
+
+    card_data = load_deck_manifest("toml/variants.toml")[0]
+    title, image_paths, card_type = read_card_data(card_data)
+
+    return title, image_paths, card_type, card_data["variants"]
+
+
+def test_variants_match_the_cards_composed_on_their_own(variant_card):
+    title, image_paths, card_type, variants = variant_card
+
+    for variant, card in compose_variants(title, image_paths, card_type, variants[:3]):
+        reference_card = compose_card(variant.get("title", title), image_paths, card_type)
+
+        assert card.mode == reference_card.mode
+        assert ImageChops.difference(card, reference_card).getbbox() is None
+
+
+@pytest.mark.parametrize(
+    "variant",
+    [{"name": "../x"}, {"name": "a/b"}, {"name": "a\\b"}, {"name": 3}, {"name": "fr", "title": "a/b"}],
+)
+def test_variant_that_cant_get_a_file_of_its_own_is_rejected(variant_card, variant, monkeypatch):
+    title, image_paths, card_type, _ = variant_card
+
+    # The variants are rejected before any of them is composed or saved
+    def fail_to_compose(*_):
+        pytest.fail("A variant got composed before the invalid one was rejected.")
+
+    monkeypatch.setattr("variants.draw_background_layers", fail_to_compose)
+
+    with pytest.raises(InvalidVariantException):
+        create_variants(title, image_paths, card_type, [{"name": "en"}, variant])
+
+
+def test_variants_with_the_same_title_and_name_are_rejected(variant_card):
+    title, image_paths, card_type, _ = variant_card
+    card_variants = [{"name": "fr", "title": "Arbres-Bêtes"}, {"name": "fr", "title": "Arbres-Bêtes"}]
+
+    with pytest.raises(InvalidVariantException):
+        list(compose_variants(title, image_paths, card_type, card_variants))
+
+    # The same name is fine under another title
+    card_variants[1]["title"] = "Bestienbäume"
+
+    assert len(list(compose_variants(title, image_paths, card_type, card_variants))) == 2
@@ -0,0 +1,361 @@
+"""Variants
+
+This script renders every variant of a card, such as its translations and its
+foil and non-foil printings, in a single call. Instead of composing each variant
+from the background upward, the layers the variants share get composed once and
+the card branches only where the variants differ:
+
+    * the background, the card image and its frame are composed once
+    * the title and its banner are drawn once per distinct title
+    * the finish overlay, if any, is drawn on a copy for each variant
+
+When none of the titles comes close to the icons, the icons are drawn on the
+shared layers as well, since drawing them before or after the title gives the
+same pixels. Otherwise, they're drawn after each title, as 'compose_card' does.
+
+A variant is a dictionary with a 'name', which becomes part of the filename, and
+optionally a 'title' (the title of the card by default) and a 'finish_overlay_path'
+to an RGBA image blended over the whole card, such as a foil pattern:
+
+    {"name": "fr-foil", "title": "Arbres-Bêtes", "finish_overlay_path": "raw_images/finishes/foil.png"}
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * compose_variants - composes every variant of a card, sharing the common layers
+    * create_variants - composes and saves every variant of a card
+
+Usage: python variants.py toml/variants.toml
+"""
+
+import argparse
+from functools import lru_cache
+
+from PIL import Image
+
+from assets import get_content_id, load_image_once
+from card_elements import MissingTitleYCoordinateError, get_default_card_dimensions
+from card_generation import (
+    DEFAULT_COMPOSITING_BACKEND,
+    CardCreationFailedException,
+    SavingCardFailedError,
+    copy_card,
+    draw_background_layers,
+    draw_icon_layers,
+    draw_title_layer,
+    finish_card,
+    get_card_type_data,
+)
+from card_rendering import InvalidCardDataException, read_card_data
+from deck import load_deck_manifest
+from file_utils import (
+    IncorrectImagePathException,
+    InvalidCardTitleException,
+    UnhandledCardTypeException,
+    check_file_exists,
+    ensure_all_image_paths_exist,
+    ensure_title_is_a_filename,
+    save_card_as_png,
+)
+from image_utils import SHADOW_PADDING, convert_image_to_rgba
+from layout import boxes_overlap, layout_card
+
+TITLE_ELEMENTS = ("title_banner", "title")
+
+# How far the shadows of the title and of the icons can reach past their boxes
+LAYER_OVERLAP_MARGIN = SHADOW_PADDING + 4
+
+FINISH_OVERLAY_CACHE_SIZE = 8
+
+
+class InvalidVariantException(Exception):
+    pass
+
+
+def get_variant_title(title, variant):
+    return variant.get("title", title)
+
+
+def get_variant_filename_title(title, variant):
+    """Gets the title used to name the file of a variant, so the variants don't overwrite each other"""
+    return f"{get_variant_title(title, variant)}_{variant['name']}"
+
+
+def expand_box(box, margin):
+    return box._replace(
+        left=box.left - margin,
+        top=box.top - margin,
+        right=box.right + margin,
+        bottom=box.bottom + margin,
+    )
+
+
+def can_draw_icons_before_titles(titles, image_paths, card_type):
+    """Checks whether the icons can be drawn before the titles without changing a
+    single pixel, which is the case if none of the titles come close to an icon
+
+    Parameters
+    ----------
+    titles : iterable
+        Every distinct title of the variants
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+
+    Returns
+    -------
+    bool
+        True if the icons can be drawn on the layers shared by every variant
+    """
+    for title in titles:
+        elements = layout_card(title, image_paths, card_type).elements
+
+        title_boxes = [element for element in elements if element.name in TITLE_ELEMENTS]
+
+        if not title_boxes:
+            continue
+
+        # The elements are in drawing order, and the icons come after the title
+        icon_boxes = elements[elements.index(title_boxes[-1]) + 1 :]
+
+        for title_box in title_boxes:
+            for icon_box in icon_boxes:
+                if boxes_overlap(
+                    expand_box(title_box, LAYER_OVERLAP_MARGIN),
+                    expand_box(icon_box, LAYER_OVERLAP_MARGIN),
+                ):
+                    return False
+
+    return True
+
+
+@lru_cache(maxsize=FINISH_OVERLAY_CACHE_SIZE)
+def load_finish_overlay_by_content_id(content_id, width, height):
+    finish_overlay = convert_image_to_rgba(load_image_once(content_id))
+
+    if finish_overlay.size != (width, height):
+        finish_overlay = finish_overlay.resize((width, height), Image.LANCZOS)
+
+    return finish_overlay
+
+
+def draw_finish_overlay(finish_overlay_path, card):
+    canvas_width, canvas_height = get_default_card_dimensions()
+
+    finish_overlay = load_finish_overlay_by_content_id(
+        get_content_id(finish_overlay_path), canvas_width, canvas_height
+    )
+
+    card.paste(finish_overlay, (0, 0), finish_overlay)
+
+
+def group_variants_by_title(title, variants):
+    """Groups the variants of a card by their title, after making sure each of them
+    gets a file of its own, before any of them is composed
+
+    Parameters
+    ----------
+    title : str
+        The title of the card, used by the variants that don't have their own
+    variants : list
+        The variants of the card, as accepted by 'compose_variants'
+
+    Returns
+    -------
+    dict
+        the variants of each title, in the order their titles first appear
+    """
+    variants_by_title = {}
+    filename_titles = set()
+
+    for variant in variants:
+        if "name" not in variant:
+            raise InvalidVariantException(
+                f"A variant of the card '{title}' doesn't have a 'name': {variant}"
+            )
+
+        if not isinstance(variant["name"], str):
+            raise InvalidVariantException(
+                f"The name of a variant of the card '{title}' must be a string, not '{variant['name']}'."
+            )
+
+        if not isinstance(variant.get("title", ""), str):
+            raise InvalidVariantException(
+                f"The title of the variant '{variant['name']}' must be a string, not '{variant['title']}'."
+            )
+
+        filename_title = get_variant_filename_title(title, variant)
+
+        # The name and the title of the variant both end up in its filename
+        try:
+            ensure_title_is_a_filename(filename_title)
+        except InvalidCardTitleException as exception:
+            raise InvalidVariantException(
+                f"The variant '{variant['name']}' of the card '{title}' can't be saved to a file of its own.\nError: {exception}"
+            )
+
+        if filename_title in filename_titles:
+            raise InvalidVariantException(
+                f"Several variants of the card '{title}' have the title '{get_variant_title(title, variant)}' and the name '{variant['name']}', so they would overwrite each other."
+            )
+
+        filename_titles.add(filename_title)
+
+        if "finish_overlay_path" in variant and not check_file_exists(
+            variant["finish_overlay_path"]
+        ):
+            raise InvalidVariantException(
+                f"The finish overlay of the variant '{variant['name']}' does not exist. Path: {variant['finish_overlay_path']}"
+            )
+
+        variants_by_title.setdefault(get_variant_title(title, variant), []).append(variant)
+
+    return variants_by_title
+
+
+def compose_variants(
+    title,
+    image_paths,
+    card_type,
+    variants,
+    compositing_backend=DEFAULT_COMPOSITING_BACKEND,
+):
+    """Composes every variant of a card, composing the layers they share only once
+
+    Parameters
+    ----------
+    title : str
+        The title of the card, used by the variants that don't have their own
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+    variants : list
+        The variants of the card, as dictionaries with a 'name', and optionally a
+        'title' and a 'finish_overlay_path'
+    compositing_backend : str
+        Either 'pillow' or 'numpy', as in 'compose_card'
+
+    Yields
+    ------
+    dict, Image
+        each variant along with its finished card, in the order of the titles
+    """
+    variants_by_title = group_variants_by_title(title, variants)
+
+    if not variants_by_title:
+        return
+
+    card_type_data = get_card_type_data(card_type)
+
+    shared_card, shared_draw = draw_background_layers(image_paths, compositing_backend)
+
+    icons_are_shared = can_draw_icons_before_titles(
+        variants_by_title.keys(), image_paths, card_type
+    )
+
+    if icons_are_shared:
+        draw_icon_layers(image_paths, card_type_data, shared_card)
+
+    last_title = list(variants_by_title)[-1]
+
+    for variant_title, title_variants in variants_by_title.items():
+        # The last title can draw on the shared layers directly
+        if variant_title == last_title:
+            titled_card, titled_draw = shared_card, shared_draw
+        else:
+            titled_card, titled_draw = copy_card(shared_card, compositing_backend)
+
+        draw_title_layer(
+            variant_title, image_paths, card_type, card_type_data, titled_card, titled_draw
+        )
+
+        if not icons_are_shared:
+            draw_icon_layers(image_paths, card_type_data, titled_card)
+
+        for variant in title_variants:
+            variant_card = titled_card
+
+            if "finish_overlay_path" in variant:
+                variant_card, _ = copy_card(titled_card, compositing_backend)
+                draw_finish_overlay(variant["finish_overlay_path"], variant_card)
+            elif variant is not title_variants[-1]:
+                # Finalizing modifies the card, which the next variants still need
+                variant_card, _ = copy_card(titled_card, compositing_backend)
+
+            yield variant, finish_card(variant_card, compositing_backend)
+
+
+def create_variants(title, image_paths, card_type, variants, output_sink=None):
+    """Composes and saves every variant of a card
+
+    Parameters
+    ----------
+    title : str
+        The title of the card, used by the variants that don't have their own
+    image_paths : dict
+        All the paths to the images that will be drawn on the card
+    card_type : str
+        The type of the card, such as 'biome'
+    variants : list
+        The variants of the card, as accepted by 'compose_variants'
+    output_sink : ArchiveOutputSink
+        Where the variants get written. By default, they're saved under the output directory
+
+    Returns
+    -------
+    list
+        the paths where the variants were written, named after their title and their name
+    """
+    written_paths = []
+
+    for variant, card in compose_variants(title, image_paths, card_type, variants):
+        try:
+            written_paths.append(
+                save_card_as_png(
+                    get_variant_filename_title(title, variant), card, card_type, output_sink
+                )
+            )
+        except UnhandledCardTypeException as exception:
+            raise SavingCardFailedError(
+                f"From 'create_variants', I was unable to save the variant '{variant['name']}' as a png file.\nError: {exception}"
+            )
+
+    return written_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Variant Generator")
+    parser.add_argument(
+        "manifest",
+        help="Path to a TOML deck manifest whose cards list their 'variants'.",
+    )
+
+    args = parser.parse_args()
+
+    for index, card_data in enumerate(load_deck_manifest(args.manifest)):
+        try:
+            title, image_paths, card_type = read_card_data(card_data)
+
+            ensure_all_image_paths_exist(image_paths)
+
+            written_paths = create_variants(
+                title, image_paths, card_type, card_data.get("variants", [])
+            )
+        except (
+            InvalidCardDataException,
+            InvalidVariantException,
+            IncorrectImagePathException,
+            MissingTitleYCoordinateError,
+            SavingCardFailedError,
+            CardCreationFailedException,
+        ) as exception:
+            print(f"Failed to render the variants of the card at index {index} from main.\nError: {exception}")
+            continue
+
+        print(f"Rendered {len(written_paths)} variants of the card at index {index}.")
+
+
+if __name__ == "__main__":
+    main()